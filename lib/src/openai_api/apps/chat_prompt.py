@@ -1,10 +1,16 @@
-import asyncio
+import os
+from functools import partial
 from typing import Any
 
 import pandas as pd
-from malevich.square import DF, Context, processor
+from malevich.square import APP_DIR, DF, Context, processor
 
+from ..lib.batch import BatchRunner
+from ..lib.cache import cache_for, request_key, run_cached
 from ..lib.chat import exec_chat
+from ..lib.packing import run_packed
+from ..lib.scheduler import estimate_tokens, scheduler_from_conf
+from ..lib.stream import ResultWriter, row_key
 from .models import PromptCompletion
 
 
@@ -38,6 +44,8 @@ async def prompt_completion(variables: DF[Any], ctx: Context[PromptCompletion]):
     ## Output:
 
         A dataframe with following columns:
+            - index (Any): the index of the input row, only if `output_file`
+                and `include_index` are set
             - content (str): the content of the model response
 
     ## Configuration:
@@ -72,6 +80,42 @@ async def prompt_completion(variables: DF[Any], ctx: Context[PromptCompletion]):
             The number of completions to generate.
         - `response_format`: str, default None.
             The response format.
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `tokens_per_minute`: float, default None.
+            The limit of tokens per minute estimated from the prompts and `max_tokens`. Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
+        - `execution`: str, default 'online'.
+            How completions are requested: 'online' or 'batch'.
+        - `batch_poll_interval`: float, default 30.
+            The number of seconds between checks of the status of batches.
+        - `batch_size`: int, default 50000.
+            The maximum number of requests in a batch.
+        - `cache`: bool, default False.
+            Whether to cache responses on disk and reuse them for identical requests.
+        - `cache_dir`: str, default None.
+            The directory of the cache. Defaults to a directory in the app directory.
+        - `cache_ttl`: float, default None.
+            The number of seconds cached responses are valid for. Never expire if not set.
+        - `cache_size_mb`: int, default 1024.
+            The maximum size of the cache. Least recently used responses are removed first.
+        - `force_cache`: bool, default False.
+            Whether to cache responses if `temperature` is above 0.
+        - `pack_size`: int, default 1.
+            The maximum number of rows sent in a single request. Rows are sent one by one if 1.
+        - `pack_max_tokens`: int, default 2000.
+            The maximum estimated number of prompt tokens of the rows packed into a request.
+        - `output_file`: str, default None.
+            A `.jsonl` or `.parquet` file in the app directory to write completed rows to as they finish.
+        - `resume`: bool, default False.
+            Whether to skip rows already written to `output_file` by an interrupted run.
+        - `include_index`: bool, default False.
+            Whether to include the index of rows in the output when `output_file` is set.
 
     ## Notes:
         If `response_format` is set to 'json_object', the system prompt should
@@ -86,6 +130,49 @@ async def prompt_completion(variables: DF[Any], ctx: Context[PromptCompletion]):
 
         JSON completion only works with Davinci models
 
+    ## Batch execution:
+        If `execution` is set to 'batch', the rows are sent through the Batch
+        API, which costs half the price of regular requests but completes
+        within 24 hours. The rows are split into batches of at most
+        `batch_size` requests (and 200MB), which are submitted at once. The
+        processor waits until all of them are done and returns responses in
+        the order of rows. If any request fails, the processor raises an
+        error with the identifiers of the batches.
+
+    ## Caching:
+        If `cache` is set, responses are stored on disk keyed by a hash of the
+        model, the messages and the sampling parameters. Rows with
+        a cached response are not sent to the API. Since responses sampled
+        with a positive temperature differ from call to call, the cache is only
+        used if `temperature` is 0 or `force_cache` is set. The number of hits
+        and misses is logged.
+
+    ## Packing:
+        If `pack_size` is above 1, consecutive rows with the same system prompt
+        are sent in a single request as numbered tasks, up to `pack_size` rows
+        and `pack_max_tokens` tokens of user prompts, and the model is asked to
+        respond with a JSON array of answers. This saves the tokens of the
+        system prompt and the latency of a request per row for short prompts,
+        e.g. classification. `max_tokens` is multiplied by `pack_size` for
+        packed requests. Rows without a valid answer in the response are sent
+        one by one. Only one completion per row is supported, so `n` should be 1.
+
+    ## Incremental output:
+        If `output_file` is set, every row is written to the file with the
+        index of the input row as soon as its completion is done, so the
+        results of a long run are not lost if it is interrupted. A `.jsonl`
+        file is appended to directly, while a `.parquet` file is written at the
+        end of the run from a `.part.jsonl` journal next to it. With `resume`,
+        rows whose index is already in the file or the journal are not sent
+        again. The index of the input should be unique. The processor returns
+        all rows in the order of the input and shares the file.
+
+    ## Rate limits:
+        Requests are sent with at most `max_concurrency` of them in flight and
+        within `requests_per_minute` and `tokens_per_minute`. If the API responds
+        with 429, all requests pause for the time given by the API, and the
+        number of requests in flight is reduced until requests succeed again.
+
     -----
 
     Args:
@@ -94,7 +181,7 @@ async def prompt_completion(variables: DF[Any], ctx: Context[PromptCompletion]):
 
     Returns:
         DF[Any]: the chat messages
-    """
+    """  # noqa: E501
 
     try:
         conf = ctx.app_cfg["conf"]
@@ -114,14 +201,109 @@ async def prompt_completion(variables: DF[Any], ctx: Context[PromptCompletion]):
         for _vars in variables.to_dict(orient="records")
     ]
 
-    response = await asyncio.gather(*[exec_chat(x, conf) for x in messages])
+    writer = None
+    todo = list(range(len(messages)))
+    if conf.output_file:
+        if not variables.index.is_unique:
+            raise ValueError(
+                "The index of the input should be unique to write rows "
+                "to `output_file`"
+            )
+        writer = ResultWriter(
+            os.path.join(APP_DIR, conf.output_file), resume=conf.resume
+        )
+        todo = [
+            i for i in todo if row_key(variables.index[i]) not in writer.completed
+        ]
+        if len(todo) < len(messages):
+            ctx.logger.info(
+                f"Resuming {conf.output_file}: {len(messages) - len(todo)} rows "
+                "are already completed"
+            )
+        messages = [messages[i] for i in todo]
+
+    client = ctx.app_cfg["client"].get()
+    scheduler = scheduler_from_conf(conf, ctx.logger.info)
+
+    if conf.execution not in ("online", "batch"):
+        raise ValueError(
+            f"Unsupported execution `{conf.execution}`. "
+            "Supported: 'online', 'batch'"
+        )
+    if conf.pack_size > 1 and conf.n != 1:
+        raise ValueError("Rows can be packed into requests only if `n` is 1")
+
+    # Packed requests answer several rows and need a larger completion budget
+    packed_conf = conf.model_copy(
+        update={
+            "max_tokens": conf.max_tokens * conf.pack_size
+            if conf.max_tokens else None
+        }
+    )
+
+    async def _run(
+        batch: list[list[dict]], callback=None, packed: bool = False
+    ) -> list[list[str]]:
+        _conf = packed_conf if packed else conf
+
+        async def _complete(x: list[dict]) -> list[str]:
+            return [
+                _message.content for _message in await exec_chat(x, _conf, client)
+            ]
+
+        if _conf.execution == "batch":
+            runner = BatchRunner(
+                client,
+                _conf,
+                poll_interval=_conf.batch_poll_interval,
+                max_requests=_conf.batch_size,
+                log=ctx.logger.info,
+            )
+            requests = batch
+        else:
+            runner = scheduler
+            requests = [partial(_complete, x) for x in batch]
+
+        return await run_cached(
+            runner,
+            cache_for(_conf, ctx.app_cfg.get("response_cache")),
+            [request_key(_conf, x) for x in batch],
+            requests,
+            [
+                estimate_tokens(x, _conf.model, (_conf.max_tokens or 0) * _conf.n)
+                for x in batch
+            ],
+            ctx.logger.info,
+            callback,
+        )
+
+    on_row = (
+        lambda j, result: writer.write(variables.index[todo[j]], result)
+    ) if writer is not None else None
+
+    if conf.pack_size > 1:
+        response = await run_packed(
+            _run,
+            messages,
+            conf.model,
+            max_rows=conf.pack_size,
+            max_tokens=conf.pack_max_tokens,
+            log=ctx.logger.info,
+            callback=on_row,
+        )
+    else:
+        response = await _run(messages, on_row)
+
+    if writer is not None:
+        df = writer.close(variables.index)
+        ctx.share(conf.output_file)
+        return df if conf.include_index else df[["content"]]
 
     df = {
         "content": [],
     }
 
     for _response in response:
-        for _message in _response:
-            df["content"].append(_message.content)
+        df["content"].extend(_response)
 
     return pd.DataFrame(df)
@@ -1,13 +1,15 @@
-import asyncio
 from collections import defaultdict
+from functools import partial
 from typing import Any
 
 import pandas as pd
-from langchain.output_parsers import ResponseSchema
 from malevich.square import DF, Context, processor
 
 from ..lib.broadcast import broadcast
+from ..lib.cache import cache_for, request_key, run_cached
 from ..lib.chat import exec_structured_chat
+from ..lib.scheduler import estimate_tokens, scheduler_from_conf
+from ..lib.structured import StructuredOutput
 from .models import StructuredPromptCompletion
 
 
@@ -80,9 +82,31 @@ async def structured_prompt_completion(
         - `response_format`: str, default None.
             The response format.
         - `fields`: list|dict, default None.
-            A list of fields to parse the output. Each field is a dict that contains fields `name`, `description` and `type`.
+            A list of fields to parse the output. Each field is a dict that contains fields `name`, `description` and `type`. A dict mapping names to descriptions is accepted as well.
+        - `structured_output`: str, default 'auto'.
+            How the output is requested: 'json_schema' (the JSON schema response format), 'json_object' (JSON mode with the schema in the prompt) or 'auto' (JSON schemas unless the model does not support them).
         - `include_index`: bool, default False.
             Whether to include the index in the output.
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `tokens_per_minute`: float, default None.
+            The limit of tokens per minute estimated from the prompts and `max_tokens`. Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
+        - `cache`: bool, default False.
+            Whether to cache responses on disk and reuse them for identical requests.
+        - `cache_dir`: str, default None.
+            The directory of the cache. Defaults to a directory in the app directory.
+        - `cache_ttl`: float, default None.
+            The number of seconds cached responses are valid for. Never expire if not set.
+        - `cache_size_mb`: int, default 1024.
+            The maximum size of the cache. Least recently used responses are removed first.
+        - `force_cache`: bool, default False.
+            Whether to cache responses if `temperature` is above 0.
 
     ## Notes:
         If `response_format` is set to 'json_object', the system prompt should
@@ -97,6 +121,29 @@ async def structured_prompt_completion(
 
         JSON completion only works with Davinci models
 
+    ## Structured outputs:
+        The fields are compiled once into a JSON schema and a validator. Types
+        `string`, `integer`, `number`, `boolean` and lists of them
+        (e.g. `List[string]`) are supported, other types are returned as
+        strings. The schema is sent with the JSON schema response format, so
+        the model is constrained to produce valid output. Models that do not
+        support it (e.g. 'gpt-3.5-turbo') are switched to JSON mode with the
+        schema added to the prompt when `structured_output` is 'auto'.
+
+    ## Caching:
+        If `cache` is set, responses are stored on disk keyed by a hash of the
+        model, the messages, the fields and the sampling parameters. Rows with
+        a cached response are not sent to the API. Since responses sampled
+        with a positive temperature differ from call to call, the cache is only
+        used if `temperature` is 0 or `force_cache` is set. The number of hits
+        and misses is logged.
+
+    ## Rate limits:
+        Requests are sent with at most `max_concurrency` of them in flight and
+        within `requests_per_minute` and `tokens_per_minute`. If the API responds
+        with 429, all requests pause for the time given by the API, and the
+        number of requests in flight is reduced until requests succeed again.
+
     ## Example:
         user_prompt: "Write a search queries to find {something} on the Internet"
         fields: [
@@ -139,17 +186,23 @@ async def structured_prompt_completion(
         user_prompt.format(**_vars) for _vars in variables.to_dict(orient="records")
     ]
 
-    schema = [
-        ResponseSchema(
-            name=field["name"],
-            description=field["description"],
-            type=field.get("type", "string"),
-        )
-        for field in ctx.app_cfg.get("fields", [{}])
-    ]
-
-    response = await asyncio.gather(
-        *[exec_structured_chat(message, conf, schema) for message in messages]
+    fields = ctx.app_cfg.get("fields")
+    output = StructuredOutput(fields, ctx.app_cfg.get("structured_output") or "auto")
+
+    client = ctx.app_cfg["client"].get()
+    response = await run_cached(
+        scheduler_from_conf(conf, ctx.logger.info),
+        cache_for(conf, ctx.app_cfg.get("response_cache")),
+        [request_key(conf, message, fields=fields) for message in messages],
+        [
+            partial(exec_structured_chat, message, conf, client, output)
+            for message in messages
+        ],
+        [
+            estimate_tokens(message, conf.model, conf.max_tokens or 0)
+            for message in messages
+        ],
+        ctx.logger.info,
     )
 
     df = defaultdict(lambda: [])
@@ -1,5 +1,9 @@
-from malevich.square import Context, init
+import os
 
+from malevich.square import APP_DIR, Context, init
+
+from ..lib.cache import MB, ResponseCache
+from ..lib.client import SharedClient
 from ..models.configuration.base import Configuration
 
 
@@ -31,3 +35,14 @@ def init_models(ctx: Context):
         )
 
     ctx.app_cfg['conf'] = conf
+    ctx.app_cfg['client'] = SharedClient(conf)
+
+    if conf.cache:
+        ctx.app_cfg['response_cache'] = ResponseCache(
+            os.path.join(
+                conf.cache_dir or os.path.join(APP_DIR, '.openai_cache'),
+                'responses.sqlite',
+            ),
+            ttl=conf.cache_ttl,
+            max_bytes=conf.cache_size_mb * MB,
+        )
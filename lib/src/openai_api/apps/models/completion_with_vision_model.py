@@ -31,3 +31,48 @@ class CompletionWithVision(BaseModel):
         description='The higher the value, the less likely the model is to talk about the same topic again',
     )
     model: Optional[str] = Field('gpt-4-vision-preview', description='The model to use')
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    tokens_per_minute: Optional[float] = Field(
+        None, description='The limit of tokens per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
+    cache: Optional[bool] = Field(
+        False, description='Whether to cache responses on disk'
+    )
+    cache_dir: Optional[str] = Field(
+        None, description='The directory of the response cache'
+    )
+    cache_ttl: Optional[float] = Field(
+        None,
+        description='The number of seconds cached responses are valid for. Never expire if not set',
+    )
+    cache_size_mb: Optional[int] = Field(
+        1024, description='The maximum size of the response cache in megabytes'
+    )
+    force_cache: Optional[bool] = Field(
+        False,
+        description='Whether to cache responses sampled with a positive temperature',
+    )
+    detail: Optional[str] = Field(
+        'auto', description="The detail level of images: 'auto', 'low' or 'high'"
+    )
+    image_format: Optional[str] = Field(
+        'jpeg',
+        description="The format images are re-encoded to: 'jpeg', 'webp' or 'original' to send files as they are",
+    )
+    image_quality: Optional[int] = Field(
+        85, description='The quality of re-encoded images, from 1 to 100'
+    )
+    max_image_kb: Optional[int] = Field(
+        1024, description='The maximum size of a re-encoded image in kilobytes'
+    )
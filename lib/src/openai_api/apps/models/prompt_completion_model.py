@@ -26,3 +26,65 @@ class PromptCompletion(BaseModel):
     stream: Optional[bool] = Field(False, description='Whether to stream the response')
     n: Optional[int] = Field(1, description='The number of completions to generate')
     response_format: Optional[str] = Field(None, description='The response format')
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    tokens_per_minute: Optional[float] = Field(
+        None, description='The limit of tokens per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
+    execution: Optional[str] = Field(
+        'online',
+        description="How completions are requested: 'online' or 'batch' (the Batch API)",
+    )
+    batch_poll_interval: Optional[float] = Field(
+        30.0,
+        description='The number of seconds between checks of the status of batches',
+    )
+    batch_size: Optional[int] = Field(
+        50000, description='The maximum number of requests in a batch'
+    )
+    cache: Optional[bool] = Field(
+        False, description='Whether to cache responses on disk'
+    )
+    cache_dir: Optional[str] = Field(
+        None, description='The directory of the response cache'
+    )
+    cache_ttl: Optional[float] = Field(
+        None,
+        description='The number of seconds cached responses are valid for. Never expire if not set',
+    )
+    cache_size_mb: Optional[int] = Field(
+        1024, description='The maximum size of the response cache in megabytes'
+    )
+    force_cache: Optional[bool] = Field(
+        False,
+        description='Whether to cache responses sampled with a positive temperature',
+    )
+    pack_size: Optional[int] = Field(
+        1, description='The maximum number of rows sent in a single chat request'
+    )
+    pack_max_tokens: Optional[int] = Field(
+        2000,
+        description='The maximum estimated number of prompt tokens of the rows packed into a request',
+    )
+    output_file: Optional[str] = Field(
+        None,
+        description='A `.jsonl` or `.parquet` file in the app directory to write completed rows to as they finish',
+    )
+    resume: Optional[bool] = Field(
+        False,
+        description='Whether to skip rows already written to `output_file` by an interrupted run',
+    )
+    include_index: Optional[bool] = Field(
+        False,
+        description='Whether to include the index of rows in the output when `output_file` is set',
+    )
@@ -19,3 +19,20 @@ class SpeechToText(BaseModel):
     prompt: Optional[str] = Field(
         None, description='A short optional prompt to guide the model'
     )
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
+    segment_duration: Optional[float] = Field(
+        600.0,
+        ge=1,
+        description='Audio longer than this number of seconds is split into segments transcribed concurrently',
+    )
@@ -29,6 +29,42 @@ class StructuredPromptCompletion(BaseModel):
         None,
         description='A list of fields to parse the output. Each field is a dict that contains fields `name`, `description` and `type`',
     )
+    structured_output: Optional[str] = Field(
+        'auto',
+        description="How the output is requested: 'json_schema', 'json_object' or 'auto'",
+    )
     include_index: Optional[bool] = Field(
         False, description='Whether to include the index in the output'
     )
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    tokens_per_minute: Optional[float] = Field(
+        None, description='The limit of tokens per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
+    cache: Optional[bool] = Field(
+        False, description='Whether to cache responses on disk'
+    )
+    cache_dir: Optional[str] = Field(
+        None, description='The directory of the response cache'
+    )
+    cache_ttl: Optional[float] = Field(
+        None,
+        description='The number of seconds cached responses are valid for. Never expire if not set',
+    )
+    cache_size_mb: Optional[int] = Field(
+        1024, description='The maximum size of the response cache in megabytes'
+    )
+    force_cache: Optional[bool] = Field(
+        False,
+        description='Whether to cache responses sampled with a positive temperature',
+    )
@@ -18,3 +18,15 @@ class TextToImage(BaseModel):
     n: Optional[int] = Field(
         1, description='Amount of images to generate for each request'
     )
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
@@ -17,3 +17,15 @@ class TextToSpeech(BaseModel):
         'alloy',
         description="The voice to use. One of 'alloy', 'echo', 'fable', 'onyx', 'nova', and 'shimmer'",
     )
+    max_concurrency: Optional[int] = Field(
+        16, description='The maximum number of requests in flight at the same time'
+    )
+    requests_per_minute: Optional[float] = Field(
+        None, description='The limit of requests per minute. Not limited if not set'
+    )
+    max_connections: Optional[int] = Field(
+        100, description='The maximum number of connections to the API'
+    )
+    timeout: Optional[float] = Field(
+        600.0, description='The timeout of a request in seconds'
+    )
@@ -1,13 +1,14 @@
 import asyncio
 import os
-import shutil
-import uuid
+import tempfile
+from functools import partial
 from typing import Any
 
 import pandas as pd
 from malevich.square import DF, Context, processor
 
-from ..lib.whisper import exec_whisper
+from ..lib.scheduler import scheduler_from_conf
+from ..lib.whisper import exec_whisper, join_transcripts, split_audio
 from .models import SpeechToText
 
 
@@ -43,6 +44,25 @@ async def speech_to_text(variables: DF[Any], ctx: Context[SpeechToText]):
             The temperature.
         - `prompt`: str, default None.
             A short optional prompt to guide the model.
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
+        - `segment_duration`: float, default 600.
+            Audio longer than this number of seconds is split into segments transcribed concurrently. Should be at least 1.
+
+    ## Details:
+        Files are uploaded directly from the share path. Long recordings are
+        split into segments of about `segment_duration` seconds, cut at
+        the quietest moment within 30 seconds before the target length, so
+        that words are not split. Segments of all files are transcribed
+        concurrently within the rate limits, and their transcripts are
+        joined in order. Files over the 25MB upload limit are always split.
+        If `segment_duration` is not set, other files are sent as they are.
 
     -----
 
@@ -52,28 +72,45 @@ async def speech_to_text(variables: DF[Any], ctx: Context[SpeechToText]):
 
     Returns:
         DF[Any]: the chat messages
-    """
+    """  # noqa: E501
 
     try:
         conf = ctx.app_cfg["conf"]
     except KeyError:
         raise Exception("OpenAI client not initialized.")
 
-    files = []
     for f in variables.filename.to_list():
         if not os.path.exists(ctx.get_share_path(f)):
             raise Exception(f"File {f} does not exist.")
-        _f = uuid.uuid4().hex
-        _ext = os.path.splitext(f)[1]
-        _f = f'{_f}{_ext}'
-        shutil.copy(ctx.get_share_path(f), _f)
-        files.append(_f)
-
-    p = [ctx.app_cfg.get("prompt", None)] * len(variables)
-
-    response = await asyncio.gather(
-        *[exec_whisper(conf, f, p_) for f, p_ in zip(files,p)
-    ])
 
+    prompt = ctx.app_cfg.get("prompt", None)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Files are decoded one at a time to keep a single recording in memory.
+        # Segments of every file go to a directory of their own, as files
+        # in different folders may have the same name
+        segments = [
+            await asyncio.to_thread(
+                split_audio,
+                ctx.get_share_path(f),
+                f,
+                conf.segment_duration,
+                os.path.join(directory, str(i)),
+            )
+            for i, f in enumerate(variables.filename.to_list())
+        ]
+
+        client = ctx.app_cfg["client"].get()
+        scheduler = scheduler_from_conf(conf, ctx.logger.info)
+        texts = iter(await scheduler.run([
+            partial(exec_whisper, conf, s.path, client, prompt, s.name)
+            for file_segments in segments
+            for s in file_segments
+        ]))
+
+    response = [
+        join_transcripts(file_segments, [next(texts) for _ in file_segments])
+        for file_segments in segments
+    ]
 
     return pd.DataFrame(response, columns=["content"])
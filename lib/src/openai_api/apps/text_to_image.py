@@ -1,13 +1,13 @@
 import asyncio
-import os
-import uuid
+from functools import partial
 from typing import Any
 
+import httpx
 import pandas as pd
-import requests
 from malevich.square import APP_DIR, DF, Context, processor
 
-from ..lib.image import exec_image
+from ..lib.image import download_image, exec_image, image_name
+from ..lib.scheduler import scheduler_from_conf
 from .models import TextToImage
 
 
@@ -40,7 +40,7 @@ async def text_to_image(
         The format of the output depends on the configuration.
 
         If `download` set to true, then an output dataframe will
-        contain a column `filename` with filenames of downloaded images.
+        contain a column `file` with filenames of downloaded images.
 
         Otherwise, an output dataframe will contain a column `link`
         with links to the images provided directly by Open AI.
@@ -57,6 +57,20 @@ async def text_to_image(
             Whether to download images.
         - `n`: int, default 1.
             Amount of images to generate for each request.
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
+
+    ## Details:
+        If `download` is set, images of a row are downloaded as soon as
+        they are generated, while other rows are still being generated.
+        Files are named after a hash of the index and the prompt of the row,
+        and their extension follows the content type of the image.
 
     -----
 
@@ -84,30 +98,52 @@ async def text_to_image(
         for __vars in variables.to_dict(orient='records')
     ]
 
-    _outputs = await asyncio.gather(
-        *[exec_image(x, conf) for x in inputs],
-    )
-
-    outputs = []
-    for _o in _outputs:
-        outputs.extend([x.url for x in _o.data])
-
-    if download:
-        files = []
-        for link in outputs:
-            response = requests.get(link)
-            fname = uuid.uuid4().hex[:8]
-            with open(os.path.join(APP_DIR, fname), 'wb+') as f:
-                f.write(response.content)
-            ctx.share(fname)
-            files.append(fname)
-        ctx.synchronize(files)
+    client = ctx.app_cfg["client"].get()
+    scheduler = scheduler_from_conf(conf, ctx.logger.info)
+
+    if not download:
+        _outputs = await scheduler.run(
+            [partial(exec_image, x, conf, client) for x in inputs]
+        )
+        outputs = []
+        for _o in _outputs:
+            outputs.extend([x.url for x in _o.data])
 
         return pd.DataFrame({
-            'file': files
+            'link': outputs
         })
 
+    async with httpx.AsyncClient(
+        timeout=conf.timeout,
+        limits=httpx.Limits(max_connections=conf.max_connections),
+        follow_redirects=True,
+    ) as http:
+        downloads = [None] * len(inputs)
+
+        def _download(i: int, response: Any) -> None:
+            downloads[i] = asyncio.gather(*[
+                download_image(
+                    http, x.url, image_name(variables.index[i], inputs[i], k), APP_DIR
+                )
+                for k, x in enumerate(response.data)
+            ])
+
+        try:
+            await scheduler.run(
+                [partial(exec_image, x, conf, client) for x in inputs],
+                callback=_download,
+            )
+            files = [f for row in await asyncio.gather(*downloads) for f in row]
+        except BaseException:
+            for d in downloads:
+                if d is not None:
+                    d.cancel()
+            raise
+
+    for f in files:
+        ctx.share(f)
+    ctx.synchronize(files)
 
     return pd.DataFrame({
-        'link': outputs
+        'file': files
     })
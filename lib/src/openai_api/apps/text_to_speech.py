@@ -1,11 +1,12 @@
-import asyncio
 import os
 import shutil
+from functools import partial
 from typing import Any
 
 import pandas as pd
 from malevich.square import APP_DIR, DF, Context, processor
 
+from ..lib.scheduler import scheduler_from_conf
 from ..lib.tts import exec_tts
 from .models import TextToSpeech
 
@@ -40,6 +41,14 @@ async def text_to_speech(variables: DF[Any], ctx: Context[TextToSpeech]):
             The model to use.
         - `voice`: str, default 'alloy'.
             The voice to use. One of 'alloy', 'echo', 'fable', 'onyx', 'nova', and 'shimmer'.
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
 
     -----
 
@@ -58,7 +67,9 @@ async def text_to_speech(variables: DF[Any], ctx: Context[TextToSpeech]):
 
     files = [f"voice_{i}_{ctx.run_id}.mp3" for i in range(len(variables))]
 
-    await asyncio.gather(*[exec_tts(x, conf, f) for x, f in zip(
+    client = ctx.app_cfg["client"].get()
+    scheduler = scheduler_from_conf(conf, ctx.logger.info)
+    await scheduler.run([partial(exec_tts, x, conf, f, client) for x, f in zip(
         variables.text.to_list(),
         files
     )])
@@ -1,11 +1,13 @@
-import asyncio
 import os
+from functools import partial
 from typing import Any
 
 import pandas as pd
 from malevich.square import DF, Context, processor
 
-from ..lib.vision import exec_vision
+from ..lib.cache import cache_for, file_digest, request_key, run_cached
+from ..lib.scheduler import estimate_tokens, scheduler_from_conf
+from ..lib.vision import ImageEncoder, exec_vision
 from ..models.configuration.base import Configuration
 from .models import CompletionWithVision
 
@@ -41,7 +43,34 @@ async def completion_with_vision(
             The higher the value, the less likely the model is to talk about the same topic again.
         - `model`: str, default 'gpt-4-vision-preview'.
             The model to use.
-
+        - `max_concurrency`: int, default 16.
+            The maximum number of requests in flight at the same time.
+        - `requests_per_minute`: float, default None.
+            The limit of requests per minute. Not limited if not set.
+        - `tokens_per_minute`: float, default None.
+            The limit of tokens per minute estimated from the prompts and `max_tokens` (images are not counted). Not limited if not set.
+        - `max_connections`: int, default 100.
+            The maximum number of connections to the API shared by all requests.
+        - `timeout`: float, default 600.
+            The timeout of a request in seconds.
+        - `cache`: bool, default False.
+            Whether to cache responses on disk and reuse them for identical requests.
+        - `cache_dir`: str, default None.
+            The directory of the cache. Defaults to a directory in the app directory.
+        - `cache_ttl`: float, default None.
+            The number of seconds cached responses are valid for. Never expire if not set.
+        - `cache_size_mb`: int, default 1024.
+            The maximum size of the cache. Least recently used responses are removed first.
+        - `force_cache`: bool, default False.
+            Whether to cache responses if `temperature` is above 0.
+        - `detail`: str, default 'auto'.
+            The detail level of images: 'auto', 'low' or 'high'. Images are downscaled to the resolution of the level.
+        - `image_format`: str, default 'jpeg'.
+            The format images are re-encoded to: 'jpeg' or 'webp'. Files are sent as they are if 'original'.
+        - `image_quality`: int, default 85.
+            The quality of re-encoded images, from 1 to 100.
+        - `max_image_kb`: int, default 1024.
+            The maximum size of a re-encoded image. The quality and then the size is lowered to fit.
 
     ## Input:
 
@@ -75,6 +104,27 @@ async def completion_with_vision(
         - tif
         - webp
 
+    ## Images:
+        Image files are downscaled to the resolution the model uses for the
+        `detail` level: to fit 512x512 for 'low', and to fit 2048x2048 with
+        the shorter side at most 768 otherwise. Then they are re-encoded in
+        `image_format`. Each distinct image is encoded once per run, however
+        many rows it appears in. Links are sent to the API as they are.
+
+    ## Caching:
+        If `cache` is set, responses are stored on disk keyed by a hash of the
+        model, the messages, the image (its contents for files, the URL for links) and the sampling parameters. Rows with
+        a cached response are not sent to the API. Since responses sampled
+        with a positive temperature differ from call to call, the cache is only
+        used if `temperature` is 0 or `force_cache` is set. The number of hits
+        and misses is logged.
+
+    ## Rate limits:
+        Requests are sent with at most `max_concurrency` of them in flight and
+        within `requests_per_minute` and `tokens_per_minute`. If the API responds
+        with 429, all requests pause for the time given by the API, and the
+        number of requests in flight is reduced until requests succeed again.
+
     -----
 
     Args:
@@ -126,17 +176,56 @@ async def completion_with_vision(
         if __is_file(images[i]):
             images[i] = ctx.get_share_path(images[i])
 
-    response = await asyncio.gather(
-        *[exec_vision(msgs, image, conf, not __is_file(image))
-          for msgs, image in zip(messages, images)]
+    client = ctx.app_cfg["client"].get()
+    cache = cache_for(conf, ctx.app_cfg.get("response_cache"))
+    encoder = ImageEncoder(
+        detail=conf.detail,
+        image_format=conf.image_format,
+        quality=conf.image_quality,
+        max_bytes=conf.max_image_kb * 1024,
+    )
+
+    async def _complete(msgs: list[dict], image: str) -> list[str]:
+        url = await encoder.data_url(image) if __is_file(image) else image
+        _response = await exec_vision(msgs, url, conf, client, conf.detail)
+        return [_message.content for _message in _response]
+
+    keys = []
+    if cache is not None:
+        # Images are identified by their contents, so renamed
+        # or re-uploaded files still hit the cache
+        keys = [
+            request_key(
+                conf,
+                msgs,
+                image=file_digest(image) if __is_file(image) else image,
+                detail=conf.detail,
+                image_format=conf.image_format,
+                image_quality=conf.image_quality,
+                max_image_kb=conf.max_image_kb,
+            )
+            for msgs, image in zip(messages, images)
+        ]
+
+    response = await run_cached(
+        scheduler_from_conf(conf, ctx.logger.info),
+        cache,
+        keys,
+        [partial(_complete, msgs, image) for msgs, image in zip(messages, images)],
+        [
+            estimate_tokens(msgs, conf.model, conf.max_tokens or 0)
+            for msgs in messages
+        ],
+        ctx.logger.info,
     )
+    if encoder.bytes_read:
+        ctx.logger.info(encoder.stats())
 
     df = {
         "content": [],
     }
 
     for _response in response:
-        for _message in _response:
-            df["content"].append(_message.content)
+        df["content"].extend(_response)
 
     return pd.DataFrame(df)
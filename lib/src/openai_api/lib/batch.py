@@ -0,0 +1,179 @@
+"""Chat completions through the OpenAI Batch API.
+
+Rows are written as JSONL requests, uploaded and submitted as batches,
+which are processed within 24 hours at half the price of regular requests.
+Large inputs are split into several batches under the limits of a single
+batch file. All batches are submitted at once and polled until they are
+done, then responses are mapped back to rows by their `custom_id`.
+"""
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from typing import Any
+
+from openai import AsyncOpenAI
+
+from ..models.configuration.base import Configuration
+from .chat import chat_params
+
+MB = 1024 * 1024
+
+ENDPOINT = '/v1/chat/completions'
+
+# Limits of a single batch input file
+MAX_REQUESTS = 50_000
+MAX_BYTES = 200 * MB
+
+_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def split_lines(
+    lines: list[bytes], max_requests: int = MAX_REQUESTS, max_bytes: int = MAX_BYTES
+) -> list[list[bytes]]:
+    """Splits JSONL lines into files with at most `max_requests` lines and
+    `max_bytes` bytes."""
+    chunks = [[]]
+    size = 0
+    for line in lines:
+        full = len(chunks[-1]) >= max_requests or size + len(line) > max_bytes
+        if chunks[-1] and full:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(line)
+        size += len(line)
+    return [chunk for chunk in chunks if chunk]
+
+
+class BatchRunner:
+    """Runs chat completions for lists of messages as batches.
+
+    Has the same `run` method as `Scheduler`, but takes messages rather
+    than functions sending the requests.
+
+    Args:
+        client: The OpenAI client.
+        conf: The configuration with the model and sampling parameters.
+        poll_interval: Number of seconds between checks of batch status.
+        max_requests: Maximum number of requests in a batch.
+        log: A function to report progress with.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        conf: Configuration,
+        poll_interval: float = 30.0,
+        max_requests: int = MAX_REQUESTS,
+        log: Callable[[str], Any] | None = None,
+    ) -> None:
+        # Batch requests are not run by the scheduler, so the client retries
+        self.client = client.with_options(max_retries=conf.max_retries)
+        self.params = chat_params(conf)
+        self.poll_interval = poll_interval
+        self.max_requests = min(max(1, max_requests), MAX_REQUESTS)
+        self.log = log or (lambda _: None)
+
+    async def _submit(self, lines: list[bytes], number: int) -> str:
+        file = await self.client.files.create(
+            file=(f'batch_{number}.jsonl', b''.join(lines)),
+            purpose='batch',
+        )
+        batch = await self.client.batches.create(
+            input_file_id=file.id,
+            endpoint=ENDPOINT,
+            completion_window='24h',
+        )
+        self.log(f'Submitted batch {batch.id} with {len(lines)} requests')
+        return batch.id
+
+    async def _wait(self, batch_id: str) -> Any:
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in _TERMINAL_STATUSES:
+                return batch
+            if counts := batch.request_counts:
+                self.log(
+                    f'Batch {batch_id} is {batch.status}: '
+                    f'{counts.completed + counts.failed}/{counts.total} requests done'
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def _read(self, file_id: str | None) -> list[dict]:
+        if not file_id:
+            return []
+        content = await self.client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line]
+
+    async def run(
+        self,
+        messages: list[list[dict]],
+        tokens: list[int] | None = None,
+        callback: Callable[[int, list[str]], Any] | None = None,
+    ) -> list[list[str]]:
+        """Completes every list of messages.
+
+        Args:
+            messages: Messages of every row.
+            tokens: Not used, batches are not rate limited per request.
+            callback: A function called with the position and the result of
+                every row once its batch is done.
+
+        Returns:
+            Contents of the choices for every row, in the order of `messages`.
+        """
+        if not messages:
+            return []
+
+        start = time.monotonic()
+        lines = [
+            json.dumps({
+                'custom_id': str(i),
+                'method': 'POST',
+                'url': ENDPOINT,
+                'body': {'messages': x, **self.params},
+            }, ensure_ascii=False).encode('utf-8') + b'\n'
+            for i, x in enumerate(messages)
+        ]
+        chunks = split_lines(lines, self.max_requests)
+        batch_ids = await asyncio.gather(
+            *[self._submit(chunk, i) for i, chunk in enumerate(chunks)]
+        )
+        batches = await asyncio.gather(*[self._wait(b) for b in batch_ids])
+
+        results: list[list[str] | None] = [None] * len(messages)
+        errors = []
+        for batch in batches:
+            if batch.status != 'completed':
+                errors.append(f'batch {batch.id} is {batch.status}: {batch.errors}')
+                continue
+            for record in await self._read(batch.output_file_id):
+                response = record.get('response') or {}
+                if response.get('status_code') == 200:
+                    i = int(record['custom_id'])
+                    results[i] = [
+                        choice['message']['content']
+                        for choice in response['body']['choices']
+                    ]
+                    if callback is not None:
+                        callback(i, results[i])
+                else:
+                    errors.append(
+                        f"row {record['custom_id']}: "
+                        f"{record.get('error') or response.get('body')}"
+                    )
+            for record in await self._read(batch.error_file_id):
+                errors.append(f"row {record['custom_id']}: {record.get('error')}")
+
+        self.log(
+            f'{len(batch_ids)} batches with {len(messages)} requests done in '
+            f'{time.monotonic() - start:.0f}s'
+        )
+
+        missing = sum(result is None for result in results)
+        if errors or missing:
+            raise Exception(
+                f'{missing} of {len(messages)} requests failed in batches '
+                f'{", ".join(batch_ids)}. First errors: {errors[:5]}'
+            )
+        return results
@@ -6,7 +6,7 @@ def broadcast(x: dict):
             s[key] = [x[key]]
         else:
             s[key] = x[key]
-        ln = len(s[key])
+        ln = max(ln, len(s[key]))
 
     assert all(
         len(s[key]) == ln or len(s[key]) == 1
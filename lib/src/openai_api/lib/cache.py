@@ -0,0 +1,252 @@
+"""Persistent cache of OpenAI responses.
+
+Responses are stored in a SQLite database keyed by a hash of everything
+that affects the completion: the model, the messages and the sampling
+parameters. Entries expire after `ttl` seconds, and the least recently
+used entries are evicted once the database grows over `max_bytes`.
+
+Only rows that miss the cache are sent to the API.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Callable
+from typing import Any
+
+from ..models.configuration.base import Configuration
+
+MB = 1024 * 1024
+
+# Removing a bit more than necessary avoids evicting on every insert
+_EVICT_TO = 0.9
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 digest of a file, e.g. an image sent to the API."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(MB):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def request_key(conf: Configuration, messages: Any, **extra: Any) -> str:
+    """Hashes a request.
+
+    Args:
+        conf: The configuration with the model and sampling parameters.
+        messages: The messages or the prompt.
+        extra: Other inputs that change the response, e.g. digests of images
+            or the output schema.
+    """
+    payload = {
+        'model': conf.model,
+        'messages': messages,
+        'temperature': conf.temperature,
+        'top_p': conf.top_p,
+        'max_tokens': conf.max_tokens,
+        'frequency_penalty': conf.frequency_penalty,
+        'presence_penalty': conf.presence_penalty,
+        'stop': conf.stop,
+        'n': conf.n,
+        **extra,
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Stores JSON-serializable responses on disk.
+
+    Args:
+        path: Path of the database.
+        ttl: Number of seconds an entry is valid for. Never expires if None.
+        max_bytes: Maximum total size of responses.
+    """
+
+    def __init__(
+        self, path: str, ttl: float | None = None, max_bytes: int = 1024 * MB
+    ) -> None:
+        if parent := os.path.dirname(path):
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'created REAL NOT NULL, used REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_used ON responses (used)'
+        )
+        self._db.commit()
+        self._size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+
+    def get_many(self, keys: list[str]) -> list[Any]:
+        """Returns cached responses, or None for the keys that are missing."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        # SQLite limits the number of parameters of a query
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            rows = self._db.execute(
+                'SELECT key, value, created FROM responses '
+                f'WHERE key IN ({",".join("?" * len(batch))})',
+                batch,
+            )
+            found.update({key: (value, created) for key, value, created in rows})
+
+        now = time.time()
+        expired = [
+            key for key, (_, created) in found.items()
+            if self.ttl is not None and now - created > self.ttl
+        ]
+        for key in expired:
+            del found[key]
+        if expired:
+            self._delete(expired)
+
+        self._db.executemany(
+            'UPDATE responses SET used = ? WHERE key = ?',
+            [(now, key) for key in found],
+        )
+        self._db.commit()
+
+        return [
+            json.loads(found[key][0]) if key in found else None for key in keys
+        ]
+
+    def put_many(self, items: list[tuple[str, Any]]) -> None:
+        """Stores responses and evicts old ones if the cache is too large."""
+        now = time.time()
+        rows = []
+        for key, value in items:
+            data = json.dumps(value, ensure_ascii=False)
+            rows.append((key, data, len(data.encode('utf-8')), now, now))
+        if not rows:
+            return
+
+        self._delete([key for key, *_ in rows])
+        self._db.executemany(
+            'INSERT INTO responses (key, value, size, created, used) '
+            'VALUES (?, ?, ?, ?, ?)',
+            rows,
+        )
+        self._size += sum(size for _, _, size, _, _ in rows)
+        self._db.commit()
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _delete(self, keys: list[str]) -> None:
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            self._size -= self._db.execute(
+                f'SELECT COALESCE(SUM(size), 0) FROM responses WHERE key IN ({marks})',
+                batch,
+            ).fetchone()[0]
+            self._db.execute(f'DELETE FROM responses WHERE key IN ({marks})', batch)
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits."""
+        target = self.max_bytes * _EVICT_TO
+        removed = []
+        size = self._size
+        for key, entry in self._db.execute(
+            'SELECT key, size FROM responses ORDER BY used'
+        ).fetchall():
+            if size <= target:
+                break
+            removed.append(key)
+            size -= entry
+        self._delete(removed)
+        self._db.commit()
+
+    def stats(self, hits: int, misses: int) -> str:
+        total = hits + misses
+        rate = hits / total * 100 if total else 0.0
+        return (
+            f'Response cache: {hits} hits, {misses} misses '
+            f'({rate:.0f}% hit rate), {self._size / MB:.1f}MB stored'
+        )
+
+
+def cache_for(
+    conf: Configuration, cache: ResponseCache | None
+) -> ResponseCache | None:
+    """Returns the cache if responses are deterministic enough to reuse.
+
+    Responses sampled with a positive temperature differ from call to call,
+    so they are cached only if `force_cache` is set.
+    """
+    if cache is None:
+        return None
+    if conf.force_cache or conf.temperature == 0:
+        return cache
+    return None
+
+
+async def run_cached(
+    runner: Any,
+    cache: ResponseCache | None,
+    keys: list[str],
+    requests: list[Any],
+    tokens: list[int] | None = None,
+    log: Callable[[str], Any] | None = None,
+    callback: Callable[[int, Any], Any] | None = None,
+) -> list[Any]:
+    """Runs the requests that are not in the cache and caches their results.
+
+    Args:
+        runner: A `Scheduler` or a `BatchRunner`.
+        cache: The cache. If None, all requests are run.
+        keys: Keys of the requests.
+        requests: Requests in the form `runner.run` accepts.
+        tokens: The estimated number of tokens of every request.
+        log: A function to report hits and misses with.
+        callback: A function called with the position and the result of every
+            request as soon as it is done. Cached results are reported first.
+
+    Results must be JSON-serializable.
+    """
+    if cache is None:
+        return await runner.run(requests, tokens, callback)
+
+    results = cache.get_many(keys)
+    # Identical rows are sent once
+    missing = {}
+    for i, result in enumerate(results):
+        if result is None:
+            missing.setdefault(keys[i], []).append(i)
+        elif callback is not None:
+            callback(i, result)
+    groups = list(missing.values())
+    first = [rows[0] for rows in groups]
+
+    def _fetched(j: int, result: Any) -> None:
+        for i in groups[j]:
+            callback(i, result)
+
+    fetched = await runner.run(
+        [requests[i] for i in first],
+        [tokens[i] for i in first] if tokens else None,
+        _fetched if callback is not None else None,
+    ) if first else []
+    for rows, result in zip(missing.values(), fetched):
+        for i in rows:
+            results[i] = result
+    cache.put_many(list(zip(missing, fetched)))
+
+    if log is not None:
+        misses = sum(len(rows) for rows in missing.values())
+        log(cache.stats(len(keys) - misses, misses))
+    return results
@@ -1,25 +1,16 @@
-from typing import List
+from typing import Any, List
 
-from langchain.chat_models import ChatOpenAI as LLMOpenAI
-from langchain.output_parsers import ResponseSchema, StructuredOutputParser
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+import openai
 from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionMessage
 
 from ..models.configuration.base import Configuration
+from .structured import StructuredOutput
 
 
-async def exec_chat(
-    messages: List[dict[str, str]], conf: Configuration
-) -> List[ChatCompletionMessage]:
-    client = AsyncOpenAI(
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        organization=conf.organization,
-    )
-
-    response: ChatCompletion = await client.chat.completions.create(
-        messages=messages,
+def chat_params(conf: Configuration) -> dict:
+    """Parameters of a chat completion request except messages."""
+    return dict(
         model=conf.model or 'gpt-3.5-turbo',
         temperature=conf.temperature,
         max_tokens=conf.max_tokens,
@@ -30,41 +21,34 @@ async def exec_chat(
         n=conf.n,
     )
 
-    return [choice.message for choice in response.choices]
 
-
-async def exec_structured_chat(
-    message: str, conf: Configuration, schemas: List[ResponseSchema]
-) -> List[dict[str, str]]:
-    client = LLMOpenAI(
-        model=conf.model or 'gpt-3.5-turbo',
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        temperature=conf.temperature,
-        max_tokens=conf.max_tokens,
-        top_p=conf.top_p,
-        frequency_penalty=conf.frequency_penalty,
-        presence_penalty=conf.presence_penalty,
-        n=conf.n,
+async def exec_chat(
+    messages: List[dict[str, str]], conf: Configuration, client: AsyncOpenAI
+) -> List[ChatCompletionMessage]:
+    response: ChatCompletion = await client.chat.completions.create(
+        messages=messages,
+        **chat_params(conf),
     )
 
-    # print(schemas)
-    output_parser = StructuredOutputParser.from_response_schemas(schemas)
+    return [choice.message for choice in response.choices]
 
-    prompt = ChatPromptTemplate(
-        messages=[
-            HumanMessagePromptTemplate.from_template(
-                message + "\n{format_instructions}",
-            )
-            # for message in messages if message
-        ],
-        partial_variables={
-            "format_instructions": output_parser.get_format_instructions()
-        },
-    )
 
-    output = await client.ainvoke(
-        prompt.format_prompt().to_messages()
-    )
+async def exec_structured_chat(
+    message: str,
+    conf: Configuration,
+    client: AsyncOpenAI,
+    output: StructuredOutput,
+) -> dict[str, Any]:
+    params = {**chat_params(conf), 'n': 1}
+    while True:
+        mode = output.mode
+        try:
+            response: ChatCompletion = await client.chat.completions.create(
+                **output.request(message, mode), **params
+            )
+            break
+        except openai.BadRequestError as e:
+            if not output.fallback(e, mode):
+                raise
 
-    return output_parser.parse(output.content.replace('\n', ''))
+    return output.parse(response.choices[0].message.content)
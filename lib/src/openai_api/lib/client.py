@@ -0,0 +1,84 @@
+"""A shared OpenAI client for all rows and processors of the app.
+
+The client and its connection pool are configured once in `init_models`.
+Connections of an async client belong to the event loop they were opened
+in, so a new client is created if a processor runs in another loop, and it
+is closed when that loop shuts down.
+
+Requests are retried by the `Scheduler`, which pauses all requests when the
+API answers with 429. The client does not retry them itself, otherwise
+retries of the client would run inside retries of the scheduler. Requests
+sent outside of the scheduler use `client.with_options(max_retries=...)`.
+"""
+import asyncio
+import weakref
+from collections.abc import AsyncGenerator
+
+import httpx
+from openai import AsyncOpenAI
+
+from ..models.configuration.base import Configuration
+
+try:
+    import h2  # noqa: F401
+    _H2_INSTALLED = True
+except ImportError:
+    _H2_INSTALLED = False
+
+
+async def _close_on_shutdown(client: AsyncOpenAI) -> AsyncGenerator[None, None]:
+    """Closes the client once the event loop finalizes async generators.
+
+    `asyncio.run` finalizes unfinished async generators before it closes
+    the loop, so connections are closed in the loop they belong to.
+    """
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+class SharedClient:
+    """Creates `AsyncOpenAI` clients with a common connection pool.
+
+    Args:
+        conf: The configuration with the API key, the pool size and timeouts.
+    """
+
+    def __init__(self, conf: Configuration) -> None:
+        self.conf = conf
+        self.limits = httpx.Limits(
+            max_connections=conf.max_connections,
+            max_keepalive_connections=conf.max_keepalive_connections,
+            keepalive_expiry=conf.keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(conf.timeout, connect=conf.connect_timeout)
+        # HTTP/2 multiplexes requests over a few connections
+        self.http2 = conf.http2 and _H2_INSTALLED
+        # Clients and their closers by event loop
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self) -> AsyncOpenAI:
+        """Returns the client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        # Loops closed without finalizing async generators
+        for old in [old for old in self._clients if old.is_closed()]:
+            del self._clients[old]
+
+        if loop not in self._clients:
+            client = AsyncOpenAI(
+                api_key=self.conf.api_key,
+                organization=self.conf.organization,
+                max_retries=0,
+                timeout=self.timeout,
+                http_client=httpx.AsyncClient(
+                    http2=self.http2,
+                    limits=self.limits,
+                    timeout=self.timeout,
+                ),
+            )
+            closer = _close_on_shutdown(client)
+            # Runs the generator up to `yield`, the loop keeps track of it then
+            asyncio.ensure_future(closer.asend(None))
+            self._clients[loop] = (client, closer)
+        return self._clients[loop][0]
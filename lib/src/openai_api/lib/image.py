@@ -1,19 +1,79 @@
+import hashlib
+import json
+import mimetypes
+import os
+from typing import Any
+
+import httpx
 from openai import AsyncOpenAI
 from openai.types import ImagesResponse
 
 from ..models.configuration.base import Configuration
 
+# mimetypes maps some of these to rare extensions, e.g. `.jpe`
+_EXTENSIONS = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
 
-async def exec_image(prompt: str, conf: Configuration) -> ImagesResponse:
-    client = AsyncOpenAI(
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        organization=conf.organization,
-    )
 
+async def exec_image(
+    prompt: str, conf: Configuration, client: AsyncOpenAI
+) -> ImagesResponse:
     return await client.images.generate(
         prompt=prompt,
         model=conf.model or 'dall-e-3',
         timeout=60,
         n=conf.n
     )
+
+
+def image_name(index: Any, prompt: str, number: int) -> str:
+    """A file name without extension of an image generated for a row.
+
+    The same row and prompt always give the same name, so that a repeated
+    run overwrites the images of the previous one.
+
+    Args:
+        index: The index of the row.
+        prompt: The prompt of the row.
+        number: The number of the image among those generated for the row.
+    """
+    if hasattr(index, 'item'):
+        index = index.item()
+    key = json.dumps([index, prompt], ensure_ascii=False, default=str)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return f'image_{digest}_{number}'
+
+
+def _extension(content_type: str | None, url: str) -> str:
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in _EXTENSIONS:
+        return _EXTENSIONS[content_type]
+    guessed = mimetypes.guess_extension(content_type) if content_type else None
+    return guessed or os.path.splitext(httpx.URL(url).path)[1] or '.png'
+
+
+async def download_image(
+    http: httpx.AsyncClient, url: str, name: str, directory: str
+) -> str:
+    """Streams an image to `directory`.
+
+    Args:
+        http: The client to download with.
+        url: The link to the image.
+        name: The file name without extension.
+        directory: The directory to save the image to.
+
+    Returns:
+        The file name with the extension given by the content type.
+    """
+    async with http.stream('GET', url) as response:
+        response.raise_for_status()
+        fname = name + _extension(response.headers.get('content-type'), url)
+        with open(os.path.join(directory, fname), 'wb') as f:
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+    return fname
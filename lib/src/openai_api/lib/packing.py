@@ -0,0 +1,187 @@
+"""Packing several rows into a single chat completion request.
+
+For short prompts, the system prompt and the latency of a request cost more
+than the rows themselves. Consecutive rows with the same system prompt are
+grouped, up to `max_rows` rows and `max_tokens` prompt tokens, and sent as
+one request with numbered tasks. The model is asked to answer with a JSON
+array of `{"id", "answer"}` objects, which is split back into rows. Rows
+missing from the answer or with an invalid answer are sent one by one.
+"""
+import json
+import re
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from .scheduler import estimate_tokens
+
+INSTRUCTIONS = (
+    'You will receive {size} numbered tasks. Complete each task independently '
+    'of the others. Respond only with a JSON array of {size} objects, one per '
+    'task in the same order, each with the number of the task in `id` and '
+    'your response to it as a string in `answer`.'
+)
+
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def _system(messages: list[dict]) -> str:
+    return ''.join(m['content'] for m in messages if m['role'] == 'system')
+
+
+def _user(messages: list[dict]) -> str:
+    return '\n'.join(m['content'] for m in messages if m['role'] != 'system')
+
+
+def pack(
+    messages: list[list[dict]],
+    model: str | None = None,
+    max_rows: int = 8,
+    max_tokens: int = 2000,
+) -> list[list[int]]:
+    """Groups consecutive rows with the same system prompt.
+
+    Args:
+        messages: Messages of every row.
+        model: The model, used to estimate the number of tokens.
+        max_rows: Maximum number of rows in a group.
+        max_tokens: Maximum estimated number of tokens of the tasks in a group.
+
+    Returns:
+        Positions of the rows of every group.
+    """
+    groups = []
+    group_system = None
+    size = 0
+    for i, x in enumerate(messages):
+        system = _system(x)
+        tokens = estimate_tokens(_user(x), model)
+        if (
+            not groups
+            or system != group_system
+            or len(groups[-1]) >= max_rows
+            or size + tokens > max_tokens
+        ):
+            groups.append([])
+            group_system = system
+            size = 0
+        groups[-1].append(i)
+        size += tokens
+    return groups
+
+
+def packed_messages(messages: list[list[dict]]) -> list[dict]:
+    """Combines the messages of a group of rows into a single request."""
+    system = _system(messages[0])
+    instructions = INSTRUCTIONS.format(size=len(messages))
+    tasks = '\n\n'.join(
+        f'### Task {k}\n{_user(x)}' for k, x in enumerate(messages, start=1)
+    )
+    return [
+        {
+            'role': 'system',
+            'content': f'{system}\n\n{instructions}' if system else instructions,
+        },
+        {'role': 'user', 'content': tasks},
+    ]
+
+
+def split_answers(content: str | None, size: int) -> list[str | None]:
+    """Splits the response to a packed request into answers to the tasks.
+
+    Returns:
+        The answer to every task, or None if it is missing or invalid.
+    """
+    answers = [None] * size
+    text = _FENCE.sub('', (content or '').strip())
+    start, end = text.find('['), text.rfind(']')
+    try:
+        data = json.loads(text[start:end + 1] if start >= 0 else text)
+    except json.JSONDecodeError:
+        return answers
+    if isinstance(data, dict):
+        # JSON mode returns objects, e.g. {"answers": [...]}
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        return answers
+
+    for position, item in enumerate(data):
+        if isinstance(item, dict):
+            k, answer = item.get('id'), item.get('answer')
+            try:
+                k = int(k) - 1
+            except (TypeError, ValueError):
+                continue
+        elif len(data) == size:
+            # A plain array of answers in the order of tasks
+            k, answer = position, item
+        else:
+            continue
+        if not 0 <= k < size or answers[k] is not None:
+            continue
+        if isinstance(answer, (str, int, float, bool)):
+            answers[k] = str(answer)
+    return answers
+
+
+async def run_packed(
+    run: Callable[..., Awaitable[list[list[str]]]],
+    messages: list[list[dict]],
+    model: str | None = None,
+    max_rows: int = 8,
+    max_tokens: int = 2000,
+    log: Callable[[str], Any] | None = None,
+    callback: Callable[[int, list[str]], Any] | None = None,
+) -> list[list[str]]:
+    """Completes rows in packed requests and the rows that fail one by one.
+
+    Args:
+        run: A function that completes lists of messages and reports the
+            results with the callback it is given, e.g. through `run_cached`.
+            It is called with `packed=True` for packed requests, which need
+            a larger completion budget.
+        messages: Messages of every row.
+        model: The model, used to estimate the number of tokens.
+        max_rows: Maximum number of rows in a request.
+        max_tokens: Maximum estimated number of tokens of the rows in a request.
+        log: A function to report the number of rows sent one by one with.
+        callback: A function called with the position and the result of
+            every row as soon as it is done.
+
+    Returns:
+        A single choice for every row, in the order of `messages`.
+    """
+    results: list[list[str] | None] = [None] * len(messages)
+
+    def _done(i: int, result: list[str]) -> None:
+        results[i] = result
+        if callback is not None:
+            callback(i, result)
+
+    groups = [g for g in pack(messages, model, max_rows, max_tokens) if len(g) > 1]
+
+    def _packed(j: int, result: list[str]) -> None:
+        for i, answer in zip(groups[j], split_answers(result[0], len(groups[j]))):
+            if answer is not None:
+                _done(i, [answer])
+
+    if groups:
+        await run(
+            [packed_messages([messages[i] for i in g]) for g in groups],
+            callback=_packed,
+            packed=True,
+        )
+
+    single = [i for i, result in enumerate(results) if result is None]
+    if log is not None:
+        failed = len(single) - (len(messages) - sum(len(g) for g in groups))
+        log(
+            f'Packed {len(messages) - len(single)} rows into {len(groups)} '
+            f'requests, {failed} rows failed to parse and are sent one by one'
+        )
+    if single:
+        await run(
+            [messages[i] for i in single],
+            callback=lambda j, result: _done(single[j], result),
+            packed=False,
+        )
+    return results
@@ -0,0 +1,340 @@
+"""Request scheduling for OpenAI processors.
+
+Processors used to send a request for every row at once. The scheduler
+runs them with a bounded number of requests in flight and keeps within
+the rate limits of the account:
+
+- a token bucket for requests per minute and another one for tokens per
+  minute (estimated from the prompt and the completion budget);
+- when the API answers with 429, all requests pause for the time given in
+  `Retry-After` (or an exponential backoff), the number of requests in
+  flight is halved and then restored one by one as requests succeed;
+- connection errors, timeouts and server errors are retried with an
+  exponential backoff, without slowing down other requests;
+- progress is reported at most every `progress_interval` seconds.
+
+The scheduler owns retries, so the client it runs requests with must not
+retry them itself (see `SharedClient`).
+"""
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import openai
+
+try:
+    import tiktoken
+    _TIKTOKEN_INSTALLED = True
+except ImportError:
+    _TIKTOKEN_INSTALLED = False
+
+_CHARS_PER_TOKEN = 4
+_TOKENS_PER_MESSAGE = 4
+
+
+def _encoding(model: str | None) -> Any:
+    try:
+        return tiktoken.encoding_for_model(model or '')
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def estimate_tokens(
+    messages: list[dict] | str,
+    model: str | None = None,
+    completion_tokens: int = 0,
+) -> int:
+    """Estimates the number of tokens a request counts against the limit.
+
+    Prompts are counted with `tiktoken` if it is installed, otherwise as
+    one token per four characters. Only text parts of messages are counted.
+
+    Args:
+        messages: Chat messages or a plain prompt.
+        model: The model, used to choose the encoding.
+        completion_tokens: Tokens reserved for the completion, i.e.
+            `max_tokens * n`, which OpenAI counts against the limit as well.
+    """
+    if isinstance(messages, str):
+        messages = [{'content': messages}]
+
+    texts = []
+    for message in messages:
+        content = message.get('content') or ''
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(
+                part.get('text', '') for part in content if isinstance(part, dict)
+            )
+
+    if _TIKTOKEN_INSTALLED:
+        encoding = _encoding(model)
+        prompt = sum(len(encoding.encode(t)) for t in texts)
+    else:
+        prompt = sum(len(t) for t in texts) // _CHARS_PER_TOKEN + 1
+
+    return prompt + _TOKENS_PER_MESSAGE * len(messages) + (completion_tokens or 0)
+
+
+class TokenBucket:
+    """Allows `rate` units per minute with bursts of up to `capacity` units.
+
+    OpenAI enforces limits over periods shorter than a minute, so by default
+    the bucket holds a second worth of units rather than a minute worth.
+
+    Args:
+        rate: Units per minute.
+        capacity: Size of the bucket. Defaults to `rate / 60`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate / 60
+        self.capacity = capacity or max(1.0, self.rate)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # A request larger than the bucket waits for a full bucket and
+        # leaves it in debt, so the average rate is kept anyway
+        required = min(amount, self.capacity)
+        # The lock keeps requests in order, so large ones are not starved
+        async with self._lock:
+            self._refill()
+            while self._level < required:
+                await asyncio.sleep((required - self._level) / self.rate)
+                self._refill()
+            self._level -= amount
+
+
+def _retry_after(error: openai.APIStatusError) -> float | None:
+    headers = error.response.headers
+    try:
+        if (ms := headers.get('retry-after-ms')) is not None:
+            return float(ms) / 1000
+        if (seconds := headers.get('retry-after')) is not None:
+            return float(seconds)
+    except ValueError:
+        pass
+    return None
+
+
+def _is_transient(error: openai.APIError) -> bool:
+    """Tells whether a request is worth retrying, as the OpenAI client does."""
+    if isinstance(error, openai.APIConnectionError):
+        # Timeouts included
+        return True
+    return isinstance(error, openai.APIStatusError) and (
+        error.status_code in (408, 409) or error.status_code >= 500
+    )
+
+
+class Scheduler:
+    """Runs OpenAI requests within concurrency and rate limits.
+
+    Args:
+        max_concurrency: Maximum number of requests in flight.
+        requests_per_minute: Limit of requests per minute, if any.
+        tokens_per_minute: Limit of tokens per minute, if any.
+        max_retries: Number of retries of a request rejected with 429 or
+            failed with a transient error.
+        backoff: Base of the exponential backoff in seconds, used when
+            the response has no `Retry-After` header.
+        max_backoff: Maximum pause before a retry in seconds.
+        log: A function to report progress with, e.g. `ctx.logger.info`.
+        progress_interval: Minimum number of seconds between reports.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        log: Callable[[str], Any] | None = None,
+        progress_interval: float = 10.0,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.log = log
+        self.progress_interval = progress_interval
+
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None  # noqa: E501
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._limit = self.max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._condition = asyncio.Condition()
+
+        self.total = 0
+        self.done = 0
+        self.rate_limited = 0
+        self._started = 0.0
+        self._reported = 0.0
+
+    async def _wait_for_slot(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+
+    async def _release(self, success: bool, decrease: bool) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            # Multiplicative decrease, additive increase
+            if decrease:
+                self._limit = max(1, self._limit // 2)
+                self._successes = 0
+            elif success and self._limit < self.max_concurrency:
+                self._successes += 1
+                if self._successes >= self._limit:
+                    self._limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    async def _pause(self) -> None:
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def _report(self, force: bool = False) -> None:
+        if self.log is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._reported < self.progress_interval:
+            return
+        self._reported = now
+        elapsed = now - self._started
+        rate = self.done / elapsed * 60 if elapsed > 0 else 0.0
+        self.log(
+            f'{self.done}/{self.total} requests done in {elapsed:.1f}s '
+            f'({rate:.0f}/min, {self._limit} in flight at most, '
+            f'{self.rate_limited} rate limited)'
+        )
+
+    async def submit(
+        self, request: Callable[[], Awaitable[Any]], tokens: int = 0
+    ) -> Any:
+        """Runs a request once the limits allow it.
+
+        Args:
+            request: A function that sends the request. It is called again
+                if the request is rejected with 429 or fails with a transient
+                error.
+            tokens: The estimated number of tokens of the request.
+
+        Returns:
+            The result of the request.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._pause()
+            await self._wait_for_slot()
+            success = decrease = False
+            retry_in = 0.0
+            try:
+                if self._requests is not None:
+                    await self._requests.acquire(1)
+                if self._tokens is not None and tokens:
+                    await self._tokens.acquire(tokens)
+                # Other requests may have been rate limited in the meantime
+                await self._pause()
+                result = await request()
+                success = True
+                return result
+            except openai.RateLimitError as e:
+                self.rate_limited += 1
+                now = time.monotonic()
+                # Requests in flight during a pause were sent before it, so
+                # only the first of them reduces the concurrency
+                decrease = now >= self._resume_at
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt * (1 + random.random())
+                self._resume_at = max(
+                    self._resume_at, now + min(delay, self.max_backoff)
+                )
+            except openai.APIError as e:
+                if attempt == self.max_retries or not _is_transient(e):
+                    raise
+                # Other requests are not affected, only this one waits
+                retry_in = min(
+                    self.backoff * 2 ** attempt * (1 + random.random()),
+                    self.max_backoff,
+                )
+            finally:
+                await self._release(success, decrease)
+            await asyncio.sleep(retry_in)
+
+    async def run(
+        self,
+        requests: list[Callable[[], Awaitable[Any]]],
+        tokens: list[int] | None = None,
+        callback: Callable[[int, Any], Any] | None = None,
+    ) -> list[Any]:
+        """Runs all requests and returns their results in order.
+
+        Args:
+            requests: Functions that send the requests.
+            tokens: The estimated number of tokens of every request.
+            callback: A function called with the position and the result of
+                every request as soon as it is done.
+        """
+        tokens = tokens or [0] * len(requests)
+        self.total += len(requests)
+        self._started = self._started or time.monotonic()
+
+        results = [None] * len(requests)
+        pending = iter(range(len(requests)))
+
+        # A fixed pool of workers, so that a large input does not create
+        # a waiting task for every row
+        async def _worker() -> None:
+            for i in pending:
+                results[i] = await self.submit(requests[i], tokens[i])
+                if callback is not None:
+                    callback(i, results[i])
+                self.done += 1
+                self._report()
+
+        workers = [
+            asyncio.create_task(_worker())
+            for _ in range(min(self.max_concurrency, len(requests)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            raise
+        finally:
+            self._report(force=True)
+        return results
+
+
+def scheduler_from_conf(
+    conf: Any, log: Callable[[str], Any] | None = None
+) -> Scheduler:
+    """Creates a scheduler with the limits from the configuration."""
+    return Scheduler(
+        max_concurrency=conf.max_concurrency,
+        requests_per_minute=conf.requests_per_minute,
+        tokens_per_minute=conf.tokens_per_minute,
+        max_retries=conf.max_retries,
+        log=log,
+    )
@@ -0,0 +1,117 @@
+"""Incremental output of completions.
+
+Every completed row is appended to a JSONL journal as soon as it is done, as
+records with the index of the input row and the content of a choice. If a
+run is interrupted, the next run reads the journal and skips the rows that
+are already there. Parquet output is assembled from the journal at the end
+of the run, as a parquet file cannot be appended to.
+"""
+import json
+import os
+from collections import defaultdict
+from typing import Any
+
+import pandas as pd
+
+FORMATS = ('.jsonl', '.parquet')
+
+
+def row_key(index: Any) -> str:
+    """A key of a row index value that survives a JSON round trip."""
+    if hasattr(index, 'item'):
+        # NumPy scalars
+        index = index.item()
+    return json.dumps(index, default=str)
+
+
+class ResultWriter:
+    """Appends completions to a file as they finish.
+
+    Args:
+        path: Path of a `.jsonl` or `.parquet` file.
+        resume: Whether to keep completions of a previous run of the file.
+            Otherwise, the file is overwritten.
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in FORMATS:
+            raise ValueError(
+                f"Unsupported output file `{path}`. Supported extensions: {FORMATS}"
+            )
+        self.path = path
+        self.journal = path if self.format == '.jsonl' else path + '.part.jsonl'
+        self.completed: dict[str, list[str]] = defaultdict(list)
+        self._indices: dict[str, Any] = {}
+
+        if resume:
+            if self.format == '.parquet' and os.path.exists(path):
+                for record in pd.read_parquet(path).to_dict(orient='records'):
+                    self._add(record)
+            if os.path.exists(self.journal):
+                self._read_journal()
+        else:
+            for p in {path, self.journal}:
+                if os.path.exists(p):
+                    os.remove(p)
+
+        if parent := os.path.dirname(path):
+            os.makedirs(parent, exist_ok=True)
+        self._file = open(self.journal, 'a', encoding='utf-8')
+
+    def _add(self, record: dict) -> None:
+        key = row_key(record['index'])
+        self._indices[key] = record['index']
+        self.completed[key].append(record['content'])
+
+    def _read_journal(self) -> None:
+        with open(self.journal, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of an interrupted run may be incomplete
+                continue
+            self._add(record)
+        # Rewrite the journal without an incomplete line
+        with open(self.journal, 'w', encoding='utf-8') as f:
+            for key, contents in self.completed.items():
+                for content in contents:
+                    f.write(self._line(self._indices[key], content))
+
+    @staticmethod
+    def _line(index: Any, content: str) -> str:
+        if hasattr(index, 'item'):
+            index = index.item()
+        return json.dumps(
+            {'index': index, 'content': content}, ensure_ascii=False, default=str
+        ) + '\n'
+
+    def write(self, index: Any, contents: list[str]) -> None:
+        """Appends the choices of a row and flushes them to disk."""
+        key = row_key(index)
+        self._indices[key] = index
+        self.completed[key] = list(contents)
+        self._file.write(''.join(self._line(index, c) for c in contents))
+        self._file.flush()
+
+    def close(self, index: pd.Index) -> pd.DataFrame:
+        """Finishes the file and returns completions in the order of `index`.
+
+        Returns:
+            A dataframe with `index` and `content` columns, a row per choice.
+        """
+        self._file.close()
+
+        rows = {'index': [], 'content': []}
+        for i in index:
+            contents = self.completed.get(row_key(i), [])
+            rows['index'].extend([i] * len(contents))
+            rows['content'].extend(contents)
+        df = pd.DataFrame(rows)
+
+        if self.format == '.parquet':
+            df.to_parquet(self.path, index=False)
+            os.remove(self.journal)
+        return df
@@ -0,0 +1,149 @@
+"""Structured outputs for `structured_prompt_completion`.
+
+The `fields` config is compiled once into a JSON schema, which is sent with
+the JSON schema response format, and into a pydantic model, which validates
+the responses. Models that do not support JSON schemas are asked for a JSON
+object with the schema included in the prompt instead.
+"""
+import json
+import re
+from typing import Any
+
+import openai
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+_TYPES = {
+    'string': (str, {'type': 'string'}),
+    'str': (str, {'type': 'string'}),
+    'integer': (int, {'type': 'integer'}),
+    'int': (int, {'type': 'integer'}),
+    'number': (float, {'type': 'number'}),
+    'float': (float, {'type': 'number'}),
+    'boolean': (bool, {'type': 'boolean'}),
+    'bool': (bool, {'type': 'boolean'}),
+}
+
+# List[string], list[int], array[number], ...
+_LIST = re.compile(r'^(?:list|array)(?:\[(?P<item>\w+)\])?$', re.IGNORECASE)
+
+MODES = ('auto', 'json_schema', 'json_object')
+
+
+def _field_type(name: str) -> tuple[Any, dict]:
+    name = (name or 'string').strip()
+    if (match := _LIST.match(name)) is not None:
+        item, item_schema = _field_type(match.group('item') or 'string')
+        return list[item], {'type': 'array', 'items': item_schema}
+    # Types the schema cannot express are returned as strings
+    return _TYPES.get(name.lower(), _TYPES['string'])
+
+
+def _normalize_fields(fields: list | dict | None) -> list[dict]:
+    if isinstance(fields, dict):
+        # {name: description} or {name: {description, type}}
+        return [
+            {'name': name, **(value if isinstance(value, dict) else {
+                'description': value
+            })}
+            for name, value in fields.items()
+        ]
+    return [field for field in fields or [] if field.get('name')]
+
+
+class StructuredOutput:
+    """A JSON schema and a validator compiled from the `fields` config.
+
+    Args:
+        fields: A list of dicts with `name`, `description` and `type` keys,
+            or a dict mapping names to descriptions.
+        mode: 'json_schema' to use the JSON schema response format,
+            'json_object' to use JSON mode with the schema in the prompt,
+            'auto' to use JSON schemas unless the model does not support them.
+    """
+
+    def __init__(self, fields: list | dict | None, mode: str = 'auto') -> None:
+        if mode not in MODES:
+            raise ValueError(
+                f"Unsupported structured output mode `{mode}`. Supported: {MODES}"
+            )
+        fields = _normalize_fields(fields)
+        if not fields:
+            raise ValueError(
+                "At least one field with a `name` should be provided in `fields`"
+            )
+        self.mode = mode
+
+        properties = {}
+        definitions = {}
+        for i, field in enumerate(fields):
+            py_type, schema = _field_type(field.get('type'))
+            description = field.get('description') or ''
+            properties[field['name']] = {**schema, 'description': description}
+            # Names are passed as aliases, as they may be any strings
+            definitions[f'field_{i}'] = (
+                py_type, Field(..., alias=field['name'], description=description)
+            )
+
+        self.schema = {
+            'type': 'object',
+            'properties': properties,
+            'required': list(properties),
+            'additionalProperties': False,
+        }
+        self.model: type[BaseModel] = create_model(
+            'StructuredOutput',
+            __config__=ConfigDict(populate_by_name=True),
+            **definitions,
+        )
+        self._instructions = (
+            'Respond with a JSON object that matches the following JSON schema:\n'
+            + json.dumps(self.schema, ensure_ascii=False)
+        )
+
+    def request(self, message: str, mode: str) -> dict:
+        """Returns the messages and the response format of a request."""
+        if mode == 'json_object':
+            return {
+                'messages': [
+                    {'role': 'user', 'content': f'{message}\n{self._instructions}'}
+                ],
+                'response_format': {'type': 'json_object'},
+            }
+        return {
+            'messages': [{'role': 'user', 'content': message}],
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {
+                    'name': 'structured_output',
+                    'schema': self.schema,
+                    'strict': True,
+                },
+            },
+        }
+
+    def fallback(self, error: openai.BadRequestError, mode: str) -> bool:
+        """Switches to JSON mode if the model does not support JSON schemas.
+
+        Args:
+            error: The error of a request.
+            mode: The mode the request was sent in.
+
+        Returns:
+            Whether the request should be sent again.
+        """
+        if mode != 'auto' or 'response_format' not in str(error):
+            return False
+        # Requests sent at the same time fail as well, but switch only once
+        self.mode = 'json_object'
+        return True
+
+    def parse(self, content: str | None) -> dict[str, Any]:
+        """Validates a response and returns the values of the fields."""
+        try:
+            return self.model.model_validate_json(content or '').model_dump(
+                by_alias=True
+            )
+        except ValidationError as e:
+            raise ValueError(
+                f"The response does not match the fields: {content!r}"
+            ) from e
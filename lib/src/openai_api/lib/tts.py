@@ -9,14 +9,9 @@ async def exec_tts(
     inputs: str,
     conf: Configuration,
     file: str,
+    client: AsyncOpenAI,
 ) -> List[str]:
 
-    client = AsyncOpenAI(
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        organization=conf.organization
-    )
-
     response = await client.audio.speech.create(
         input=inputs,
         model=conf.model or 'tts-1',
@@ -1,65 +1,193 @@
+"""Images for completions with vision.
+
+Images are downscaled to the resolution the model actually looks at with
+the given `detail` level and re-encoded, which is usually a fraction of the
+original size. Encoded images are kept by the hash of the file contents,
+so an image used in many rows is read, resized and encoded once per run.
+"""
+import asyncio
 import base64
+import hashlib
+import io
 import os
 from typing import List
 
 from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from PIL import Image, ImageOps, UnidentifiedImageError
 
 from ..models.configuration.base import Configuration
 
+EXT_TO_MIME = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.tiff': 'image/tiff',
+    '.tif': 'image/tiff',
+    '.webp': 'image/webp',
+}
+
+DETAILS = ('auto', 'low', 'high')
+FORMATS = ('jpeg', 'webp', 'original')
+
+# Images are scaled to fit 512x512 in `low` detail. Otherwise, they are
+# scaled to fit 2048x2048 and then so that the shorter side is 768
+_LOW_SIZE = 512
+_HIGH_SIZE = 2048
+_HIGH_SHORT_SIDE = 768
+
+_MIN_QUALITY = 40
+
+
+def target_size(width: int, height: int, detail: str = 'auto') -> tuple[int, int]:
+    """Returns the size the model sees an image at, never larger than it is."""
+    if detail == 'low':
+        scale = min(1.0, _LOW_SIZE / max(width, height))
+    else:
+        scale = min(
+            1.0,
+            _HIGH_SIZE / max(width, height),
+            _HIGH_SHORT_SIDE / min(width, height),
+        )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ImageEncoder:
+    """Encodes image files as data URLs, once per distinct image.
+
+    Args:
+        detail: The detail level of images: 'auto', 'low' or 'high'.
+        image_format: 'jpeg' or 'webp' to re-encode images, 'original' to
+            send files as they are.
+        quality: The quality of re-encoded images, from 1 to 100.
+        max_bytes: The quality is lowered, and then the image is scaled down,
+            until the encoded image fits this size.
+    """
+
+    def __init__(
+        self,
+        detail: str = 'auto',
+        image_format: str = 'jpeg',
+        quality: int = 85,
+        max_bytes: int = 1024 * 1024,
+    ) -> None:
+        if detail not in DETAILS:
+            raise ValueError(f"Unsupported detail `{detail}`. Supported: {DETAILS}")
+        if image_format not in FORMATS:
+            raise ValueError(
+                f"Unsupported image format `{image_format}`. Supported: {FORMATS}"
+            )
+        self.detail = detail
+        self.image_format = image_format
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.bytes_sent = 0
+        self._by_path: dict[str, asyncio.Future] = {}
+        self._by_digest: dict[str, str] = {}
+
+    async def data_url(self, path: str) -> str:
+        """Returns the data URL of an image file.
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+        Rows with the same file wait for a single encoding.
+        """
+        if path not in self._by_path:
+            self._by_path[path] = asyncio.ensure_future(
+                asyncio.to_thread(self._encode, path)
+            )
+        return await self._by_path[path]
+
+    def _encode(self, path: str) -> str:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._by_digest:
+            return self._by_digest[digest]
+
+        self.bytes_read += len(data)
+        mime = EXT_TO_MIME.get(os.path.splitext(path)[1].lower())
+        if self.image_format != 'original':
+            try:
+                data, mime = self._convert(data)
+            except UnidentifiedImageError:
+                # Sent as is, the API reports if it cannot read the image
+                pass
+        assert mime is not None, (
+            f'Unsupported image type: {os.path.splitext(path)[1]}'
+        )
+        self.bytes_sent += len(data)
+
+        url = f'data:{mime};base64,{base64.b64encode(data).decode("utf-8")}'
+        self._by_digest[digest] = url
+        return url
+
+    def _convert(self, data: bytes) -> tuple[bytes, str]:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        image = image.resize(
+            target_size(*image.size, self.detail), Image.Resampling.LANCZOS
+        )
+        if self.image_format == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+            # JPEG has no transparency, WebP keeps it
+            image = image.convert(
+                'RGBA'
+                if self.image_format == 'webp' and image.has_transparency_data
+                else 'RGB'
+            )
+
+        quality = self.quality
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.image_format.upper(), quality=quality)
+            if buffer.tell() <= self.max_bytes or min(image.size) <= 64:
+                break
+            if quality > _MIN_QUALITY:
+                quality = max(_MIN_QUALITY, quality - 15)
+            else:
+                image = image.resize(
+                    (image.width * 3 // 4, image.height * 3 // 4),
+                    Image.Resampling.LANCZOS,
+                )
+        return buffer.getvalue(), f'image/{self.image_format}'
+
+    def stats(self) -> str:
+        saved = 1 - self.bytes_sent / self.bytes_read if self.bytes_read else 0.0
+        return (
+            f'Images: {len(self._by_digest)} distinct of {len(self._by_path)} '
+            f'files, {self.bytes_read / 1024:.0f}KB encoded as '
+            f'{self.bytes_sent / 1024:.0f}KB ({saved:.0%} smaller)'
+        )
 
 
 async def exec_vision(
     messages: List[dict[str, str]],
-    inputs: str,
+    image_url: str,
     conf: Configuration,
-    is_link: bool = False
+    client: AsyncOpenAI,
+    detail: str = 'auto',
 ) -> List[ChatCompletionMessage]:
-    ext_to_mime = {
-        '.png': 'image/png',
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.gif': 'image/gif',
-        '.bmp': 'image/bmp',
-        '.tiff': 'image/tiff',
-        '.tif': 'image/tiff',
-        '.webp': 'image/webp',
-    }
-
-    if not is_link:
-        image_type = os.path.splitext(inputs)[1]
-        assert image_type in ext_to_mime, f'Unsupported image type: {image_type}'
-
-        image_type = ext_to_mime[image_type]
+    """Completes the messages with the image attached to user messages.
 
+    Args:
+        image_url: A link to the image or its data URL.
+    """
     image_content = {
         'type': 'image_url',
-        'image_url': {
-            "url": f"data:image/{image_type};base64,{encode_image(inputs)}"
-            if not is_link else inputs
-        }
+        'image_url': {'url': image_url, 'detail': detail},
     }
 
-    for i in range(len(messages)):
-        if messages[i]['role'] == 'user':
-            content = [
-                {
-                    'type': 'text',
-                    'text': messages[i]['content']
-                },
-                image_content
-            ]
-            messages[i]['content'] = content
-
-    client = AsyncOpenAI(
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        organization=conf.organization
-    )
+    # Messages are copied, as the request is sent again if it is rate limited
+    messages = [
+        {
+            **message,
+            'content': [
+                {'type': 'text', 'text': message['content']},
+                image_content,
+            ],
+        } if message['role'] == 'user' else message
+        for message in messages
+    ]
 
     response: ChatCompletion = await client.chat.completions.create(
         messages=messages,
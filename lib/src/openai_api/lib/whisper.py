@@ -1,31 +1,137 @@
-from typing import List
+"""Transcription of audio files with Whisper.
+
+Files are uploaded straight from the share path. Long recordings are split
+into segments of about `segment_duration` seconds, which are transcribed
+concurrently and joined in order. Segments are cut at the quietest moment
+before the target length, so that words are not split in half, and are
+re-encoded as 16 kHz mono WAV, which is what Whisper works with and keeps
+every segment under the upload limit.
+"""
+import os
+from typing import NamedTuple
 
 from openai import AsyncOpenAI
-from openai.types.audio import Transcription
+from pydub import AudioSegment
 
 from ..models.configuration.base import Configuration
 
+MB = 1024 * 1024
+
+# The limit of a file uploaded to the transcriptions endpoint
+MAX_FILE_SIZE = 25 * MB
+
+_FRAME_RATE = 16_000
+_BYTES_PER_SECOND = _FRAME_RATE * 2
+# Longest segment that fits under the limit with some room for the header
+_MAX_SEGMENT_SECONDS = MAX_FILE_SIZE * 0.95 / _BYTES_PER_SECOND
+
+# Cuts are searched for in frames of this many milliseconds ...
+_FRAME_MS = 100
+# ... at most this many milliseconds before the target length
+_SEARCH_MS = 30_000
+
+
+class Segment(NamedTuple):
+    """A part of an audio file.
+
+    Attributes:
+        offset: The start of the segment in the file in seconds.
+        path: The path of the segment or of the whole file.
+        name: The file name sent to the API, its extension tells the format.
+    """
+
+    offset: float
+    path: str
+    name: str
+
+
+def _quietest(audio: AudioSegment, start: int, end: int) -> int:
+    """Returns the middle of the quietest frame between `start` and `end` ms."""
+    best, best_rms = end, None
+    for t in range(max(start, 0), end - _FRAME_MS + 1, _FRAME_MS):
+        rms = audio[t:t + _FRAME_MS].rms
+        # The latest of equally quiet frames keeps segments close to the target
+        if best_rms is None or rms <= best_rms:
+            best, best_rms = t + _FRAME_MS // 2, rms
+    return best
+
+
+def split_audio(
+    path: str, name: str, segment_duration: float | None, directory: str
+) -> list[Segment]:
+    """Splits a long audio file on silence.
+
+    Args:
+        path: The path of the file.
+        name: The name of the file, e.g. its share key.
+        segment_duration: The target length of segments in seconds, at least
+            1. Files are split only if they are too large to upload if None.
+        directory: A directory to write segments to, created if necessary.
+            Segments of different files must not share a directory.
+
+    Returns:
+        Segments of the file in order, or the whole file if it is short enough.
+    """
+    if segment_duration is not None and segment_duration < 1:
+        # Shorter segments would never move the cut forward
+        raise ValueError(
+            f"`segment_duration` should be at least 1 second, got {segment_duration}"
+        )
+
+    size = os.path.getsize(path)
+    if segment_duration is None and size <= MAX_FILE_SIZE:
+        return [Segment(0.0, path, name)]
+
+    audio = AudioSegment.from_file(path)
+    seconds = min(segment_duration or _MAX_SEGMENT_SECONDS, _MAX_SEGMENT_SECONDS)
+    target = int(seconds * 1000)
+    # A short tail is not worth a request of its own
+    if len(audio) <= target * 1.25 and size <= MAX_FILE_SIZE:
+        return [Segment(0.0, path, name)]
+
+    audio = audio.set_channels(1).set_frame_rate(_FRAME_RATE).set_sample_width(2)
+    cuts = [0]
+    while len(audio) - cuts[-1] > target:
+        end = cuts[-1] + target
+        cuts.append(_quietest(audio, end - min(_SEARCH_MS, target // 4), end))
+    cuts.append(len(audio))
+
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    segments = []
+    for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        segment_path = os.path.join(directory, f'{stem}_{i}.wav')
+        audio[start:end].export(segment_path, format='wav')
+        segments.append(Segment(start / 1000, segment_path, f'{stem}_{i}.wav'))
+    return segments
+
+
+def join_transcripts(segments: list[Segment], texts: list[str]) -> str:
+    """Joins transcripts of the segments of a file in the order of offsets."""
+    ordered = sorted(zip(segments, texts), key=lambda x: x[0].offset)
+    return ' '.join(text.strip() for _, text in ordered if text and text.strip())
+
 
 async def exec_whisper(
     conf: Configuration,
     file: str,
+    client: AsyncOpenAI,
     prompt: str = None,
-) -> List[Transcription]:
-
-    client = AsyncOpenAI(
-        api_key=conf.api_key,
-        max_retries=conf.max_retries,
-        organization=conf.organization
-    )
-
-    response: str = await client.audio.transcriptions.create(
-        file=open(file, 'rb'),
-        model='whisper-1',
-        language=conf.language,
-        response_format='text',
-        prompt=prompt,
-        temperature=conf.temperature,
-    )
+    name: str | None = None,
+) -> str:
+    """Transcribes a file, streaming it from disk.
 
+    Args:
+        name: The file name sent to the API. Defaults to the name of `file`.
+    """
+    with open(file, 'rb') as f:
+        response: str = await client.audio.transcriptions.create(
+            file=(os.path.basename(name or file), f),
+            model='whisper-1',
+            language=conf.language,
+            response_format='text',
+            prompt=prompt,
+            temperature=conf.temperature,
+        )
 
     return response
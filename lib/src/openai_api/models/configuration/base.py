@@ -29,6 +29,137 @@ class Configuration(BaseModel):
         description="The maximum number of retries in case of API failure",
     )
 
+    max_concurrency: int = Field(
+        16,
+        description="The maximum number of requests in flight at the same time",
+    )
+
+    requests_per_minute: Optional[float] = Field(
+        None,
+        description="The limit of requests per minute. Not limited if not set",
+    )
+
+    tokens_per_minute: Optional[float] = Field(
+        None,
+        description="The limit of tokens per minute. Not limited if not set",
+    )
+
+    max_connections: int = Field(
+        100,
+        description="The maximum number of connections to the API",
+    )
+
+    max_keepalive_connections: int = Field(
+        20,
+        description="The maximum number of idle connections kept open",
+    )
+
+    keepalive_expiry: float = Field(
+        30.0,
+        description="The number of seconds an idle connection is kept open",
+    )
+
+    timeout: float = Field(
+        600.0,
+        description="The timeout of a request in seconds",
+    )
+
+    connect_timeout: float = Field(
+        5.0,
+        description="The timeout of connecting to the API in seconds",
+    )
+
+    http2: bool = Field(
+        True,
+        description="Whether to use HTTP/2 if the `h2` package is installed",
+    )
+
+    execution: str = Field(
+        'online',
+        description="How chat completions are requested: `online` or `batch` (the Batch API)",  # noqa: E501
+    )
+
+    batch_poll_interval: float = Field(
+        30.0,
+        description="The number of seconds between checks of the status of batches",
+    )
+
+    batch_size: int = Field(
+        50_000,
+        description="The maximum number of requests in a batch",
+    )
+
+    cache: bool = Field(
+        False,
+        description="Whether to cache responses on disk",
+    )
+
+    cache_dir: Optional[str] = Field(
+        None,
+        description="The directory of the response cache. Defaults to a directory in the app directory",  # noqa: E501
+    )
+
+    cache_ttl: Optional[float] = Field(
+        None,
+        description="The number of seconds cached responses are valid for. Never expire if not set",  # noqa: E501
+    )
+
+    cache_size_mb: int = Field(
+        1024,
+        description="The maximum size of the response cache in megabytes",
+    )
+
+    force_cache: bool = Field(
+        False,
+        description="Whether to cache responses sampled with a positive temperature",
+    )
+
+    pack_size: int = Field(
+        1,
+        description="The maximum number of rows sent in a single chat request",
+    )
+
+    pack_max_tokens: int = Field(
+        2000,
+        description="The maximum estimated number of prompt tokens of the rows packed into a request",  # noqa: E501
+    )
+
+    output_file: Optional[str] = Field(
+        None,
+        description="A `.jsonl` or `.parquet` file in the app directory to write completed rows to as they finish",  # noqa: E501
+    )
+
+    resume: bool = Field(
+        False,
+        description="Whether to skip rows already written to `output_file` by an interrupted run",  # noqa: E501
+    )
+
+    segment_duration: Optional[float] = Field(
+        600.0,
+        ge=1,
+        description="Audio longer than this number of seconds is split into segments transcribed concurrently",  # noqa: E501
+    )
+
+    detail: str = Field(
+        'auto',
+        description="The detail level of images: `auto`, `low` or `high`",
+    )
+
+    image_format: str = Field(
+        'jpeg',
+        description="The format images are re-encoded to: `jpeg`, `webp` or `original` to send files as they are",  # noqa: E501
+    )
+
+    image_quality: int = Field(
+        85,
+        description="The quality of re-encoded images, from 1 to 100",
+    )
+
+    max_image_kb: int = Field(
+        1024,
+        description="The maximum size of a re-encoded image in kilobytes",
+    )
+
     include_index: bool = Field(
         False,
         description="Whether to include the index of rows in the response.",
@@ -1,13 +1,190 @@
+"""A pool of long-lived crawler processes.
+
+A Twisted reactor cannot be restarted, so every crawl used to run in a new
+process, which imported scrapy and started a reactor for a single batch of
+links. The pool starts a fixed number of processes once. Each of them runs
+a reactor with up to `concurrency` crawls at a time, takes batches of links
+from a queue, and sends scraped items back through another queue.
+"""
+import atexit
+import multiprocessing
+import queue
+import time
+import uuid
+from collections.abc import Generator
+
+from scrapy import signals
 from scrapy.crawler import CrawlerRunner
 
 
-def crawl(settings, spider_cls, *args, **kwargs):
-    process = CrawlerRunner(settings=settings)
-    from twisted.internet import reactor
-    d = process.crawl(
-        spider_cls,
-        *args,
-        **kwargs
-    )
-    d.addBoth(lambda _: reactor.stop())
-    reactor.run()
+def _serve(tasks, results, concurrency: int) -> None:
+    """Runs crawls from `tasks` until it receives None."""
+    from scrapy.settings import Settings
+    from scrapy.utils.reactor import install_reactor
+
+    # The reactor scrapy expects has to be installed before it is imported
+    if reactor_path := Settings().get('TWISTED_REACTOR'):
+        install_reactor(reactor_path)
+
+    from itemadapter import ItemAdapter
+    from twisted.internet import defer, reactor, threads
+
+    semaphore = defer.DeferredSemaphore(concurrency)
+
+    def _crawl(
+        task_id: str, settings: dict, spider_cls: type, kwargs: dict
+    ) -> defer.Deferred:
+        items = []
+
+        def _collect(item) -> None:
+            items.append(ItemAdapter(item).asdict())
+
+        runner = CrawlerRunner(settings=settings)
+        crawler = runner.create_crawler(spider_cls)
+        crawler.signals.connect(_collect, signal=signals.item_scraped, weak=False)
+        d = runner.crawl(crawler, **kwargs)
+        d.addCallbacks(
+            lambda _: results.put((task_id, items, None)),
+            lambda failure: results.put((task_id, None, failure.getTraceback())),
+        )
+        return d
+
+    @defer.inlineCallbacks
+    def _loop() -> Generator[defer.Deferred, None, None]:
+        while True:
+            yield semaphore.acquire()
+            task = yield threads.deferToThread(tasks.get)
+            if task is None:
+                semaphore.release()
+                break
+            try:
+                d = _crawl(*task)
+            except Exception as e:
+                results.put((task[0], None, repr(e)))
+                semaphore.release()
+                continue
+            d.addBoth(lambda _: semaphore.release())
+        # Crawls in flight hold the rest of the semaphore
+        yield defer.gatherResults([semaphore.acquire() for _ in range(concurrency)])
+        reactor.stop()
+
+    reactor.callWhenRunning(_loop)
+    reactor.run(installSignalHandlers=False)
+
+
+class CrawlerPool:
+    """Crawls batches of links in worker processes.
+
+    Args:
+        processes: Number of worker processes.
+        concurrency: Number of crawls a process runs at the same time.
+    """
+
+    def __init__(self, processes: int = 4, concurrency: int = 8) -> None:
+        self.processes = max(1, processes)
+        self.concurrency = max(1, concurrency)
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._workers = [
+            multiprocessing.Process(
+                target=_serve,
+                args=(self._tasks, self._results, self.concurrency),
+                daemon=True,
+            )
+            for _ in range(self.processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._terminated = False
+
+    @property
+    def alive(self) -> bool:
+        return not self._terminated and all(w.is_alive() for w in self._workers)
+
+    def map(
+        self,
+        settings: dict,
+        spider_cls: type,
+        batches: list[dict],
+        timeout: float | None = None,
+    ) -> list[list[dict]]:
+        """Crawls every batch and returns the items scraped from each of them.
+
+        Args:
+            settings: Scrapy settings of the crawls.
+            spider_cls: The spider.
+            batches: Keyword arguments of the spider for every crawl,
+                e.g. `start_urls`.
+            timeout: The number of seconds to wait for all crawls.
+
+        Returns:
+            Items of every batch, in the order of `batches`.
+        """
+        ids = [uuid.uuid4().hex for _ in batches]
+        for task_id, kwargs in zip(ids, batches):
+            self._tasks.put((task_id, settings, spider_cls, kwargs))
+
+        deadline = time.monotonic() + timeout if timeout else None
+        pending = set(ids)
+        items = {}
+        try:
+            while pending:
+                try:
+                    task_id, result, error = self._results.get(timeout=1)
+                except queue.Empty:
+                    if not self.alive:
+                        raise Exception('Scraping failed. A crawler process died')
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(
+                            f'Scraping did not finish in {timeout} seconds. '
+                            'Try decreasing `max_results` or `timeout` options'
+                        )
+                    continue
+                if error is not None:
+                    raise Exception(f'Scraping failed. {error}')
+                items[task_id] = result
+                pending.discard(task_id)
+        except BaseException:
+            # Crawls of this call may still be queued or running
+            self.terminate()
+            raise
+        return [items[task_id] for task_id in ids]
+
+    def close(self, timeout: float = 10) -> None:
+        """Stops the workers once they finish crawls in flight."""
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        self.terminate()
+
+    def terminate(self) -> None:
+        self._terminated = True
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+
+_pool: CrawlerPool | None = None
+
+
+def get_pool(processes: int = 4, concurrency: int = 8) -> CrawlerPool:
+    """Returns the pool of the app, starting it on first use."""
+    global _pool
+    processes, concurrency = max(1, processes), max(1, concurrency)
+    if (
+        _pool is None
+        or not _pool.alive
+        or (_pool.processes, _pool.concurrency) != (processes, concurrency)
+    ):
+        if _pool is not None:
+            _pool.close()
+        _pool = CrawlerPool(processes, concurrency)
+    return _pool
+
+
+@atexit.register
+def _close_pool() -> None:
+    if _pool is not None:
+        _pool.close()
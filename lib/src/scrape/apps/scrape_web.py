@@ -1,7 +1,4 @@
-import uuid
-
 import apps.lib.crawl
-import apps.lib.proc
 import apps.middleware.selenium
 import apps.spiders.aliexpress
 import apps.spiders.bing
@@ -30,7 +27,13 @@ class ScrapeResult(BaseModel):
 def run_spider(
         scrape_links: DF,
         context: Context
-    ):
+    ) -> list[list[dict]]:
+    """Crawls the links in the crawler pool.
+
+    Returns:
+        Scraped items of every batch of links: of every link if
+        `links_are_independent` is set, otherwise of all of them.
+    """
     spider_cls = SPIDERS.get(context.app_cfg.get('spider', 'text'))
     assert spider_cls, 'Spider not found.'
 
@@ -43,36 +46,30 @@ def run_spider(
     else:
         links = [scrape_links.link.to_list()]
 
-    procs: list[apps.lib.proc.XtProcess] = []
-    ids = []
-
-    for links_batch in links:
-        _id = uuid.uuid4().hex
-        settings = {
-                    'CLOSESPIDER_TIMEOUT': timeout,
-                    'CLOSESPIDER_ITEMCOUNT': context.app_cfg.get('max_results', 0),
-                    'DEPTH_LIMIT': context.app_cfg.get('max_depth', 1),
-                    'FEED_FORMAT': 'json',
-                    "FEED_EXPORT_ENCODING": "utf-8",
-                    'FEED_URI': f'output-{_id}.json'
+    settings = {
+        'CLOSESPIDER_TIMEOUT': timeout,
+        'CLOSESPIDER_ITEMCOUNT': context.app_cfg.get('max_results', 0),
+        'DEPTH_LIMIT': context.app_cfg.get('max_depth', 1),
+    }
+    if context.app_cfg.get('spider', 'text') == 'aliexpress':
+        settings['DOWNLOADER_MIDDLEWARES'] = {
+            apps.middleware.selenium.Selenium : 543
         }
-        if context.app_cfg.get('spider', 'text') == 'aliexpress':
-            settings['DOWNLOADER_MIDDLEWARES'] = {
-                apps.middleware.selenium.Selenium : 543
-            }
 
-        proc = apps.lib.proc.XtProcess(
-            target=apps.lib.crawl.crawl,
-            kwargs={
-                'settings': settings,
-                'spider_cls': eval(spider_cls),
+    pool = apps.lib.crawl.get_pool(
+        context.app_cfg.get('crawler_processes', 4),
+        context.app_cfg.get('crawler_concurrency', 8),
+    )
+    return pool.map(
+        settings,
+        eval(spider_cls),
+        [
+            {
                 'start_urls': links_batch,
                 'allowed_domains': context.app_cfg.get('allowed_domains', []),
                 **context.app_cfg.get('spider_cfg', {})
             }
-        )
-
-        proc.start()
-        procs.append(proc)
-        ids.append(_id)
-    return (procs, ids)
+            for links_batch in links
+        ],
+        timeout=timeout * len(links) if timeout > 0 else None,
+    )
@@ -1,4 +1,3 @@
-import os
 from itertools import islice
 
 import pandas as pd
@@ -185,6 +184,10 @@ scrape_links: DF[ScrapeLinksBing],
         - `links_are_independent`: bool, default False.
             If set, the app will crawl each link independently.
             Otherwise, the app will assume all links comprise a single corpus and will crawl them together.
+        - `crawler_processes`: int, default 4.
+            The number of crawler processes. They are started on the first run and reused by the next ones.
+        - `crawler_concurrency`: int, default 8.
+            The number of crawls a crawler process runs at the same time, e.g. of independent links.
 
     ## Spider Options:
 
@@ -208,32 +211,19 @@ scrape_links: DF[ScrapeLinksBing],
         A dataframe with a textual column named `result`
     """ # noqa: E501
     context.app_cfg['spider'] == 'bing'
-    procs, ids = run_spider(scrape_links, context)
     results = []
-    timeout = context.app_cfg.get('timeout', 15)
-    for proc_, _id in zip(procs, ids):
-        proc_.join(timeout * len(procs) if timeout > 0 else None)
-        # Raise if proc failed
-        if proc_.exitcode != 0:
-            proc_.terminate()
-            raise Exception(f'Scraping failed. {proc_.exception}')
-
-        assert os.path.exists(f'output-{_id}.json'), \
-            "Scraper failed to save the results. Try descresing `max_results` or `timeout` options"  # noqa: E501
-
-        with open(f'output-{_id}.json') as f:
-            max_results = context.app_cfg.get('max_results', 0)
-            df = pd.read_json(f).to_dict('records')
-            if max_results == 0:
-                max_results = len(df)
-
-            results_ = [item['text'] for item in islice(df, max_results)]
-            if context.app_cfg.get('squash_results', False) \
-                or context.app_cfg.get('links_are_independent', False):
-                results.append(
-                    context.app_cfg.get('squash_delimiter',
-                                        '\n').join(results_)
-                )
-            else:
-                results.extend(results_)
+    for df in run_spider(scrape_links, context):
+        max_results = context.app_cfg.get('max_results', 0)
+        if max_results == 0:
+            max_results = len(df)
+
+        results_ = [item['text'] for item in islice(df, max_results)]
+        if context.app_cfg.get('squash_results', False) \
+            or context.app_cfg.get('links_are_independent', False):
+            results.append(
+                context.app_cfg.get('squash_delimiter',
+                                    '\n').join(results_)
+            )
+        else:
+            results.extend(results_)
     return pd.DataFrame({'result': results})
@@ -52,3 +52,11 @@ class ScrapeBySelectors(BaseModel):
     links_are_independent: Optional[bool] = Field(
         False, description='If set, the app will crawl each link independently'
     )
+    crawler_processes: Optional[int] = Field(
+        4,
+        description='The number of crawler processes, started on the first run and reused by the next ones',
+    )
+    crawler_concurrency: Optional[int] = Field(
+        8,
+        description='The number of crawls a crawler process runs at the same time',
+    )
@@ -1,5 +1,4 @@
 import json
-import os
 from itertools import islice
 
 import pandas as pd
@@ -199,6 +198,10 @@ def scrape_by_selectors(
         - `links_are_independent`: bool, default False.
             If set, the app will crawl each link independently.
             Otherwise, the app will assume all links comprise a single corpus and will crawl them together.
+        - `crawler_processes`: int, default 4.
+            The number of crawler processes. They are started on the first run and reused by the next ones.
+        - `crawler_concurrency`: int, default 8.
+            The number of crawls a crawler process runs at the same time, e.g. of independent links.
 
     ## Spider Options
 
@@ -288,55 +291,42 @@ def scrape_by_selectors(
         '\n'
     )
 
-    procs, ids = run_spider(scrape_links, context)
     results = []
-    timeout = context.app_cfg.get('timeout', 15)
 
     if output_type == 'disjoint':
         disjoint = {}
         for component in components:
             disjoint[component['key']] = []
 
-    for proc_, _id in zip(procs, ids):
-        proc_.join(timeout * len(procs) if timeout > 0 else None)
-        # Raise if proc failed
-        if proc_.exitcode != 0:
-            proc_.terminate()
-            raise Exception(f'Scraping failed. {proc_.exception}')
-
-        assert os.path.exists(f'output-{_id}.json'), \
-            "Scraper failed to save the results. Try descresing `max_results` or `timeout` options"  # noqa: E501
-
-        with open(f'output-{_id}.json') as f:
-            max_results = context.app_cfg.get('max_results', 0)
-            df = pd.read_json(f).to_dict('records')
-            if max_results == 0:
-                max_results = len(df)
-
-            if output_type == 'disjoint':
-                for item in islice(df, max_results):
-                    data = json.loads(item['text'])
-                    link = item['url']
-                    for key, val in data.items():
-                        for v in val:
-                            disjoint[key].append(
-                                [
-                                    link,
-                                    v
-                                ]
-                            )
-
-            elif output_type == 'single_table':
-                for item in islice(df, max_results):
-                    data = json.loads(item['text'])
-                    link = item['url']
-                    for i, (key, val) in enumerate(data.items()):
-                        for v in val:
-                            results.append([i, link, key, v])
-
-            else:
-                for item in islice(df, max_results):
-                    results.append([item['url'], item['text']])
+    for df in run_spider(scrape_links, context):
+        max_results = context.app_cfg.get('max_results', 0)
+        if max_results == 0:
+            max_results = len(df)
+
+        if output_type == 'disjoint':
+            for item in islice(df, max_results):
+                data = json.loads(item['text'])
+                link = item['url']
+                for key, val in data.items():
+                    for v in val:
+                        disjoint[key].append(
+                            [
+                                link,
+                                v
+                            ]
+                        )
+
+        elif output_type == 'single_table':
+            for item in islice(df, max_results):
+                data = json.loads(item['text'])
+                link = item['url']
+                for i, (key, val) in enumerate(data.items()):
+                    for v in val:
+                        results.append([i, link, key, v])
+
+        else:
+            for item in islice(df, max_results):
+                results.append([item['url'], item['text']])
 
     if output_type == 'disjoint':
         ret = [
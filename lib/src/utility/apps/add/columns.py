@@ -0,0 +1,112 @@
+"""Typed computed columns for `utility.add_column`.
+
+Values of a new column are built as a single typed array: NumPy arrays for
+numbers, booleans and row numbers, Arrow-backed arrays for strings and
+`uint64` for hashes. Columns are inserted one by one with `DataFrame.insert`,
+which adds a block to the frame and leaves the existing blocks untouched.
+"""
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+KINDS = ('constant', 'row_number', 'hash', 'run_id', 'timestamp')
+
+
+def _constant(value: Any, size: int, dtype: str | None) -> Any:
+    if dtype is not None:
+        return pd.Series(value, index=pd.RangeIndex(size), dtype=dtype).array
+    if isinstance(value, str):
+        # Arrow stores a single buffer instead of a Python object per row
+        return pd.array(pa.repeat(value, size), dtype=pd.StringDtype('pyarrow'))
+    if isinstance(value, (bool, int, float)):
+        return np.full(size, value)
+    return np.full(size, value, dtype=object)
+
+
+def build_column(
+    spec: dict,
+    df: pd.DataFrame,
+    run_id: str,
+    now: pd.Timestamp,
+) -> Any:
+    """Builds values of a column described by `spec`.
+
+    Args:
+        spec: A column description with the `kind` key and its options:
+            `value` for constants, `start` for row numbers, `keys` for hashes
+            and `dtype` for all of them.
+        df: The frame the column is added to.
+        run_id: The identifier of the run for `run_id` columns.
+        now: The time for `timestamp` columns.
+
+    Returns:
+        An array with a value for every row of `df`.
+    """
+    kind = spec.get('kind') or 'constant'
+    dtype = spec.get('dtype')
+    size = len(df)
+
+    if kind == 'constant':
+        return _constant(spec.get('value', 'new_value'), size, dtype)
+    if kind == 'run_id':
+        return _constant(str(run_id), size, dtype)
+    if kind == 'row_number':
+        start = spec.get('start') or 0
+        values = np.arange(start, start + size, dtype=np.int64)
+    elif kind == 'hash':
+        keys = spec.get('keys') or list(df.columns)
+        missing = [k for k in keys if k not in df.columns]
+        if missing:
+            raise ValueError(f"Key columns {missing} are not in the dataframe")
+        values = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    elif kind == 'timestamp':
+        values = pd.DatetimeIndex([now]).repeat(size).array
+    else:
+        raise ValueError(f"Unsupported column kind `{kind}`. Supported: {KINDS}")
+
+    if dtype is not None:
+        return pd.array(values, dtype=dtype)
+    return values
+
+
+def add_columns(
+    df: pd.DataFrame,
+    specs: list[dict],
+    run_id: str,
+) -> pd.DataFrame:
+    """Inserts the columns into the frame in place.
+
+    Values of all columns are computed from the input frame first, so hashes
+    do not depend on other new columns. Then columns are inserted in order,
+    and the position of every column is relative to the frame with the
+    previous columns already inserted, as if `add_column` was chained.
+
+    Columns that already exist raise `ValueError` unless their spec has
+    `skip_if_exists` set, in which case they are left as is.
+    """
+    now = pd.Timestamp.now(tz='UTC')
+    names = [spec.get('column') or 'new_column' for spec in specs]
+
+    new = []
+    seen = set(df.columns)
+    for name, spec in zip(names, specs):
+        if name in seen:
+            if spec.get('skip_if_exists'):
+                continue
+            raise ValueError(
+                f"Collection already has a column {name}. You may "
+                "specify to skip insertion in that case by providing "
+                "`skip_if_exists=True` flag."
+            )
+        seen.add(name)
+        new.append((name, spec, build_column(spec, df, run_id, now)))
+
+    for name, spec, values in new:
+        position = spec.get('position') or 0
+        if position < 0:
+            position = len(df.columns) + position + 1
+        df.insert(position, name, values)
+
+    return df
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 
 from malevich.square import scheme
 from pydantic import BaseModel, Field
@@ -14,12 +14,31 @@ class AddColumn(BaseModel):
     column: Optional[str] = Field(
         'new_column', description='The name of the new column'
     )
+    kind: Optional[str] = Field(
+        'constant',
+        description="How values are computed: 'constant', 'row_number', 'hash', 'run_id' or 'timestamp'",
+    )
     value: Optional[Any] = Field('new_value', description='The value of the new column')
     position: Optional[int] = Field(
         0,
         description='The position to insert the new column. If positive, the new column will be inserted from the beginning of the dataframe. If negative, the new column will be inserted from the end of the dataframe',
     )
+    dtype: Optional[str] = Field(
+        None,
+        description='Type of the new column. By default, the type is inferred from the values',
+    )
+    start: Optional[int] = Field(
+        0, description="The first row number for 'row_number' columns"
+    )
+    keys: Optional[List[str]] = Field(
+        None,
+        description="Columns hashed by 'hash' columns. By default, all columns are hashed",
+    )
     skip_if_exists: Optional[bool] = Field(
         False,
         description="If set, the processor will not raise exeception if column exists."
     )
+    columns: Optional[List[Dict[str, Any]]] = Field(
+        None,
+        description='Descriptions of several columns to add at once. Each one takes the same fields as the configuration',
+    )
@@ -1,11 +1,13 @@
+import pandas as pd
 from malevich.square import DF, Any, Context, processor
 
+from .columns import add_columns
 from .models import AddColumn
 
 
 @processor()
 def add_column(df: DF[Any], context: Context[AddColumn]):
-    """Inserts a new column into a dataframe.
+    """Inserts new columns into a dataframe.
 
     ## Input:
         An arbitrary dataframe and context information
@@ -15,12 +17,24 @@ def add_column(df: DF[Any], context: Context[AddColumn]):
             position: position of the new column
 
     ## Output:
-        The input dataframe with the new column inserted at the specified position.
+        The input dataframe with the new columns inserted at the specified positions.
 
     ## Details:
         The function takes in a dataframe as an input and adds a new column
-        at the specified position. The new column has a constant value provided
-        by the user in the application configuration.
+        at the specified position. By default, the new column has a constant
+        value provided by the user in the application configuration.
+
+        Columns can also be computed: row numbers, hashes of key columns,
+        the identifier of the run or the current time. Values are built as
+        typed arrays (strings are stored in Arrow-backed columns rather than
+        as Python objects), and existing columns of the dataframe are not
+        copied.
+
+        To add several columns at once, provide a list of column descriptions
+        in `columns`. Every description takes the same fields as the
+        configuration itself (`column`, `kind`, `value`, `position`, `dtype`,
+        `start`, `keys`, `skip_if_exists`). Columns are computed from the
+        input dataframe and inserted in order, as if the processor was chained.
 
         If the position is negative, the new column will be inserted from the
         end of the dataframe. For example, a position of -1 will insert the
@@ -29,12 +43,22 @@ def add_column(df: DF[Any], context: Context[AddColumn]):
     ## Configuration:
         - column: str, default 'new_column'.
             The name of the new column.
+        - kind: str, default 'constant'.
+            How values of the column are computed: 'constant' (the `value`), 'row_number' (0, 1, 2, ... shifted by `start`), 'hash' (64-bit hash of `keys` columns), 'run_id' (the identifier of the run) or 'timestamp' (the current UTC time, same for all rows).
         - value: any, default 'new_value'.
             The value of the new column.
         - position: int, default 0.
             The position to insert the new column. If positive, the new column will be inserted from the beginning of the dataframe. If negative, the new column will be inserted from the end of the dataframe.
+        - dtype: str, default null.
+            Type of the new column, e.g. 'int32', 'category' or 'string'. By default, the type is inferred from the values.
+        - start: int, default 0.
+            The first row number for 'row_number' columns.
+        - keys: list[str], default null.
+            Columns hashed by 'hash' columns. By default, all columns are hashed.
         - skip_if_exists: bool, default False.
             If columns exists, no exception will be thrown if this flag is set.
+        - columns: list[dict], default null.
+            Descriptions of several columns to add in a single call. If set, the fields above are ignored.
     -----
 
     Args:
@@ -42,26 +66,10 @@ def add_column(df: DF[Any], context: Context[AddColumn]):
         context: The context information.
 
     Returns:
-        The dataframe with new column.
+        The dataframe with new columns.
     """  # noqa: E501
-    column_name = context.app_cfg.get('column', 'new_column')
-    value = context.app_cfg.get('value', 'new_value')
-    position = context.app_cfg.get('position', 0)
-
-    if position < 0:
-        position = len(df.columns) + position + 1
-
-    if column_name in df.columns:
-        if not context.app_cfg.skip_if_exists:
-            raise ValueError(
-                f"Collection already has a column {column_name}. You may "
-                "specify to skip insertion in that case by providing "
-                "`skip_if_exists=True` flag."
-            )
-    else:
-        df.insert(position, column_name, value)
-
-    return df
+    specs = context.app_cfg.get('columns') or [context.app_cfg]
+    return add_columns(df, specs, context.run_id)
 
 
 @processor()
@@ -77,11 +85,26 @@ def add_index(df: DF[Any], context: Context):
 
     Input dataframe with additional column `index`
 
+    ## Details:
+
+    Values of the index are inserted as the first column and the index is
+    replaced with row numbers. The column keeps the type of the index, and
+    other columns are not copied. The column is named after the index or
+    `index` if the index has no name (`level_0` if `index` is taken).
+
     -----
     Args:
         df (DF[Any]): Any dataframe
     Returns:
         Input dataframe with additional column `index`
     """
-    df.reset_index(inplace=True)
+    if isinstance(df.index, pd.MultiIndex):
+        df.reset_index(inplace=True)
+        return df
+
+    name = df.index.name
+    if name is None:
+        name = 'index' if 'index' not in df.columns else 'level_0'
+    df.insert(0, name, df.index.array)
+    df.index = pd.RangeIndex(len(df))
     return df
@@ -0,0 +1,118 @@
+"""Arrow backend for `utility.concat`.
+
+Every dataframe is converted to an Arrow table once. Schemas are unified
+column by column with a fixed set of promotion rules, missing columns are
+filled with nulls and the tables are concatenated as chunked arrays, so
+the data itself is never copied. Conversion to pandas happens only at the
+boundary, and with Arrow-backed dtypes it does not copy either.
+
+Promotion rules for a column that has different types in different inputs:
+
+- null columns take the type of the others;
+- types Arrow can promote safely are promoted (integers to wider integers,
+  integers to floats, timestamps to a common unit, and so on);
+- anything else becomes a string column.
+"""
+import pandas as pd
+import pyarrow as pa
+
+_CONVERSION_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+
+
+def _to_array(series: pd.Series) -> pa.Array | pa.ChunkedArray:
+    try:
+        # Arrow-backed and numeric columns are wrapped without copying
+        return pa.array(series, from_pandas=True)
+    except _CONVERSION_ERRORS:
+        # Columns of mixed objects are kept as their string representation
+        return pa.array(
+            series.map(str).where(series.notna(), None), type=pa.large_string()
+        )
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    columns = [_to_array(df.iloc[:, i]) for i in range(df.shape[1])]
+    return pa.table(columns, names=[str(c) for c in df.columns])
+
+
+def _promote(types: list[pa.DataType]) -> pa.DataType:
+    types = [t for t in dict.fromkeys(types) if not pa.types.is_null(t)]
+    if not types:
+        return pa.null()
+    if len(types) == 1:
+        return types[0]
+    try:
+        return pa.unify_schemas(
+            [pa.schema([('_', t)]) for t in types], promote_options='permissive'
+        ).field('_').type
+    except _CONVERSION_ERRORS:
+        return pa.large_string()
+
+
+def _cast(column: pa.ChunkedArray, target: pa.DataType) -> pa.ChunkedArray:
+    if column.type == target:
+        return column
+    try:
+        return column.cast(target)
+    except _CONVERSION_ERRORS:
+        # Nested types cannot be cast to strings by Arrow
+        values = column.to_pylist()
+        return pa.chunked_array(
+            [[None if v is None else str(v) for v in values]], type=target
+        )
+
+
+def unify_schemas(tables: list[pa.Table]) -> pa.Schema:
+    """Builds a common schema for the tables.
+
+    Columns follow the order of their first appearance.
+    """
+    types = {}
+    for table in tables:
+        for field in table.schema:
+            types.setdefault(field.name, []).append(field.type)
+    return pa.schema([(name, _promote(t)) for name, t in types.items()])
+
+
+def concat_tables(tables: list[pa.Table]) -> pa.Table:
+    """Concatenates tables with possibly different schemas."""
+    schema = unify_schemas(tables)
+    aligned = []
+    for table in tables:
+        columns = []
+        for field in schema:
+            if field.name in table.column_names:
+                columns.append(_cast(table.column(field.name), field.type))
+            else:
+                columns.append(
+                    pa.chunked_array([pa.nulls(table.num_rows, field.type)])
+                )
+        aligned.append(pa.table(columns, schema=schema))
+    return pa.concat_tables(aligned)
+
+
+def concat_arrow(dfs: list[pd.DataFrame], arrow_dtypes: bool = False) -> pd.DataFrame:
+    """Concatenates dataframes through Arrow.
+
+    Args:
+        dfs: Dataframes to concatenate. Their indexes are ignored.
+        arrow_dtypes: If True, the result keeps Arrow-backed pandas dtypes
+            and the data is not copied. Otherwise it is converted to
+            NumPy-backed dtypes.
+
+    Returns:
+        A concatenated dataframe with a default index.
+    """
+    names = {}
+    for df in dfs:
+        for c in df.columns:
+            names.setdefault(str(c), c)
+
+    table = concat_tables([_to_table(df) for df in dfs])
+    if arrow_dtypes:
+        result = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        result = table.to_pandas()
+    # Arrow column names are strings, original names are restored
+    result.columns = [names[c] for c in table.column_names]
+    return result
@@ -0,0 +1 @@
+from .concat_model import Concat
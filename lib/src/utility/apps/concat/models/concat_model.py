@@ -0,0 +1,21 @@
+# generated by datamodel-codegen:
+#   filename:  concat_model.json
+
+from __future__ import annotations
+
+from typing import Optional
+
+from malevich.square import scheme
+from pydantic import BaseModel, Field
+
+
+@scheme()
+class Concat(BaseModel):
+    backend: Optional[str] = Field(
+        'pandas',
+        description="Either 'pandas' or 'arrow'. With 'arrow', schemas are unified, missing columns are filled with nulls and the data is concatenated without copying",
+    )
+    arrow_dtypes: Optional[bool] = Field(
+        False,
+        description="If true, the 'arrow' backend returns Arrow-backed columns instead of converting them to NumPy-backed ones",
+    )
@@ -1,9 +1,14 @@
 import pandas as pd
 from malevich.square import Context, Sink, processor
 
+from .arrow import concat_arrow
+from .models import Concat
+
+BACKENDS = ('pandas', 'arrow')
+
 
 @processor()
-def concat(input: Sink, context: Context):
+def concat(input: Sink, context: Context[Concat]):
     """
     Concat DataFrames into one.
 
@@ -15,14 +20,36 @@ def concat(input: Sink, context: Context):
 
     Concatenated DataFrame.
 
+    ## Configuration:
+
+    - `backend`: str, default 'pandas'.
+        Either 'pandas' or 'arrow'. The 'pandas' backend uses `pd.concat`,
+        which upcasts columns with mismatched types to objects.
+        The 'arrow' backend unifies schemas of the DataFrames: columns
+        with different types are promoted (e.g. integers to floats),
+        incompatible ones become strings, and missing columns are filled
+        with nulls. The data is concatenated without copying.
+
+    - `arrow_dtypes`: bool, default False.
+        Only for the 'arrow' backend. If true, the result keeps Arrow-backed
+        columns and is not copied when converted to a DataFrame.
+
     -----
     Args:
         input (Sink): DataFrames you want to concat.
     Return:
         Concatenated DataFrame
     """
+    backend = context.app_cfg.get('backend', 'pandas')
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unsupported backend `{backend}`. Supported backends: {BACKENDS}"
+        )
+
     data = []
     for i in input:
         data.append(i[0])
 
+    if backend == 'arrow':
+        return concat_arrow(data, context.app_cfg.get('arrow_dtypes', False))
     return pd.concat(data, ignore_index=True)
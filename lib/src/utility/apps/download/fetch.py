@@ -0,0 +1,247 @@
+"""Concurrent, resumable HTTP downloads for `utility.download`.
+
+All downloads share one `requests.Session` with a connection pool as large as
+the number of concurrent downloads. Files are streamed to `<file>.part` in
+large chunks and renamed once complete. If the connection breaks, or a
+`.part` file is left by a previous run, the download continues from the
+last received byte with a `Range` request when the server supports it.
+
+The ETag or the Last-Modified date of the file is kept next to the partial
+file and sent in `If-Range`, so a file that changed on the server since is
+downloaded from the start instead of being spliced with the old bytes.
+"""
+import hashlib
+import os
+import posixpath
+import time
+import urllib.parse
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MB = 1024 * 1024
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Errors after which the download is resumed
+_TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def _retry_delay(error: Exception, default: float) -> float | None:
+    """Returns the delay before the next attempt, or None if it is useless."""
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return default
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code not in _RETRY_STATUSES:
+        return None
+    retry_after = response.headers.get('Retry-After', '')
+    return float(retry_after) if retry_after.isdigit() else default
+
+
+@dataclass
+class Result:
+    """Outcome of a single download."""
+
+    status: str
+    bytes: int
+    duration: float
+    error: str | None = None
+
+
+def filename_from_url(url: str) -> str:
+    """Returns the last component of the URL path, as `wget` does.
+
+    The path is unquoted before it is split, so that encoded separators
+    (`..%2F..%2Fevil.sh`) cannot point outside of the target directory.
+    """
+    path = urllib.parse.unquote(urllib.parse.urlsplit(url).path)
+    name = posixpath.basename(path)
+    # Backslashes separate paths on Windows
+    name = name.replace('\\', '_').replace('\0', '_')
+    if name in ('', '.', '..'):
+        return 'download'
+    return name
+
+
+def is_inside(directory: str, path: str) -> bool:
+    """Tells whether `path` resolves to a location under `directory`."""
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([directory, os.path.realpath(path)]) == directory
+
+
+def unique_names(names: list[str]) -> list[str]:
+    """Makes names unique by adding ` (1)`, ` (2)`, ... before the extension."""
+    seen = set()
+    result = []
+    for name in names:
+        candidate = name
+        root, ext = os.path.splitext(name)
+        i = 1
+        while candidate in seen:
+            candidate = f'{root} ({i}){ext}'
+            i += 1
+        seen.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def _validator(response: requests.Response) -> str | None:
+    # Weak ETags cannot be used in If-Range
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _total_size(response: requests.Response) -> int | None:
+    # Content-Range of a 416 response is `bytes */<size>`
+    _, _, total = response.headers.get('Content-Range', '').rpartition('/')
+    return int(total) if total.isdigit() else None
+
+
+def _remove(*paths: str) -> None:
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _parse_checksum(checksum: str) -> tuple[str, str]:
+    algorithm, _, digest = checksum.rpartition(':')
+    return (algorithm or 'sha256').lower(), digest.lower()
+
+
+def _file_digest(path: str, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        while chunk := f.read(MB):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Downloader:
+    """Downloads files over HTTP with a shared connection pool.
+
+    Args:
+        concurrency: Number of downloads at the same time.
+        retries: Number of retries of a failed request or a broken transfer.
+        backoff: Backoff factor of retries in seconds.
+        timeout: Timeout of connecting and of reading a chunk in seconds.
+        chunk_size: Size of chunks written to disk in bytes.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60,
+        chunk_size: int = MB,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        # Requests are retried by `fetch`, which resumes broken transfers
+        adapter = HTTPAdapter(
+            pool_connections=self.concurrency,
+            pool_maxsize=self.concurrency,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _transfer(self, url: str, part: str) -> None:
+        meta = part + '.validator'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = None
+        if offset and os.path.exists(meta):
+            with open(meta) as f:
+                validator = f.read().strip() or None
+        if offset and validator is None:
+            # Without a validator a partial file cannot be trusted
+            _remove(part, meta)
+            offset = 0
+        headers = (
+            {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+        )
+
+        with self.session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416 and offset:
+                if _total_size(response) == offset:
+                    # The partial file already has all the bytes
+                    return
+                # The file got smaller on the server
+                _remove(part, meta)
+                return self._transfer(url, part)
+            response.raise_for_status()
+            # The whole file is sent if the server does not support ranges
+            # or if the file changed since the partial file was written
+            resume = response.status_code == 206
+            if not resume:
+                if validator := _validator(response):
+                    with open(meta, 'w') as f:
+                        f.write(validator)
+                else:
+                    _remove(meta)
+            with open(part, 'ab' if resume else 'wb', buffering=self.chunk_size) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+
+    def fetch(self, url: str, path: str, checksum: str | None = None) -> Result:
+        """Downloads a file, resuming a partial download if there is one.
+
+        Args:
+            url: URL of the file.
+            path: Local path of the file.
+            checksum: Expected digest of the file as `<algorithm>:<hex>`
+                (e.g. `md5:...`) or a bare SHA-256 hex digest.
+
+        Returns:
+            The result of the download. Errors are reported in the result,
+            not raised.
+        """
+        start = time.perf_counter()
+        part = path + '.part'
+
+        def _result(status: str, error: str | None = None) -> Result:
+            size = os.path.getsize(path) if status == 'ok' else 0
+            return Result(status, size, time.perf_counter() - start, error)
+
+        for attempt in range(self.retries + 1):
+            try:
+                self._transfer(url, part)
+                break
+            except (requests.RequestException, OSError) as e:
+                delay = _retry_delay(e, self.backoff * 2 ** attempt)
+                if attempt == self.retries or delay is None:
+                    return _result('failed', str(e))
+                time.sleep(delay)
+
+        if checksum:
+            algorithm, expected = _parse_checksum(checksum)
+            try:
+                actual = _file_digest(part, algorithm)
+            except ValueError as e:
+                return _result('failed', str(e))
+            if actual != expected:
+                # A corrupted partial file must not be resumed
+                _remove(part, part + '.validator')
+                return _result(
+                    'checksum_mismatch', f'expected {expected}, got {actual}'
+                )
+
+        os.replace(part, path)
+        _remove(part + '.validator')
+        return _result('ok')
+
+    def close(self) -> None:
+        self.session.close()
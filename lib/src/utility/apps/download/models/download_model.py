@@ -15,3 +15,17 @@ class Download(BaseModel):
         '',
         description='A prefix to add to the paths of downloaded files. If not specified, files will be downloaded to the root of the app directory',
     )
+    concurrency: Optional[int] = Field(
+        8, description='Number of files downloaded at the same time'
+    )
+    retries: Optional[int] = Field(
+        3, description='Number of retries of a failed request or a broken transfer'
+    )
+    timeout: Optional[float] = Field(
+        60,
+        description='Timeout of connecting to a server and of reading a chunk of data in seconds',
+    )
+    raise_on_error: Optional[bool] = Field(
+        True,
+        description='If true, the processor fails if any of the downloads failed. Otherwise, failures are only reported in the output',
+    )
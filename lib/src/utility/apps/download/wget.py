@@ -1,17 +1,18 @@
 import os
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
-import wget
 from malevich.square import APP_DIR, DF, Context, processor, scheme
 from pydantic import BaseModel
 
+from .fetch import Downloader, filename_from_url, is_inside, unique_names
 from .models import Download
 
 
 @scheme()
 class Links(BaseModel):
     link: str
+    checksum: str | None = None
 
 
 
@@ -22,15 +23,36 @@ def download(links: DF[Links], context: Context[Download]):
     ## Input:
         A dataframe with a column:
         - `link` (str): links to files to download.
+        - `checksum` (str, optional): expected checksums of files as `<algorithm>:<hex digest>`, e.g. `md5:9e10...`, or SHA-256 hex digests.
 
     ## Output:
-        A dataframe with a column:
+        A dataframe with columns:
         - `file` (str): containing paths to downloaded files.
+        - `link` (str): links to files.
+        - `status` (str): 'ok', 'failed' or 'checksum_mismatch'.
+        - `bytes` (int): sizes of downloaded files.
+        - `duration` (float): time spent on each download in seconds.
+        - `error` (str): error messages of failed downloads.
 
     ## Configuration:
         - `prefix`: str, default ''.
         A prefix to add to the paths of downloaded files. If not specified, files will be downloaded to the root of the app directory.
 
+        - `concurrency`: int, default 8.
+        Number of files downloaded at the same time.
+
+        - `retries`: int, default 3.
+        Number of retries of a failed request or a broken transfer.
+
+        - `timeout`: float, default 60.
+        Timeout of connecting to a server and of reading a chunk of data in seconds.
+
+        - `raise_on_error`: bool, default True.
+        If true, the processor fails after all downloads are finished if any of them failed. Otherwise, failed downloads are only reported in the `status` and `error` columns and have no file.
+
+    ## Details:
+        Files are named after the last component of the links, repeated names get ` (1)`, ` (2)`, ... suffixes. Files are streamed to disk in chunks. If a transfer breaks, or a partial file is left by a previous run, the download continues from the last received byte when the server supports `Range` requests. Requests that fail with 429 or 5xx statuses are retried with exponential backoff respecting `Retry-After`.
+
     -----
 
     Args:
@@ -42,17 +64,60 @@ def download(links: DF[Links], context: Context[Download]):
     """  # noqa: E501
     prefix = context.app_cfg.get("prefix", "")
     try:
-        os.makedirs(os.path.join(APP_DIR, prefix))
+        os.makedirs(os.path.join(APP_DIR, prefix), exist_ok=True)
     except Exception as e:
         raise Exception(f"Could not use prefix: {prefix}. Use another") from e
 
-    outputs = []
-
-    for link in links.link:
-        file = wget.download(link)
-
-        shutil.move(file, os.path.join(APP_DIR, prefix, file))
-        context.share(os.path.join(prefix, file))
-        outputs.append(os.path.join(prefix, file))
-
-    return pd.DataFrame({"file": outputs})
+    urls = links.link.to_list()
+    if "checksum" in links.columns:
+        checksums = [c if isinstance(c, str) and c else None for c in links.checksum]
+    else:
+        checksums = [None] * len(urls)
+    files = [
+        os.path.join(prefix, name)
+        for name in unique_names([filename_from_url(url) for url in urls])
+    ]
+    for url, file in zip(urls, files):
+        if not is_inside(os.path.join(APP_DIR, prefix), os.path.join(APP_DIR, file)):
+            raise Exception(f"Link {url} points outside of the target directory")
+
+    downloader = Downloader(
+        concurrency=context.app_cfg.get("concurrency", 8),
+        retries=context.app_cfg.get("retries", 3),
+        timeout=context.app_cfg.get("timeout", 60),
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=downloader.concurrency) as executor:
+            results = list(executor.map(
+                lambda url, file, checksum: downloader.fetch(
+                    url, os.path.join(APP_DIR, file), checksum
+                ),
+                urls,
+                files,
+                checksums,
+            ))
+    finally:
+        downloader.close()
+
+    for file, result in zip(files, results):
+        if result.status == "ok":
+            context.share(file)
+
+    failed = [(url, r) for url, r in zip(urls, results) if r.status != "ok"]
+    total = sum(r.bytes for r in results)
+    context.logger.info(
+        f"Downloaded {len(urls) - len(failed)} of {len(urls)} files "
+        f"({total / 2 ** 20:.1f}MB)"
+    )
+    if failed and context.app_cfg.get("raise_on_error", True):
+        details = "; ".join(f"{url}: {r.status} ({r.error})" for url, r in failed[:10])
+        raise Exception(f"Failed to download {len(failed)} files: {details}")
+
+    return pd.DataFrame({
+        "file": [f if r.status == "ok" else None for f, r in zip(files, results)],
+        "link": urls,
+        "status": [r.status for r in results],
+        "bytes": [r.bytes for r in results],
+        "duration": [r.duration for r in results],
+        "error": [r.error for r in results],
+    })
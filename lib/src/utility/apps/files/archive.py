@@ -0,0 +1,84 @@
+"""Zipping of directories for `utility.get_links_to_files`.
+
+Archives are written entry by entry straight to disk. Files that are
+already compressed (images, videos, archives, ...) are stored as is,
+because deflating them again costs time and saves nothing.
+"""
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+COMPRESSION_MODES = ('auto', 'deflate', 'store')
+
+_COMPRESSED_EXTENSIONS = {
+    '.7z', '.avi', '.avif', '.br', '.bz2', '.docx', '.flac', '.gif', '.gz',
+    '.heic', '.jpeg', '.jpg', '.lz4', '.m4a', '.mkv', '.mov', '.mp3', '.mp4',
+    '.ogg', '.opus', '.parquet', '.pdf', '.png', '.pptx', '.rar', '.webm',
+    '.webp', '.xlsx', '.xz', '.zip', '.zst',
+}
+
+
+def _compress_type(path: str, compression: str) -> int:
+    if compression == 'store':
+        return zipfile.ZIP_STORED
+    if compression == 'auto':
+        if os.path.splitext(path)[1].lower() in _COMPRESSED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def archive(directory: str, destination: str, compression: str = 'auto') -> str:
+    """Zips a directory the same way as `shutil.make_archive` does.
+
+    Args:
+        directory: The directory to zip.
+        destination: Path of the archive.
+        compression: `auto` stores already compressed files and deflates
+            the others, `deflate` deflates all files, `store` stores them.
+
+    Returns:
+        Path of the archive.
+    """
+    if parent := os.path.dirname(destination):
+        os.makedirs(parent, exist_ok=True)
+    with zipfile.ZipFile(destination, 'w', allowZip64=True) as zf:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in dirs:
+                path = os.path.join(root, name)
+                zf.write(path, os.path.relpath(path, directory))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                zf.write(
+                    path,
+                    os.path.relpath(path, directory),
+                    compress_type=_compress_type(path, compression),
+                )
+    return destination
+
+
+def archive_many(
+    jobs: list[tuple[str, str]],
+    compression: str = 'auto',
+    max_workers: int | None = None,
+) -> None:
+    """Zips several directories in parallel processes.
+
+    Args:
+        jobs: Pairs of directories and paths of their archives.
+        compression: See `archive`.
+        max_workers: Number of processes. Defaults to the number of CPUs.
+    """
+    if len(jobs) < 2:
+        for directory, destination in jobs:
+            archive(directory, destination, compression)
+        return
+
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(archive, directory, destination, compression)
+            for directory, destination in jobs
+        ]
+        for future in futures:
+            future.result()
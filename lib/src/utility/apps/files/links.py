@@ -2,10 +2,71 @@ import os
 import re
 import shutil
 
+import numpy as np
+import pandas as pd
 from malevich.square import APP_DIR, DF, Context, processor
 
+from .archive import COMPRESSION_MODES, archive_many
 from .models import GetLinksToFiles
 
+_OBJ_PATH = re.compile(r"\/mnt_obj\/(?P<USERNAME>\w+\/)(?P<KEY>.+)")
+
+
+def _to_str(_obj: object) -> object:
+    if isinstance(_obj, str):
+        return _obj
+    try:
+        return str(_obj)
+    except Exception as _:
+        return _obj
+
+
+def _resolve(_obj: str, ctx: Context, shared: list[str]) -> tuple[str, str] | None:
+    """Makes a shared file or an object available to all runs.
+
+    Newly shared keys are appended to `shared` to be synchronized later.
+
+    Returns:
+        The key of the file and its path, or None if `_obj` is not a file.
+    """
+    if os.path.exists(ctx.get_share_path(_obj, not_exist_ok=True, all_runs=False)):
+        # /FOLDER/FILE.EXT -> /FOLDER/FILE__RUNID.EXT
+        _fbase = os.path.basename(_obj)
+        _fext = os.path.splitext(_fbase)[1]
+        _fbase = os.path.splitext(_fbase)[0]
+        _fbase += '__' + ctx.run_id + _fext
+        _ffull = os.path.join(APP_DIR, _fbase)
+
+        shutil.move(
+            ctx.get_share_path(_obj, all_runs=False),
+            _ffull
+        )
+
+        ctx.share(_fbase, all_runs=True)
+        shared.append(_fbase)
+        return _fbase, ctx.get_share_path(_fbase, all_runs=True)
+    elif os.path.exists(ctx.get_share_path(_obj, not_exist_ok=True, all_runs=True)):
+        return _obj, ctx.get_share_path(_obj, all_runs=True)
+    elif (
+        (_match := _OBJ_PATH.search(_obj)) is not None
+        and os.path.exists(_obj)
+        and ctx.has_object(_match.group("KEY"))
+    ):
+        _fbase = os.path.basename(_obj)
+        _path = os.path.join(
+            APP_DIR,
+            _fbase
+        )
+        shutil.move(
+            _obj,
+            _path
+        )
+        ctx.share(_fbase, all_runs=True)
+        shared.append(_fbase)
+        return _fbase, ctx.get_share_path(_fbase, all_runs=True)
+    else:
+        return None
+
 
 @processor()
 def get_links_to_files(df: DF, ctx: Context[GetLinksToFiles]):
@@ -22,6 +83,16 @@ def get_links_to_files(df: DF, ctx: Context[GetLinksToFiles]):
         - `expiration`: int, default 21600.
         The number of seconds after which the link will expire. Defaults to 6 hours. Maximum is 24 hours.
 
+        - `zip_compression`: str, default 'auto'.
+        How files are compressed when directories are zipped: 'auto' stores already compressed files (images, videos, archives, etc.) as is and deflates the others, 'deflate' deflates all files, 'store' does not compress them.
+
+    ## Details:
+        The processor works in two phases. First, unique values of all cells
+        are collected and every one of them is checked once. Files are made
+        available to all runs, directories are zipped in parallel processes,
+        and links to all of them are requested at once. Then, cells are
+        replaced with the links column by column.
+
     -----
 
     Args:
@@ -40,119 +111,63 @@ def get_links_to_files(df: DF, ctx: Context[GetLinksToFiles]):
     _expire_secs = min(_expire_secs, 24 * 3600)
     _expire_secs = max(_expire_secs, 0)
 
-    def _exst(path: str, all_runs=False) -> bool:
-        return os.path.exists(
-            ctx.get_share_path(
-                path, not_exist_ok=True, all_runs=all_runs
-            )
-        )
-
-    def _exst_obj(path: str) -> bool:
-        return (
-            os.path.exists(path) and
-            ctx.has_object(
-                re.search(
-                    r"\/mnt_obj\/(?P<USERNAME>\w+\/)(?P<KEY>.+)",
-                    path
-                ).group("KEY")
-            )
+    _compression = ctx.app_cfg.get('zip_compression', 'auto')
+    if _compression not in COMPRESSION_MODES:
+        raise ValueError(
+            f"Unsupported zip compression `{_compression}`. "
+            f"Supported: {COMPRESSION_MODES}"
         )
 
-    def _get(_obj: str) -> tuple[str, str]:
-        if _exst(_obj, all_runs=False):
-            # /FOLDER/FILE.EXT -> /FOLDER/FILE__RUNID.EXT
-            _fbase = os.path.basename(_obj)
-            _fext = os.path.splitext(_fbase)[1]
-            _fbase = os.path.splitext(_fbase)[0]
-            _fbase += '__' + ctx.run_id + _fext
-            _ffull = os.path.join(APP_DIR, _fbase)
-
-            shutil.move(
-                ctx.get_share_path(_obj, all_runs=False),
-                _ffull
-            )
-
-            ctx.share(_fbase, all_runs=True)
-            ctx.synchronize([_fbase], all_runs=True)
-            return _fbase, ctx.get_share_path(_fbase, all_runs=True)
-        elif _exst(_obj, all_runs=True):
-            return _obj, ctx.get_share_path(_obj, all_runs=True)
-        elif _exst_obj(_obj):
-            _fbase = os.path.basename(_obj)
-            _path = os.path.join(
-                APP_DIR,
-                _fbase
-            )
-            shutil.move(
-                _obj,
-                _path
-            )
-            ctx.share(_fbase, all_runs=True)
-            ctx.synchronize([_fbase], all_runs=True)
-            return _fbase, ctx.get_share_path(_fbase, all_runs=True)
+    # Phase 1: every unique value is resolved once
+    _cols = {_col: df[_col].map(_to_str) for _col in df.columns}
+    _candidates = pd.unique(np.concatenate(
+        [_s.to_numpy(dtype=object) for _s in _cols.values()] or [np.array([])]
+    ))
+
+    _obj2key = {}
+    _zips = []
+    _shared = []
+    for _obj in _candidates:
+        if not isinstance(_obj, str) or not _obj:
+            continue
+        if (x := _resolve(_obj, ctx, _shared)) is None:
+            continue
+        _key, _path = x
+        if os.path.isdir(_path):
+            _zips.append((_obj, _key, _path))
         else:
-            return None
-
-
-    _links = []
-    _fo2zip = {}
-    def _collect(_obj: object) -> object:
-        if not isinstance(_obj, str):
-            try:
-                _obj = str(_obj)
-            except Exception as _:
-                return _obj
-
-        if (x := _get(_obj)) is not None:
-            _key, _path = x
-            nonlocal _links
-            if os.path.isdir(_path):
-                _fbase = _key
-                _freal = _path
-                fname = os.path.join(
-                    APP_DIR,
-                    _fbase
-                )
-                shutil.make_archive(
-                    fname,
-                    'zip',
-                    _freal
-                )
-                _fbase += '.zip'
-                ctx.share(_fbase, all_runs=True)
-                ctx.synchronize([_fbase], all_runs=True)
-                _links.append(_fbase)
-                _fo2zip[_obj] = _fbase
-                return _fbase
-            else:
-                _links.append(_key)
-                print('KEY', _key)
-                return _key
-
-        return _obj
+            _obj2key[_obj] = _key
 
+    archive_many(
+        [(_path, os.path.join(APP_DIR, _key + '.zip')) for _, _key, _path in _zips],
+        compression=_compression,
+    )
+    for _obj, _key, _ in _zips:
+        ctx.share(_key + '.zip', all_runs=True)
+        _shared.append(_key + '.zip')
+        _obj2key[_obj] = _key + '.zip'
 
-    for _col in df.columns:
-        df[_col] = df[_col].apply(_collect)
+    # All new files are synchronized at once
+    if _shared:
+        ctx.synchronize(_shared, all_runs=True)
 
+    _links = list(dict.fromkeys(_obj2key.values()))
 
     key_link = ctx.object_storage.update(
         keys=_links, presigned_expire=_expire_secs
     )
 
-
-    def _set(_obj: object) -> object:
-        if not isinstance(_obj, str):
-            try:
-                _obj = str(_obj)
-            except Exception as _:
-                return _obj
-        if _obj in _fo2zip:
-            return key_link.get(_fo2zip[_obj])
-        else:
-            return key_link.get(_obj, _obj)
-
-    for _col in df.columns:
-        df[_col] = df[_col].apply(_set)
+    # Phase 2: cells are replaced with links using a single lookup per column
+    _dirs = {_obj for _obj, _, _ in _zips}
+    _values = {
+        _obj: key_link.get(_key) if _obj in _dirs else key_link.get(_key, _key)
+        for _obj, _key in _obj2key.items()
+    }
+    _index = pd.Index(list(_values), dtype=object)
+    _replacement = np.array(list(_values.values()) + [None], dtype=object)
+
+    for _col, _s in _cols.items():
+        _pos = _index.get_indexer(_s.to_numpy(dtype=object))
+        df[_col] = np.where(_pos >= 0, _replacement[_pos], _s.to_numpy(dtype=object))
 
     return df
@@ -15,3 +15,7 @@ class GetLinksToFiles(BaseModel):
         21600,
         description='The number of seconds after which the link will expire. Defaults to 6 hours. Maximum is 24 hours',
     )
+    zip_compression: Optional[str] = Field(
+        'auto',
+        description="How files are compressed when directories are zipped: 'auto' stores already compressed files as is and deflates the others, 'deflate' deflates all files, 'store' does not compress them",
+    )
@@ -0,0 +1,94 @@
+"""Chunked reading and writing of shared tabular files.
+
+Used by processors that support `chunk_size`. Files are read as an
+iterator of record batches and the results are written incrementally, so
+the peak memory is bounded by the size of a chunk rather than the input.
+"""
+import os
+from collections.abc import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def _is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+
+
+def iter_chunks(paths: list[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Reads files one after another as a single frame in chunks.
+
+    Chunks are indexed with global row positions, i.e. the first row of
+    the second file follows the last row of the first one.
+    """
+    offset = 0
+    for path in paths:
+        if _is_parquet(path):
+            batches = (
+                batch.to_pandas()
+                for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+            )
+        else:
+            batches = pd.read_csv(path, chunksize=chunk_size)
+
+        for chunk in batches:
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def count_rows(paths: list[str]) -> int:
+    """Counts rows in files. Parquet files are counted using metadata only."""
+    total = 0
+    for path in paths:
+        if _is_parquet(path):
+            total += pq.ParquetFile(path).metadata.num_rows
+        else:
+            for chunk in pd.read_csv(path, usecols=[0], chunksize=1 << 20):
+                total += len(chunk)
+    return total
+
+
+class ChunkWriter:
+    """Appends chunks to a parquet or a CSV file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rows = 0
+        self.chunks = 0
+        self._parquet = _is_parquet(path)
+        self._writer: pq.ParquetWriter | None = None
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self._parquet:
+            if self._writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    chunk, schema=self._writer.schema, preserve_index=False
+                )
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(
+                self.path,
+                mode='a' if self.chunks else 'w',
+                header=not self.chunks,
+                index=False,
+            )
+        self.chunks += 1
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
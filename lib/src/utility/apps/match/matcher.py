@@ -0,0 +1,150 @@
+"""Pattern matching engine for `utility.match_pattern`.
+
+Patterns are compiled once. Several patterns are matched in a single pass
+when possible: regular expressions are combined into one alternation, and
+literal strings are matched with an Aho-Corasick automaton if `pyahocorasick`
+is installed or with an alternation of escaped literals otherwise. In both
+cases literal matches are leftmost-longest and do not overlap.
+
+Groups are renumbered in an alternation, which breaks backreferences, and
+inline flags such as `(?i)` are only allowed at the start of an expression.
+Patterns with either of them are matched one by one and their matches are
+merged in the order of positions.
+
+Large columns can be split into chunks processed by a pool of processes.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import ahocorasick
+    _AHOCORASICK_INSTALLED = True
+except ImportError:
+    _AHOCORASICK_INSTALLED = False
+
+_REGEX_META = set('.^$*+?{}[]\\|()')
+_INLINE_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def _is_literal(pattern: str) -> bool:
+    return bool(pattern) and not _REGEX_META.intersection(pattern)
+
+
+def _can_combine(regexes: list[re.Pattern]) -> bool:
+    return not any(
+        r.groups or _INLINE_FLAGS.search(r.pattern) for r in regexes
+    )
+
+
+class Matcher:
+    """Finds all fragments of a text that match any of the patterns.
+
+    Args:
+        patterns: Regular expressions or literal strings.
+        join_char: A string to join the fragments with.
+    """
+
+    def __init__(self, patterns: list[str], join_char: str) -> None:
+        if not patterns:
+            raise ValueError("At least one pattern should be provided")
+
+        self.join_char = join_char
+        self._automaton = None
+        self._regex = None
+        self._regexes = []
+
+        unique = list(dict.fromkeys(patterns))
+        if len(unique) > 1 and all(_is_literal(p) for p in unique):
+            if _AHOCORASICK_INSTALLED:
+                self._automaton = ahocorasick.Automaton()
+                for p in unique:
+                    self._automaton.add_word(p, p)
+                self._automaton.make_automaton()
+                return
+            # Longer literals go first, so the alternation
+            # finds the longest match at every position
+            self._regex = re.compile(
+                '|'.join(re.escape(p) for p in sorted(unique, key=len, reverse=True))
+            )
+        elif len(unique) > 1:
+            regexes = [re.compile(p) for p in unique]
+            if _can_combine(regexes):
+                self._regex = re.compile('|'.join(f'(?:{p})' for p in unique))
+            else:
+                self._regexes = regexes
+        else:
+            self._regex = re.compile(unique[0])
+
+        # Without groups `findall` returns whole matches,
+        # which is faster than building match objects
+        self._whole = self._regex is not None and self._regex.groups == 0
+
+    def __call__(self, text: str) -> str:
+        if self._automaton is not None:
+            return self.join_char.join(
+                value for _, value in self._automaton.iter_long(text)
+            )
+        if self._regexes:
+            matches = sorted(
+                (m.start(), i, m.group(0))
+                for i, r in enumerate(self._regexes)
+                for m in r.finditer(text)
+            )
+            return self.join_char.join(match for _, _, match in matches)
+        if self._whole:
+            return self.join_char.join(self._regex.findall(text))
+        return self.join_char.join(m.group(0) for m in self._regex.finditer(text))
+
+    def match_list(self, texts: list) -> list[str]:
+        # Missing values have no matches
+        return [self(t) if isinstance(t, str) else "" for t in texts]
+
+    def match_series(self, series: pd.Series) -> pd.Series:
+        if self._whole:
+            # Missing and non-string values have no matches
+            return series.str.findall(self._regex).map(
+                lambda x: self.join_char.join(x) if isinstance(x, list) else ""
+            )
+        return pd.Series(
+            self.match_list(series.to_list()), index=series.index, name=series.name
+        )
+
+
+def _match_chunk(matcher: Matcher, texts: list) -> list[str]:
+    return matcher.match_list(texts)
+
+
+def match_frame(
+    df: pd.DataFrame,
+    columns: list[str],
+    matcher: Matcher,
+    processes: int = 1,
+    parallel_threshold: int = 100_000,
+) -> pd.DataFrame:
+    """Returns a new frame with cells of the columns replaced with matches.
+
+    If the frame has at least `parallel_threshold` rows and more than one
+    process is requested, every column is split into chunks matched by
+    `processes` processes.
+    """
+    result = df.copy()
+    if processes <= 1 or len(df) < parallel_threshold:
+        for c in columns:
+            result[c] = matcher.match_series(df[c])
+        return result
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for c in columns:
+            texts = df[c].to_list()
+            size = -(-len(texts) // processes)
+            chunks = executor.map(
+                _match_chunk,
+                [matcher] * processes,
+                [texts[i:i + size] for i in range(0, len(texts), size)],
+            )
+            result[c] = pd.Series(
+                [x for chunk in chunks for x in chunk], index=df.index, name=c
+            )
+    return result
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 
 from malevich.square import scheme
 from pydantic import BaseModel, Field
@@ -11,7 +11,19 @@ from pydantic import BaseModel, Field
 
 @scheme()
 class MatchPattern(BaseModel):
-    pattern: str = Field(..., description='A regular expression pattern to match')
+    pattern: Optional[str] = Field(
+        None, description='A regular expression pattern to match'
+    )
+    patterns: Optional[List[str]] = Field(
+        None, description='Several patterns to match in a single pass'
+    )
     join_char: Optional[str] = Field(
         ';', description='A character to join the matches with'
     )
+    processes: Optional[int] = Field(
+        1, description='Number of processes to match large dataframes with'
+    )
+    parallel_threshold: Optional[int] = Field(
+        100000,
+        description='Dataframes with at least this number of rows are matched by `processes` processes',
+    )
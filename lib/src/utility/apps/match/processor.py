@@ -1,8 +1,7 @@
-import re
-
 import pandas as pd
 from malevich.square import DF, Context, processor
 
+from .matcher import Matcher, match_frame
 from .models import MatchPattern
 
 """
@@ -13,19 +12,10 @@ https://www.craft.me/s/NmXjF6pbB5m0BG (might require logging in with email...)
 """
 
 __PATTERN_MATCH_ID = 'pattern_match_processor'
-__MP_FIELDS = ['pattern', 'join_char']
+__MP_FIELDS = ['pattern', 'join_char', 'patterns', 'processes', 'parallel_threshold']
 __DEFAULT_JOIN_CHAR = ';'
 
 
-def _find_all_matches(text: str,
-                      pattern: str,
-                      join_str: str) -> str:
-    matches = re.finditer(pattern=pattern, string=text)
-    # extract the actual text using the indices found in each match object
-    matches = [text[match_obj.span()[0]: match_obj.span()[1]] for match_obj in matches]
-    return join_str.join(matches)
-
-
 @processor(id=__PATTERN_MATCH_ID)
 def match_pattern(dataframe: DF, context: Context[MatchPattern]) -> pd.DataFrame:
     """
@@ -41,8 +31,18 @@ def match_pattern(dataframe: DF, context: Context[MatchPattern]) -> pd.DataFrame
     ## Configuration:
         - `pattern`: str.
         A regular expression pattern to match.
+        - `patterns`: list[str], default None.
+        Several patterns matched in a single pass. Fragments matching
+        any of them (and `pattern`, if provided) are extracted. If all of
+        the patterns are plain strings, the longest one is matched at
+        every position.
         - `join_char`: str, default ';'.
         A character to join the matches with.
+        - `processes`: int, default 1.
+        Number of processes to match large dataframes with.
+        - `parallel_threshold`: int, default 100000.
+        Dataframes with at least this number of rows are matched
+        by `processes` processes.
 
     ## Output:
 
@@ -58,30 +58,27 @@ def match_pattern(dataframe: DF, context: Context[MatchPattern]) -> pd.DataFrame
     """
     config = context.app_cfg
 
-    # pattern is required
-    pattern = config.get(__MP_FIELDS[0])
+    # either pattern or patterns is required
+    patterns = []
+    if config.get(__MP_FIELDS[0]) is not None:
+        patterns.append(config.get(__MP_FIELDS[0]))
+    patterns.extend(config.get(__MP_FIELDS[2]) or [])
     # the join_char is optional
     join_char = config.get(__MP_FIELDS[1], __DEFAULT_JOIN_CHAR)
 
+    # patterns are compiled once for all cells
+    matcher = Matcher(patterns, join_char)
+
     # first determine which types can be inferred as string types
     str_columns = [
         c for c in dataframe.columns if pd.api.types.is_string_dtype(dataframe[c])
     ]
 
-    def match_pattern_map_function(row):  # noqa: ANN202, ANN001
-        for c in str_columns:
-            row[c] = _find_all_matches(text=row[c],
-                                       pattern=pattern,
-                                       join_str=join_char)
-
-            # make sure the cell is set to an empty string and not a None value
-            row[c] = "" if row[c] is None else row[c]
-
-        return row
-
-    result = dataframe.apply(match_pattern_map_function, axis=1)
-
-    # make sure the operation did not change the dataframe's dimensions
-    assert tuple(result.shape) == tuple(dataframe.shape)
-
-    return result
+    # missing values are set to an empty string and not a None value
+    return match_frame(
+        dataframe,
+        str_columns,
+        matcher,
+        processes=config.get(__MP_FIELDS[3], 1) or 1,
+        parallel_threshold=config.get(__MP_FIELDS[4], 100_000) or 100_000,
+    )
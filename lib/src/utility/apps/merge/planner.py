@@ -0,0 +1,143 @@
+"""Merge planner for `utility.merge`.
+
+If all dataframes are joined on the same key, the key is unique within each
+of them and their other columns do not overlap, the result of folding them
+with `DataFrame.merge` is fully determined by the set of keys of the result.
+In that case keys are computed once using index operations only (the
+smallest indexes are intersected first for inner joins), every dataframe
+is aligned to the resulting keys and all of them are concatenated along
+the columns. No intermediate merge results are allocated.
+
+Otherwise, dataframes are merged left to right as before.
+"""
+import time
+from collections.abc import Callable
+
+import numpy as np
+import pandas as pd
+
+ALIGNED_HOWS = ('inner', 'left', 'outer')
+
+
+def _key_columns(on: str | list[str]) -> list[str]:
+    return [on] if isinstance(on, str) else list(on)
+
+
+def _keys(df: pd.DataFrame, on: str | list[str]) -> pd.Index:
+    if on == 'index':
+        return df.index
+    columns = _key_columns(on)
+    if len(columns) == 1:
+        return pd.Index(df[columns[0]], name=columns[0])
+    return pd.MultiIndex.from_frame(df[columns])
+
+
+def fallback_reason(
+    dfs: list[pd.DataFrame],
+    how: str,
+    on: str | list[str] | None,
+    left_on: str | list[str] | None,
+    right_on: str | list[str] | None,
+) -> str | None:
+    """Returns a reason why dataframes cannot be aligned or None if they can.
+
+    Uniqueness of keys is checked later by `merge_aligned`.
+    """
+    if how not in ALIGNED_HOWS:
+        return f"`{how}` join is order dependent"
+    if left_on is not None or right_on is not None:
+        return "`left_on` or `right_on` is provided"
+    if on is None:
+        return "no common key"
+
+    keys = [] if on == 'index' else _key_columns(on)
+    seen = set()
+    for df in dfs:
+        if any(k not in df.columns for k in keys):
+            return "key is missing in one of the dataframes"
+        columns = [c for c in df.columns if c not in keys]
+        if seen.intersection(columns) or len(set(columns)) != len(columns):
+            return "overlapping columns require suffixes"
+        seen.update(columns)
+
+    return None
+
+
+def merge_aligned(
+    dfs: list[pd.DataFrame],
+    how: str,
+    on: str | list[str],
+    log: Callable[[str], None],
+) -> pd.DataFrame | None:
+    """Merges dataframes with unique keys by aligning them to the result keys.
+
+    Returns None if keys are not unique within one of dataframes.
+    """
+    start = time.perf_counter()
+    keys = [_keys(df, on) for df in dfs]
+    if not all(key.is_unique for key in keys):
+        log("Merge plan: left to right, because keys are not unique")
+        return None
+
+    if how == 'inner':
+        # Intersect the smallest sets of keys first
+        order = sorted(range(len(dfs)), key=lambda i: len(keys[i]))
+        log(f"Merge plan: aligned inner join, key intersection order {order}")
+        common = keys[order[0]]
+        for step, i in enumerate(order[1:], start=1):
+            step_start = time.perf_counter()
+            common = common.intersection(keys[i])
+            log(
+                f"Step {step}: intersect with dataframe {i} ({len(keys[i])} rows) "
+                f"-> {len(common)} keys in {time.perf_counter() - step_start:.3f}s"
+            )
+        # Inner merges preserve the order of the leftmost dataframe
+        target = keys[0][keys[0].isin(common)]
+    elif how == 'left':
+        log("Merge plan: aligned left join on keys of dataframe 0")
+        target = keys[0]
+    else:
+        log("Merge plan: aligned outer join, union of keys")
+        target = keys[0]
+        for i in range(1, len(dfs)):
+            step_start = time.perf_counter()
+            target = target.union(keys[i], sort=False)
+            log(
+                f"Step {i}: union with dataframe {i} ({len(keys[i])} rows) "
+                f"-> {len(target)} keys in {time.perf_counter() - step_start:.3f}s"
+            )
+        # Outer merges sort keys lexicographically
+        try:
+            target = target.sort_values()
+        except TypeError:
+            pass
+
+    key_columns = [] if on == 'index' else _key_columns(on)
+    parts = []
+    for df, key in zip(dfs, keys):
+        columns = [i for i, c in enumerate(df.columns) if c not in key_columns]
+        # Only rows present in the result are taken, missing
+        # rows are filled with NaN the same way `merge` does
+        indexer = key.get_indexer(target)
+        present = indexer >= 0
+        part = df.iloc[indexer.clip(min=0), columns]
+        part.index = target
+        if not present.all():
+            part = part.where(np.broadcast_to(present[:, None], part.shape))
+        parts.append(part)
+
+    result = pd.concat(parts, axis=1)
+
+    if on != 'index':
+        # Key columns are restored at their positions in the first dataframe
+        result.index = pd.RangeIndex(len(result))
+        positions = {c: i for i, c in enumerate(dfs[0].columns)}
+        key_frame = target.to_frame(index=False)
+        for column in sorted(key_columns, key=positions.get):
+            result.insert(positions[column], column, key_frame[column])
+
+    log(
+        f"Aligned {len(dfs)} dataframes into {len(result)} rows "
+        f"in {time.perf_counter() - start:.3f}s"
+    )
+    return result
@@ -1,17 +1,21 @@
-from typing import Any, List
+import time
+from typing import Any
 
 import pandas as pd
 from malevich.square import DF, Context, Sink, processor
 
 from .models import Merge
+from .planner import fallback_reason, merge_aligned
 
 
-def merge_dfs(dfs: List[DF[Any]], context: Context):
-    # TODO: Document code
+def merge_dfs(dfs: list[DF[Any]], context: Context):
+    # Dataframes are merged by aligning them to the resulting keys
+    # if possible (see `planner`) and left to right otherwise
     how = context.app_cfg.get('how', 'inner')
-    on = context.app_cfg.get('both_on', ('index' if how != 'cross' else None))
-    left_on = context.app_cfg.get('left_on', None)
-    right_on = context.app_cfg.get('right_on', None)
+    on = context.app_cfg.get('both_on', None) or \
+        ('index' if how != 'cross' else None)
+    left_on = context.app_cfg.get('left_on', None) or None
+    right_on = context.app_cfg.get('right_on', None) or None
     suffixes = context.app_cfg.get('suffixes', ['_0', '_1'])
 
     flatten_dfs = []
@@ -21,7 +25,18 @@ def merge_dfs(dfs: List[DF[Any]], context: Context):
 
     result: pd.DataFrame = flatten_dfs[0]
 
+    if len(flatten_dfs) > 1:
+        reason = fallback_reason(flatten_dfs, how, on, left_on, right_on)
+        if reason is None:
+            result = merge_aligned(flatten_dfs, how, on, context.logger.info)
+            if result is not None:
+                return result
+            result = flatten_dfs[0]
+        else:
+            context.logger.info(f"Merge plan: left to right, because {reason}")
+
     for i in range(1, len(flatten_dfs)):
+        step_start = time.perf_counter()
         kwargs = {}
         if left_on is not None:
             if left_on == 'index':
@@ -41,6 +56,10 @@ def merge_dfs(dfs: List[DF[Any]], context: Context):
                 kwargs['on'] = on
 
         result = result.merge(flatten_dfs[i], how=how, suffixes=suffixes, **kwargs)
+        context.logger.info(
+            f"Step {i}: merge dataframe {i} ({len(flatten_dfs[i])} rows) "
+            f"-> {len(result)} rows in {time.perf_counter() - step_start:.3f}s"
+        )
 
     return result
 
@@ -89,7 +108,13 @@ def merge(dfs: Sink[Any], context: Context[Merge]):
         If both 'both_on' and 'left_on/right_on' are provided,
         'both_on' will be ignored.
 
-        Dataframes are merged iteratively from left to right.
+        Dataframes are merged iteratively from left to right. However, if
+        all dataframes are joined on the same key with 'inner', 'left' or
+        'outer' join, keys are unique within each dataframe and other columns
+        do not overlap, the result is computed in a single pass: the
+        resulting keys are found first and all dataframes are aligned to them
+        and concatenated. The result is the same in both cases. The chosen
+        plan and per-step row counts and timings are logged.
 
         If using left_on column, all dataframes except
         the last one should have the column.
@@ -0,0 +1,113 @@
+"""Persistent content-addressed cache of S3 objects.
+
+An object is identified by its bucket, key and ETag, so a cached copy is
+valid as long as the ETag reported by S3 does not change. Cached files are
+linked into the share directory instead of being copied when possible.
+
+The cache is a flat directory of files named by the hash of the identity.
+Modification time of a file is its last use, so the least recently used
+files are evicted first once the total size exceeds the budget. The state
+lives entirely in the file system and survives restarts.
+"""
+import os
+import shutil
+import threading
+import uuid
+from hashlib import sha256
+
+MB = 1024 * 1024
+
+
+def _link(src: str, dst: str) -> None:
+    """Hard links `src` to `dst` atomically, copies the file across devices."""
+    tmp = f'{dst}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ObjectCache:
+    """Cache of downloaded S3 objects with LRU eviction.
+
+    Args:
+        directory: Directory of the cache. Created if it does not exist.
+        max_bytes: Total size of cached files in bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, bucket: str, key: str, etag: str) -> str:
+        digest = sha256(f'{bucket}\0{key}\0{etag}'.encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def get(self, bucket: str, key: str, etag: str, dst: str) -> bool:
+        """Places a cached object at `dst`.
+
+        Returns:
+            True if the object is cached, False otherwise.
+        """
+        path = self._path(bucket, key, etag)
+        try:
+            # Marks the file as recently used
+            os.utime(path)
+            _link(path, dst)
+            size = os.path.getsize(dst)
+        except FileNotFoundError:
+            # Never cached or evicted in the meantime
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return True
+
+    def put(self, bucket: str, key: str, etag: str, src: str) -> None:
+        """Adds a downloaded object to the cache."""
+        _link(src, self._path(bucket, key, etag))
+
+    def evict(self) -> int:
+        """Removes least recently used files until the cache fits the budget.
+
+        Returns:
+            Number of removed files.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_saved / MB:.1f}MB saved"
+        )
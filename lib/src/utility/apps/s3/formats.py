@@ -0,0 +1,135 @@
+"""Columnar and compressed formats for `utility.s3_save`.
+
+Dataframes are converted to Arrow once and written to local files, one file
+per partition, which are then uploaded concurrently. Partitions follow the
+hive layout (`<name>/<column>=<value>/part-0.parquet`), so readers such as
+pyarrow, Spark or DuckDB can prune them by the values of the columns.
+"""
+import gzip
+import os
+import urllib.parse
+from collections.abc import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+FORMATS = ('parquet', 'arrow', 'csv')
+
+EXTENSIONS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'csv': '.csv',
+}
+
+DEFAULT_COMPRESSION = {
+    'parquet': 'zstd',
+    'arrow': 'zstd',
+    'csv': 'gzip',
+}
+
+# Extensions of compressed CSV files
+_CSV_COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'bz2': '.bz2',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+}
+
+# Name of the partition of missing values used by Hive and Arrow
+HIVE_NULL = '__HIVE_DEFAULT_PARTITION__'
+
+
+def extension(fmt: str, compression: str | None) -> str:
+    ext = EXTENSIONS[fmt]
+    if fmt == 'csv' and compression:
+        ext += _CSV_COMPRESSION_EXTENSIONS[compression]
+    return ext
+
+
+def validate(fmt: str, compression: str | None) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format `{fmt}`. Supported formats: {FORMATS}")
+    if fmt == 'csv' and compression and compression not in _CSV_COMPRESSION_EXTENSIONS:
+        raise ValueError(
+            f"Unsupported CSV compression `{compression}`. "
+            f"Supported: {list(_CSV_COMPRESSION_EXTENSIONS)}"
+        )
+    if fmt == 'arrow' and compression not in (None, 'zstd', 'lz4'):
+        raise ValueError(
+            f"Unsupported Arrow IPC compression `{compression}`. "
+            "Supported: ['zstd', 'lz4']"
+        )
+
+
+def _hive_value(value: object) -> str:
+    if pd.isna(value):
+        return HIVE_NULL
+    return urllib.parse.quote(str(value), safe='')
+
+
+def partitions(
+    df: pd.DataFrame, columns: list[str] | None
+) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Splits a dataframe into hive partitions.
+
+    Yields:
+        Relative paths of the partitions (empty if `columns` is empty) and
+        their rows without the partition columns.
+    """
+    if not columns:
+        yield '', df
+        return
+
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise KeyError(f"Partition columns {missing} are not in the dataframe")
+
+    rest = df.drop(columns=columns)
+    grouped = df.groupby(columns, sort=True, dropna=False, observed=True).indices
+    for values, rows in grouped.items():
+        if not isinstance(values, tuple):
+            values = (values,)
+        path = '/'.join(f'{c}={_hive_value(v)}' for c, v in zip(columns, values))
+        yield path, rest.iloc[rows]
+
+
+def write_file(
+    df: pd.DataFrame,
+    path: str,
+    fmt: str,
+    compression: str | None,
+    row_group_size: int | None,
+) -> None:
+    """Writes a dataframe to a local file in one of `FORMATS`."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == 'parquet':
+        pq.write_table(
+            table,
+            path,
+            compression=compression or 'none',
+            row_group_size=row_group_size,
+        )
+    elif fmt == 'arrow':
+        options = ipc.IpcWriteOptions(compression=compression)
+        with ipc.new_file(path, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
+    elif compression == 'gzip':
+        # Arrow always uses the slowest gzip level, the level
+        # of the `gzip` utility is several times faster
+        with gzip.open(path, 'wb', compresslevel=6) as raw:
+            pa_csv.write_csv(table, pa.PythonFile(raw, mode='w'))
+    else:
+        with pa.OSFile(path, 'wb') as raw:
+            stream = (
+                pa.CompressedOutputStream(raw, compression) if compression else raw
+            )
+            pa_csv.write_csv(table, stream)
+            if compression:
+                stream.close()
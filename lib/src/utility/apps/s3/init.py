@@ -1,6 +1,10 @@
 import boto3
+from botocore.config import Config
 from malevich.square import Context, S3Helper, init
 
+from .cache import MB, ObjectCache
+from .transfer import DEFAULT_MAX_RETRIES, DEFAULT_MAX_WORKERS, S3Transfer
+
 
 @init()
 def connect_to_s3(context: Context):
@@ -18,14 +22,30 @@ def connect_to_s3(context: Context):
     endpoint_url = context.app_cfg.get('endpoint_url', None)
     bucket_name = context.app_cfg['bucket_name']
     region = context.app_cfg.get('aws_region', None)
+    max_workers = context.app_cfg.get('max_workers', None) or DEFAULT_MAX_WORKERS
+    max_retries = context.app_cfg.get('max_retries', None)
+    if max_retries is None:
+        max_retries = DEFAULT_MAX_RETRIES
 
     client = boto3.client(
         's3',
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         endpoint_url=endpoint_url,
-        region_name=region
+        region_name=region,
+        # Each transfer thread may use several connections for multipart
+        # transfers, so the pool is large enough not to block them
+        config=Config(max_pool_connections=max(10, max_workers * 4)),
     )
 
     context.app_cfg['s3_helper'] = S3Helper(client, bucket_name)
+    context.app_cfg['s3_transfer'] = S3Transfer(
+        client,
+        bucket_name,
+        max_workers=max_workers,
+        max_retries=max_retries,
+    )
 
+    if cache_dir := context.app_cfg.get('cache_dir', None):
+        cache_size = context.app_cfg.get('cache_size_mb', None) or 10240
+        context.app_cfg['s3_cache'] = ObjectCache(cache_dir, cache_size * MB)
@@ -18,3 +18,18 @@ class S3DownloadFilesAuto(BaseModel):
         None, description='Endpoint URL of the S3 bucket'
     )
     aws_region: Optional[str] = Field(None, description='AWS region of the S3 bucket')
+    max_workers: Optional[int] = Field(
+        16, description='Number of files transferred at the same time'
+    )
+    max_retries: Optional[int] = Field(
+        3,
+        description='Number of retries of a file with exponential backoff before the transfer fails',
+    )
+    cache_dir: Optional[str] = Field(
+        None,
+        description='If provided, downloaded objects are cached in this directory and reused while their ETag does not change',
+    )
+    cache_size_mb: Optional[int] = Field(
+        10240,
+        description='Maximum total size of cached objects in megabytes, least recently used objects are evicted first',
+    )
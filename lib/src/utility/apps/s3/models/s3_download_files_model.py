@@ -18,3 +18,10 @@ class S3DownloadFiles(BaseModel):
         None, description='Endpoint URL of the S3 bucket'
     )
     aws_region: Optional[str] = Field(None, description='AWS region of the S3 bucket')
+    max_workers: Optional[int] = Field(
+        16, description='Number of files transferred at the same time'
+    )
+    max_retries: Optional[int] = Field(
+        3,
+        description='Number of retries of a file with exponential backoff before the transfer fails',
+    )
@@ -28,3 +28,21 @@ class S3Save(BaseModel):
         None, description='Endpoint URL of the S3 bucket'
     )
     aws_region: Optional[str] = Field(None, description='AWS region of the S3 bucket')
+    format: Optional[str] = Field(
+        None,
+        description="One of 'parquet', 'arrow' or 'csv'. If not provided, the default format of S3Helper is used",
+    )
+    compression: Optional[str] = Field(
+        None,
+        description="Compression codec: 'zstd' or 'snappy' for parquet, 'zstd' or 'lz4' for arrow, 'gzip', 'zstd', 'bz2' or 'lz4' for csv. Defaults to 'zstd' for parquet and arrow and to 'gzip' for csv, 'none' disables compression",
+    )
+    partition_by: Optional[Union[str, List[str]]] = Field(
+        None, description='Columns to partition the dataframes by (hive-style keys)'
+    )
+    row_group_size: Optional[int] = Field(
+        None,
+        description='Maximum number of rows in a parquet row group or an arrow record batch',
+    )
+    max_workers: Optional[int] = Field(
+        16, description='Number of files written and uploaded at the same time'
+    )
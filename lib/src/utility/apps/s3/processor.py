@@ -1,4 +1,6 @@
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
 from typing import Any
 
@@ -6,6 +8,8 @@ import pandas as pd
 from malevich.square import APP_DIR, DF, DFS, Context, M, S3Helper, processor, scheme
 from pydantic import BaseModel
 
+from . import formats
+from .cache import MB, ObjectCache
 from .models import (
     S3DownloadFiles,
     S3DownloadFilesAuto,
@@ -13,6 +17,7 @@ from .models import (
     S3SaveFiles,
     S3SaveFilesAuto,
 )
+from .transfer import ObjectChangedError, S3Transfer
 
 
 @scheme()
@@ -29,6 +34,48 @@ class Filename(BaseModel):
     filename: str
 
 
+def _save_formatted(
+    dfs: list[pd.DataFrame], names: list[str], fmt: str, context: Context
+) -> None:
+    compression = context.app_cfg.get('compression', None)
+    if not compression:
+        compression = formats.DEFAULT_COMPRESSION.get(fmt)
+    elif compression == 'none':
+        compression = None
+    formats.validate(fmt, compression)
+    partition_by = context.app_cfg.get('partition_by', None)
+    if isinstance(partition_by, str):
+        partition_by = [partition_by]
+    row_group_size = context.app_cfg.get('row_group_size', None)
+    s3_transfer: S3Transfer = context.app_cfg['s3_transfer']
+    ext = formats.extension(fmt, compression)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        parts = []
+        for i, (df, name) in enumerate(zip(dfs, names)):
+            for path, part in formats.partitions(df, partition_by):
+                if partition_by:
+                    key = f'{name}/{path}/part-0{ext}'
+                else:
+                    key = name if name.endswith(ext) else name + ext
+                local = os.path.join(tmp, str(i), path, 'part-0' + ext)
+                parts.append((part, local, key))
+
+        # Arrow releases the GIL while encoding and compressing,
+        # so parts are written in parallel as well
+        with ThreadPoolExecutor(max_workers=s3_transfer.max_workers) as executor:
+            list(executor.map(
+                lambda job: formats.write_file(
+                    job[0], job[1], fmt, compression, row_group_size
+                ),
+                parts,
+            ))
+
+        s3_transfer.upload(
+            [(local, key) for _, local, key in parts], log=context.logger.info
+        )
+
+
 @processor()
 def s3_save(dfs: DFS[M[Any]], context: Context[S3Save]):
     """Saves dataframes to S3.
@@ -50,6 +97,20 @@ def s3_save(dfs: DFS[M[Any]], context: Context[S3Save]):
             If True, the run_id is appended to the names of the dataframes.
         - `extra_str`: str, default None.
             If provided, it is appended to the names of the dataframes.
+        - `format`: str, default None.
+            One of 'parquet', 'arrow' (Arrow IPC) or 'csv'. If not provided,
+            dataframes are saved with the default format of `S3Helper`.
+        - `compression`: str, default depends on the format.
+            Compression codec: 'zstd' (default) or 'snappy' for parquet,
+            'zstd' (default) or 'lz4' for Arrow IPC, 'gzip' (default),
+            'zstd', 'bz2' or 'lz4' for CSV. Set to 'none' to disable.
+        - `partition_by`: list[str]|str, default None.
+            Columns to partition the dataframes by. Only used with `format`.
+        - `row_group_size`: int, default None.
+            Maximum number of rows in a parquet row group or an Arrow IPC
+            record batch.
+        - `max_workers`: int, default 16.
+            Number of files written and uploaded at the same time.
 
         Also, the app should be provided with parameters to connect to S3:
         - `aws_access_key_id`: str.
@@ -83,6 +144,18 @@ def s3_save(dfs: DFS[M[Any]], context: Context[S3Save]):
 
             train/<RUN_ID>/<NAME>
 
+        If `format` is provided, the extension of the format is appended
+        to the key unless it is already there, e.g. <NAME>.parquet or
+        <NAME>.csv.gz. With `partition_by`, every dataframe is split by
+        the values of the columns, which are removed from the files, and
+        every partition is saved under a hive-style key:
+
+            <NAME>/<COLUMN_1>=<VALUE_1>/<COLUMN_2>=<VALUE_2>/part-0.parquet
+
+        Missing values go to the `__HIVE_DEFAULT_PARTITION__` partition.
+        Files are written and uploaded concurrently, large files are
+        uploaded in parts.
+
     ## Output:
         The same as the input.
 
@@ -132,11 +205,14 @@ def s3_save(dfs: DFS[M[Any]], context: Context[S3Save]):
         names = [f'{extra}/{name}' for name in names]
 
     # Save the dataframes
-    for df, save_name in zip(dfs[0], names):
-        # [! ] dfs[0] is a list of dataframes
-        # as all members of DFS are also DFS
-        # (preserving homogeneity of the data structure)
-        s3_helper.save_df(df, key=save_name)
+    if (fmt := context.app_cfg.get('format', None)):
+        _save_formatted(dfs[0], names, fmt, context)
+    else:
+        for df, save_name in zip(dfs[0], names):
+            # [! ] dfs[0] is a list of dataframes
+            # as all members of DFS are also DFS
+            # (preserving homogeneity of the data structure)
+            s3_helper.save_df(df, key=save_name)
     # Return the dataframes as is
     # (similar to utility.passthrough)
     return dfs
@@ -168,6 +244,11 @@ def s3_save_files_auto(files: DF['Filename'], context: Context[S3SaveFilesAuto])
             Endpoint URL of the S3 bucket.
         - `aws_region`: str, default None.
             AWS region of the S3 bucket.
+        - `max_workers`: int, default 16.
+            Number of files transferred at the same time.
+        - `max_retries`: int, default 3.
+            Number of retries of a file with exponential backoff
+            before the transfer fails.
 
     ## Details:
         Files are expected to be in the share folder e.g. should be shared with
@@ -194,8 +275,9 @@ def s3_save_files_auto(files: DF['Filename'], context: Context[S3SaveFilesAuto])
         The same dataframe as the input.
     """
     # Initializing an object to interact with S3
-    s3_helper: S3Helper = context.app_cfg['s3_helper']
+    s3_transfer: S3Transfer = context.app_cfg['s3_transfer']
     s3_keys = []
+    jobs = []
     for file in files['filename']:
         extra_str = \
             f'{context.app_cfg["extra_str"]}/' if 'extra_str' in context.app_cfg else ''
@@ -205,9 +287,10 @@ def s3_save_files_auto(files: DF['Filename'], context: Context[S3SaveFilesAuto])
         key = f'{extra_str}{run_id}{file}'
         # key = f'{context.run_id}/{file}'
         # if context.app_cfg.get('append_run_id', False) else file
-        with open(context.get_share_path(file), 'rb') as f:
-            s3_helper.save_object(f, key=key)
-            s3_keys.append(key)
+        jobs.append((context.get_share_path(file), key))
+        s3_keys.append(key)
+
+    s3_transfer.upload(jobs, log=context.logger.info)
 
     files.insert(column='s3key', value=s3_keys, loc=len(files.columns))
     return files
@@ -237,6 +320,11 @@ def s3_save_files(files: DF['FilenameS3Key'], context: Context[S3SaveFiles]):
             Endpoint URL of the S3 bucket.
         - `aws_region`: str, default None.
             AWS region of the S3 bucket.
+        - `max_workers`: int, default 16.
+            Number of files transferred at the same time.
+        - `max_retries`: int, default 3.
+            Number of retries of a file with exponential backoff
+            before the transfer fails.
 
     ## Details:
         Files are expected to be in the share folder e.g. should be shared with
@@ -270,16 +358,18 @@ def s3_save_files(files: DF['FilenameS3Key'], context: Context[S3SaveFiles]):
     Returns:
         The same dataframe as the input.
     """
-    s3_helper: S3Helper = context.app_cfg['s3_helper']
+    s3_transfer: S3Transfer = context.app_cfg['s3_transfer']
 
+    jobs = []
     for i, (file, s3_key) in files[['filename', 's3key']].itertuples():
-        with open(context.get_share_path(file), 'rb') as f:
-            s3_key = s3_key.format(
-                ID=i,
-                FILE=os.path.basename(file),
-                RUN_ID=context.run_id
-            )
-            s3_helper.save_object(f, key=s3_key)
+        s3_key = s3_key.format(
+            ID=i,
+            FILE=os.path.basename(file),
+            RUN_ID=context.run_id
+        )
+        jobs.append((context.get_share_path(file), s3_key))
+
+    s3_transfer.upload(jobs, log=context.logger.info)
 
     return files
 
@@ -295,7 +385,7 @@ def s3_download_files(files: DF['FilenameS3Key'], context: Context[S3DownloadFil
 
     ## Configuration:
 
-        The app's only configuration is the connection to S3:
+        The app is configured with the connection to S3:
         - `aws_access_key_id`: str.
             AWS access key ID.
         - `aws_secret_access_key`: str.
@@ -306,6 +396,11 @@ def s3_download_files(files: DF['FilenameS3Key'], context: Context[S3DownloadFil
             Endpoint URL of the S3 bucket.
         - `aws_region`: str, default None.
             AWS region of the S3 bucket.
+        - `max_workers`: int, default 16.
+            Number of files transferred at the same time.
+        - `max_retries`: int, default 3.
+            Number of retries of a file with exponential backoff
+            before the transfer fails.
 
     ## Details:
        Files are downloaded by their S3 keys. The files are shared across processors
@@ -319,6 +414,9 @@ def s3_download_files(files: DF['FilenameS3Key'], context: Context[S3DownloadFil
             The file is assumed to be in S3 under the key `path/to/some_file.csv`.
             The file is downloaded from S3 and shared under the key `file1.csv`.
 
+        Files are downloaded concurrently, large objects are downloaded
+        in parts. The order of rows in the output is the same as in the input.
+
     ## Output:
         The dataframe with downloaded filenames.
 
@@ -331,22 +429,62 @@ def s3_download_files(files: DF['FilenameS3Key'], context: Context[S3DownloadFil
         The dataframe with downloaded filenames.
     """
 
-    s3_helper: S3Helper = context.app_cfg['s3_helper']
+    s3_transfer: S3Transfer = context.app_cfg['s3_transfer']
 
-    output_files = []
-    for file, s3_key in files[['filename', 's3key']].itertuples(index=False):
-        fbytes = s3_helper.get_object(s3_key)
-        with open(os.path.join(APP_DIR, file), 'wb+') as f:
-            for byte_ in fbytes:
-                f.write(byte_)
+    output_files = files['filename'].to_list()
+    s3_transfer.download(
+        [
+            (s3_key, os.path.join(APP_DIR, file))
+            for file, s3_key in files[['filename', 's3key']].itertuples(index=False)
+        ],
+        log=context.logger.info,
+    )
+    for file in dict.fromkeys(output_files):
         context.share(file)
-        output_files.append(file)
 
     return pd.DataFrame({
         'filename': output_files,
     })
 
 
+def _download_cached(
+    s3_transfer: S3Transfer,
+    s3_cache: ObjectCache,
+    output_files: list[list[str]],
+    context: Context,
+    retry_changed: bool = True,
+) -> None:
+    unique = dict(output_files)
+    etags = dict(zip(unique, s3_transfer.etags(list(unique), context.logger.info)))
+
+    hits, misses, saved = s3_cache.hits, s3_cache.misses, s3_cache.bytes_saved
+    jobs = []
+    for s3_key, file in unique.items():
+        path = os.path.join(APP_DIR, file)
+        if not s3_cache.get(s3_transfer.bucket, s3_key, etags[s3_key], path):
+            jobs.append((s3_key, path, etags[s3_key]))
+
+    if jobs:
+        try:
+            s3_transfer.download(jobs, log=context.logger.info)
+        except ObjectChangedError as e:
+            if retry_changed:
+                context.logger.info(f"{e}, reading ETags again")
+                return _download_cached(
+                    s3_transfer, s3_cache, output_files, context, False
+                )
+            raise
+        for s3_key, path, etag in jobs:
+            s3_cache.put(s3_transfer.bucket, s3_key, etag, path)
+        s3_cache.evict()
+
+    context.logger.info(
+        f"S3 cache: {s3_cache.hits - hits} hits, {s3_cache.misses - misses} misses, "
+        f"{(s3_cache.bytes_saved - saved) / MB:.1f}MB saved "
+        f"(since start: {s3_cache.stats()})"
+    )
+
+
 @processor()
 def s3_download_files_auto(keys: DF[S3Key], context: Context[S3DownloadFilesAuto]):
     """Downloads files from S3 to local file system.
@@ -357,7 +495,7 @@ def s3_download_files_auto(keys: DF[S3Key], context: Context[S3DownloadFilesAuto
 
     ## Configuration:
 
-        The app's only configuration is the connection to S3:
+        The app is configured with the connection to S3:
 
         - `aws_access_key_id`: str.
             AWS access key ID.
@@ -369,6 +507,31 @@ def s3_download_files_auto(keys: DF[S3Key], context: Context[S3DownloadFilesAuto
             Endpoint URL of the S3 bucket.
         - `aws_region`: str, default None.
             AWS region of the S3 bucket.
+        - `max_workers`: int, default 16.
+            Number of files transferred at the same time.
+        - `max_retries`: int, default 3.
+            Number of retries of a file with exponential backoff
+            before the transfer fails.
+        - `cache_dir`: str, default None.
+            If provided, downloaded objects are cached in this directory
+            and reused by later runs while their ETag does not change.
+        - `cache_size_mb`: int, default 10240.
+            Maximum total size of cached objects in megabytes. Least recently
+            used objects are evicted first.
+
+    ## Details:
+        Files are downloaded concurrently, large objects are downloaded
+        in parts. The order of rows in the output is the same as in the input.
+
+        If `cache_dir` is set, ETags of the objects are read with HEAD requests
+        first. Objects that are already cached with the same bucket, key and
+        ETag are hard linked (or copied, if the cache is on another device)
+        into the share directory instead of being downloaded. Other objects
+        are downloaded with a conditional GET (`If-Match`) and are added to
+        the cache. If an object changes in the meantime, ETags are read again
+        once. Numbers of hits, misses and saved bytes are reported in logs.
+        Shared files may be links to cached ones, so they should not be
+        modified in place.
 
     ## Output:
         A dataframe with columns:
@@ -385,18 +548,25 @@ def s3_download_files_auto(keys: DF[S3Key], context: Context[S3DownloadFilesAuto
             - s3key (str): S3 key of the file
             - filename (str): The name of the file
     """
-    s3_helper: S3Helper = context.app_cfg['s3_helper']
+    s3_transfer: S3Transfer = context.app_cfg['s3_transfer']
 
     output_files = []
     for s3_key in keys['s3key'].to_list():
-        fbytes = s3_helper.get_object(s3_key)
         extension = os.path.splitext(s3_key)[1]
         file = context.run_id + '-' + sha256(s3_key.encode()).hexdigest() + extension
-        with open(os.path.join(APP_DIR, file), 'wb+') as f:
-            for byte_ in fbytes:
-                f.write(byte_)
-        context.share(file)
         output_files.append([s3_key, file])
+
+    s3_cache: ObjectCache | None = context.app_cfg.get('s3_cache', None)
+    if s3_cache is None:
+        s3_transfer.download(
+            [(s3_key, os.path.join(APP_DIR, file)) for s3_key, file in output_files],
+            log=context.logger.info,
+        )
+    else:
+        _download_cached(s3_transfer, s3_cache, output_files, context)
+
+    for _, file in output_files:
+        context.share(file)
     return pd.DataFrame(
         output_files, columns = ['s3_key', 'filename']
     )
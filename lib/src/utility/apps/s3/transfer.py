@@ -0,0 +1,266 @@
+"""Concurrent transfers between the local file system and S3.
+
+Files are transferred by a bounded pool of threads sharing one boto3 client.
+Large objects are uploaded and downloaded in parts by boto3 itself (see
+`TransferConfig`), downloads are streamed straight to disk. Every file is
+retried with exponential backoff before the whole transfer fails.
+"""
+import os
+import random
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as EndpointError
+
+MB = 1024 * 1024
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_RETRIES = 3
+
+# Client errors that are worth retrying, all others
+# (missing keys, access denied, etc.) fail immediately
+_RETRYABLE_CODES = {
+    'RequestTimeout',
+    'RequestTimeTooSkewed',
+    'SlowDown',
+    'Throttling',
+    'ThrottlingException',
+    'InternalError',
+    'ServiceUnavailable',
+    '500',
+    '502',
+    '503',
+    '504',
+}
+
+
+# Network errors, including timeouts and connections closed in the middle of
+# a response. Other errors (missing local files, permissions, credentials)
+# would fail the same way again
+_RETRYABLE_ERRORS = (
+    EndpointError,
+    HTTPClientError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class ObjectChangedError(Exception):
+    """The object no longer has the ETag it was requested with.
+
+    The transfer can be retried once the ETag is read again.
+    """
+
+    def __init__(self, key: str, etag: str) -> None:
+        super().__init__(f"Object `{key}` no longer has ETag {etag}")
+        self.key = key
+        self.etag = etag
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, ClientError):
+        return exc.response.get('Error', {}).get('Code') in _RETRYABLE_CODES
+    return isinstance(exc, _RETRYABLE_ERRORS)
+
+
+class S3Transfer:
+    """Transfers many files at once.
+
+    Args:
+        client: A boto3 S3 client. Clients are thread-safe, so the same
+            client is shared by all the threads.
+        bucket: Name of the bucket.
+        max_workers: Number of files transferred at the same time.
+        max_retries: Number of retries of a single file.
+        backoff: Delay before the first retry in seconds. It is doubled with
+            each next retry.
+        multipart_threshold: Objects of at least this size in bytes are
+            transferred in parts.
+        multipart_chunksize: Size of a single part in bytes.
+        max_concurrency: Number of parts of a single object transferred
+            at the same time.
+    """
+
+    def __init__(
+        self,
+        client: object,
+        bucket: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = 0.5,
+        multipart_threshold: int = 64 * MB,
+        multipart_chunksize: int = 16 * MB,
+        max_concurrency: int = 4,
+    ) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            # Objects are read from the network and written to disk in large
+            # buffers instead of the default 256KB
+            io_chunksize=MB,
+            use_threads=max_concurrency > 1,
+        )
+
+    def _retry(self, fn: Callable[[], Any], key: str, log: Callable) -> Any:  # noqa: ANN401
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except Exception as exc:
+                if attempt == self.max_retries or not _is_retryable(exc):
+                    raise
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+                log(
+                    f"Transfer of `{key}` failed ({exc}), "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})"
+                )
+                time.sleep(delay)
+
+    def _upload(self, path: str, key: str, log: Callable) -> int:
+        self._retry(
+            lambda: self.client.upload_file(
+                path, self.bucket, key, Config=self.config
+            ),
+            key,
+            log,
+        )
+        return os.path.getsize(path)
+
+    def _download(
+        self, key: str, path: str, log: Callable, etag: str | None = None
+    ) -> int:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if etag:
+            self._retry(lambda: self._get(key, path, etag), key, log)
+        else:
+            self._retry(
+                lambda: self.client.download_file(
+                    self.bucket, key, path, Config=self.config
+                ),
+                key,
+                log,
+            )
+        return os.path.getsize(path)
+
+    def _get(self, key: str, path: str, etag: str) -> None:
+        # `download_file` does not accept IfMatch, so the object is streamed
+        # with a single GET that S3 rejects if the ETag changed
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=key, IfMatch=etag
+            )
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') in (
+                'PreconditionFailed', '412'
+            ):
+                raise ObjectChangedError(key, etag) from exc
+            raise
+        body = response['Body']
+        tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in body.iter_chunks(self.config.io_chunksize):
+                    f.write(chunk)
+            os.replace(tmp, path)
+        finally:
+            body.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _head(self, key: str, log: Callable) -> str:
+        response = self._retry(
+            lambda: self.client.head_object(Bucket=self.bucket, Key=key), key, log
+        )
+        return response['ETag']
+
+    def _run(
+        self,
+        fn: Callable[..., int],
+        jobs: list[tuple],
+        action: str,
+        log: Callable,
+    ) -> list[int]:
+        # Each destination is written once, the last job wins
+        # the same way it does when files are transferred one by one
+        unique = {job[1]: job for job in jobs}
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                dst: executor.submit(fn, src, dst, log, *extra)
+                for dst, (src, _, *extra) in unique.items()
+            }
+            try:
+                sizes = {dst: f.result() for dst, f in futures.items()}
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        total = sum(sizes.values())
+        log(
+            f"{action} {len(unique)} files ({total / MB:.1f}MB) in {elapsed:.2f}s: "
+            f"{total / MB / elapsed:.1f}MB/s, {len(unique) / elapsed:.1f} objects/s"
+        )
+        # Sizes are returned in the order of jobs
+        return [sizes[job[1]] for job in jobs]
+
+    def upload(
+        self, jobs: list[tuple[str, str]], log: Callable[[str], None] = print
+    ) -> list[int]:
+        """Uploads files to S3.
+
+        Args:
+            jobs: Pairs of local paths and S3 keys.
+            log: A function to report progress.
+
+        Returns:
+            Sizes of the files in bytes in the order of jobs.
+        """
+        return self._run(self._upload, jobs, 'Uploaded', log)
+
+    def download(
+        self, jobs: list[tuple[str, ...]], log: Callable[[str], None] = print
+    ) -> list[int]:
+        """Downloads objects from S3.
+
+        Args:
+            jobs: Pairs of S3 keys and local paths. A third element, if
+                present, is the expected ETag of the object.
+                `ObjectChangedError` is raised if the object has another one.
+            log: A function to report progress.
+
+        Returns:
+            Sizes of the files in bytes in the order of jobs.
+        """
+        return self._run(self._download, jobs, 'Downloaded', log)
+
+    def etags(
+        self, keys: list[str], log: Callable[[str], None] = print
+    ) -> list[str]:
+        """Reads ETags of objects with HEAD requests.
+
+        Args:
+            keys: S3 keys.
+            log: A function to report progress.
+
+        Returns:
+            ETags in the order of keys.
+        """
+        unique = list(dict.fromkeys(keys))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            etags = executor.map(lambda key: self._head(key, log), unique)
+            etags = dict(zip(unique, etags))
+        return [etags[key] for key in keys]
@@ -0,0 +1,326 @@
+"""Condition engine for `utility.filter`.
+
+A list of conditions is compiled once into a tree of nodes. Each node
+produces a boolean NumPy mask, so the whole list is evaluated in a single
+pass over the dataframe and the result is materialized with exactly one copy.
+
+Members of AND (OR) groups are ordered by estimated cost and selectivity:
+cheap conditions that reject (accept) most of the rows are evaluated first
+and the remaining ones are evaluated only on rows whose outcome is still
+unknown.
+"""
+import re
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr  # noqa: F401
+    _NUMEXPR_INSTALLED = True
+except ImportError:
+    _NUMEXPR_INSTALLED = False
+
+
+_CASTS = {
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'str': str,
+}
+
+# Relative per-row cost of operations, used to order
+# members of a group before the evaluation
+_COSTS = {
+    'is_null': 1,
+    'is_not_null': 1,
+    'equal': 2,
+    'not_equal': 2,
+    'greater': 2,
+    'greater_equal': 2,
+    'less': 2,
+    'less_equal': 2,
+    'in': 4,
+    'not_in': 4,
+    'like': 20,
+    'not_like': 20,
+}
+
+# Operations that can be fused into a single `DataFrame.eval` expression
+_EXPR_OPERATORS = {
+    'equal': '==',
+    'not_equal': '!=',
+    'greater': '>',
+    'greater_equal': '>=',
+    'less': '<',
+    'less_equal': '<=',
+}
+
+_REGEX_META = set('.^$*+?{}[]\\|()')
+
+# Frames smaller than this are not sampled to estimate selectivity
+_SAMPLE_MIN_ROWS = 50_000
+_SAMPLE_SIZE = 2_000
+
+# If fewer rows than this fraction are still undecided,
+# the next member is evaluated only on those rows
+_SUBSET_DENSITY = 0.5
+
+BACKENDS = ('pandas', 'numexpr')
+
+
+def _cast(value: Any, val_type: str) -> Any:
+    cast = _CASTS.get(val_type)
+    if cast is None:
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [cast(x) for x in value]
+    return cast(value)
+
+
+class Condition:
+    """A single `column <operation> value` condition."""
+
+    def __init__(self, column: str, operation: str, value: Any = None) -> None:
+        if operation not in _COSTS:
+            raise ValueError(
+                f"Unsupported operation `{operation}`. "
+                f"Supported operations: {list(_COSTS.keys())}"
+            )
+        self.column = column
+        self.operation = operation
+        self.value = value
+        self.cost = _COSTS[operation]
+        self.columns = {column}
+
+        self._pattern = None
+        if operation in ('like', 'not_like'):
+            if _REGEX_META.intersection(str(value)):
+                self._pattern = re.compile(str(value))
+            else:
+                self._pattern = str(value)
+
+    def mask(self, df: pd.DataFrame, rows: np.ndarray | None = None) -> np.ndarray:
+        series = df[self.column]
+        if rows is not None:
+            series = series.iloc[rows]
+
+        op = self.operation
+        value = self.value
+
+        if op == 'is_null':
+            result = series.isna()
+        elif op == 'is_not_null':
+            result = series.notna()
+        elif op == 'equal':
+            result = series == value
+        elif op == 'not_equal':
+            result = series != value
+        elif op == 'greater':
+            result = series > value
+        elif op == 'greater_equal':
+            result = series >= value
+        elif op == 'less':
+            result = series < value
+        elif op == 'less_equal':
+            result = series <= value
+        elif op == 'in':
+            result = series.isin(value)
+        elif op == 'not_in':
+            result = ~series.isin(value)
+        elif op == 'like':
+            result = series.str.contains(
+                self._pattern,
+                regex=not isinstance(self._pattern, str),
+                na=False
+            )
+        else:
+            # Null values do not match the pattern but they
+            # are not selected by `not_like` either
+            result = ~series.str.contains(
+                self._pattern,
+                regex=not isinstance(self._pattern, str),
+                na=True
+            )
+
+        return result.to_numpy(dtype=bool, na_value=False)
+
+
+class Expression:
+    """Comparisons fused into a single `DataFrame.eval` call."""
+
+    def __init__(self, conditions: list[Condition], how: str) -> None:
+        self.conditions = conditions
+        self.cost = 1
+        self.columns = {c.column for c in conditions}
+
+        join = ' & ' if how == 'all' else ' | '
+        self.local_dict = {}
+        terms = []
+        for i, cond in enumerate(conditions):
+            name = f'__value_{i}'
+            self.local_dict[name] = cond.value
+            terms.append(
+                f'(`{cond.column}` {_EXPR_OPERATORS[cond.operation]} @{name})'
+            )
+        self.expr = join.join(terms)
+
+    def mask(self, df: pd.DataFrame, rows: np.ndarray | None = None) -> np.ndarray:
+        frame = df[list(self.columns)]
+        if rows is not None:
+            frame = frame.iloc[rows]
+        result = frame.eval(
+            self.expr,
+            engine='numexpr' if _NUMEXPR_INSTALLED else 'python',
+            local_dict=self.local_dict,
+        )
+        return np.asarray(result, dtype=bool)
+
+
+class Group:
+    """A number of nodes combined with AND (`all`) or OR (`any`)."""
+
+    def __init__(self, how: str, members: list) -> None:
+        self.how = how
+        self.members = members
+        self.cost = sum(m.cost for m in members)
+        self.columns = set().union(*[m.columns for m in members])
+
+    def order(self, df: pd.DataFrame) -> None:
+        """Orders members by estimated cost and selectivity.
+
+        For AND groups the member with the lowest `cost / (1 - pass rate)`
+        is evaluated first, for OR groups the one with the lowest
+        `cost / pass rate`. Pass rates are estimated on a sample of rows
+        if the frame is large enough, otherwise only costs are used.
+        """
+        for member in self.members:
+            if isinstance(member, Group):
+                member.order(df)
+
+        if len(self.members) < 2:
+            return
+
+        if len(df) < _SAMPLE_MIN_ROWS:
+            self.members.sort(key=lambda m: m.cost)
+            return
+
+        sample = np.sort(
+            np.random.default_rng(0).choice(len(df), _SAMPLE_SIZE, replace=False)
+        )
+
+        def _rank(member) -> float:
+            try:
+                rate = member.mask(df, sample).mean()
+            except Exception:
+                # Let the evaluation itself report the error
+                return 0.0
+            if self.how == 'all':
+                return member.cost / max(1.0 - rate, 1e-3)
+            return member.cost / max(rate, 1e-3)
+
+        self.members.sort(key=_rank)
+
+    def mask(self, df: pd.DataFrame, rows: np.ndarray | None = None) -> np.ndarray:
+        size = len(df) if rows is None else len(rows)
+        # For AND groups we track rows that may still pass,
+        # for OR groups rows that have not passed yet
+        is_and = self.how == 'all'
+        undecided = np.ones(size, dtype=bool)
+
+        for member in self.members:
+            positions = np.flatnonzero(undecided)
+            if positions.size == 0:
+                break
+
+            if positions.size < size * _SUBSET_DENSITY:
+                sub_rows = positions if rows is None else rows[positions]
+                outcome = member.mask(df, sub_rows)
+                undecided[positions] = outcome if is_and else ~outcome
+            else:
+                outcome = member.mask(df, rows)
+                undecided &= outcome if is_and else ~outcome
+
+        return undecided if is_and else ~undecided
+
+
+def _compile_node(
+    cond: dict, df: pd.DataFrame, backend: str
+) -> Condition | Group:
+    for how in ('all', 'any'):
+        if how in cond:
+            return _compile_group(how, cond[how], df, backend)
+
+    return Condition(
+        column=cond['column'],
+        operation=cond['operation'],
+        value=_cast(cond.get('value'), cond.get('type', 'str')),
+    )
+
+
+def _compile_group(
+    how: str, conditions: list[dict], df: pd.DataFrame, backend: str
+) -> Group:
+    members = [_compile_node(c, df, backend) for c in conditions]
+
+    if backend == 'numexpr':
+        fused = [
+            m for m in members
+            if isinstance(m, Condition)
+            and m.operation in _EXPR_OPERATORS
+            and m.column in df.columns
+            and pd.api.types.is_numeric_dtype(df[m.column])
+            and not isinstance(m.value, str)
+        ]
+        if len(fused) > 1:
+            members = [m for m in members if m not in fused]
+            members.append(Expression(fused, how))
+
+    return Group(how, members)
+
+
+def compile_conditions(
+    conditions: list[dict], df: pd.DataFrame, backend: str = 'pandas'
+) -> Group:
+    """Compiles a list of conditions into an evaluation plan.
+
+    Conditions are dictionaries with keys `column`, `operation`, `value` and
+    optional `type`. A dictionary with a single key `all` or `any` holding
+    a nested list of conditions forms an AND or an OR group respectively.
+    The top-level list is an AND group.
+
+    Args:
+        conditions: A list of conditions.
+        df: A dataframe the plan is built for. Used to estimate selectivity.
+        backend: Either `pandas` or `numexpr`. With `numexpr`, numeric
+            comparisons within a group are fused into a single expression.
+
+    Returns:
+        A root group of the plan.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unsupported backend `{backend}`. Supported backends: {BACKENDS}"
+        )
+
+    plan = _compile_group('all', conditions, df, backend)
+    missing = plan.columns.difference(df.columns)
+    if missing:
+        raise KeyError(f"Columns {sorted(missing)} are not in the dataframe")
+
+    plan.order(df)
+    return plan
+
+
+def apply_conditions(
+    df: pd.DataFrame, conditions: list[dict], backend: str = 'pandas'
+) -> pd.DataFrame:
+    """Filters rows of the dataframe that satisfy all the conditions.
+
+    See `compile_conditions` for the format of conditions.
+    """
+    if not conditions:
+        return df
+
+    plan = compile_conditions(conditions, df, backend)
+    return df.loc[plan.mask(df)]
@@ -1,8 +1,41 @@
-from malevich.square import DF, Any, Context, processor
+import os
+import uuid
 
+import pandas as pd
+from malevich.square import APP_DIR, DF, Any, Context, processor
+
+from ..lib.chunks import ChunkWriter, iter_chunks
+from .conditions import apply_conditions, compile_conditions
 from .models import Filter
 
 
+def _filter_chunked(
+    df: pd.DataFrame, context: Context, conditions: list[dict], backend: str
+) -> pd.DataFrame:
+    chunk_size = context.app_cfg['chunk_size']
+    paths = [context.get_share_path(f) for f in df['filename'].to_list()]
+
+    ext = os.path.splitext(paths[0])[1] if paths else '.parquet'
+    output = f'filter-{uuid.uuid4().hex[:8]}{ext}'
+
+    plan = None
+    with ChunkWriter(os.path.join(APP_DIR, output)) as writer:
+        for chunk in iter_chunks(paths, chunk_size):
+            if not conditions:
+                writer.write(chunk)
+                continue
+            # The plan is compiled once on the first chunk
+            if plan is None:
+                plan = compile_conditions(conditions, chunk, backend)
+            writer.write(chunk.loc[plan.mask(chunk)])
+
+        if writer.chunks == 0:
+            writer.write(pd.DataFrame())
+
+    context.share(output)
+    return pd.DataFrame({'filename': [output]})
+
+
 @processor()
 def filter(df: DF[Any], context: Context[Filter]):
     """Filters rows by a number of conditions
@@ -28,6 +61,19 @@ def filter(df: DF[Any], context: Context[Filter]):
         `type`: str.
             The type of the value to filter on (optional).
 
+        Conditions may be grouped: a dictionary with a single key `all` or
+        `any` containing a nested list of conditions matches rows that satisfy
+        all or any of the nested conditions respectively. The top-level list
+        is always combined with AND.
+
+        - `backend`: str, default 'pandas'.
+            Either 'pandas' or 'numexpr'. With 'numexpr', numeric comparisons
+            within a group are fused into a single expression evaluated with
+            `numexpr` (if installed).
+
+        - `chunk_size`: int, default None.
+            If set, the processor runs in chunked mode. See Details.
+
     ## Example:
     {
         "conditions": [
@@ -38,9 +84,17 @@ def filter(df: DF[Any], context: Context[Filter]):
                 "type": "int"
             },
             {
-                "column": "name",
-                "operation": "like",
-                "value": "John"
+                "any": [
+                    {
+                        "column": "name",
+                        "operation": "like",
+                        "value": "John"
+                    },
+                    {
+                        "column": "name",
+                        "operation": "is_null"
+                    }
+                ]
             }
         ]
     }
@@ -65,6 +119,22 @@ def filter(df: DF[Any], context: Context[Filter]):
     - bool
     - str
 
+    ## Details:
+        Conditions are compiled into a single boolean mask, so the dataframe
+        is copied only once. Cheap and selective conditions are evaluated first
+        and the rest are evaluated only on the rows that still may pass.
+        Patterns of `like` and `not_like` without regular expression
+        metacharacters are matched as plain substrings. Null values match
+        neither `like` nor `not_like`.
+
+        In chunked mode, the input dataframe should contain a column `filename`
+        with keys of shared parquet or CSV files. The files are read one after
+        another in chunks of `chunk_size` rows and the filtered rows are
+        appended to a new shared file of the same format as the first input
+        file. The output is a dataframe with a single column `filename`
+        containing the key of that file. The peak memory is bounded by the
+        chunk size rather than the size of the input.
+
     -----
 
     Args:
@@ -75,45 +145,9 @@ def filter(df: DF[Any], context: Context[Filter]):
         A filtered dataframe
     """
     conditions = context.app_cfg.get('conditions', [])
+    backend = context.app_cfg.get('backend', 'pandas')
+
+    if context.app_cfg.get('chunk_size', None):
+        return _filter_chunked(df, context, conditions, backend)
 
-    for cond in conditions:
-        column = cond['column']
-        operator = cond['operation']
-        value = cond['value']
-        val_type = cond.get('type', 'str')
-
-        if val_type == 'int':
-            value = int(value)
-        elif val_type == 'float':
-            value = float(value)
-        elif val_type == 'bool':
-            value = bool(value)
-        elif val_type == 'str':
-            value = str(value)
-
-        if operator == 'equal':
-            df = df[df[column] == value]
-        elif operator == 'not_equal':
-            df = df[df[column] != value]
-        elif operator == 'greater':
-            df = df[df[column] > value]
-        elif operator == 'greater_equal':
-            df = df[df[column] >= value]
-        elif operator == 'less':
-            df = df[df[column] < value]
-        elif operator == 'less_equal':
-            df = df[df[column] <= value]
-        elif operator == 'in':
-            df = df[df[column].isin(value)]
-        elif operator == 'not_in':
-            df = df[~df[column].isin(value)]
-        elif operator == 'like':
-            df = df[df[column].str.contains(value)]
-        elif operator == 'not_like':
-            df = df[~df[column].str.contains(value)]
-        elif operator == 'is_null':
-            df = df[df[column].isna()]
-        elif operator == 'is_not_null':
-            df = df[df[column].notna()]
-
-    return df
+    return apply_conditions(df, conditions, backend)
@@ -1,11 +1,183 @@
+import os
+import uuid
+from collections.abc import Iterator
 from typing import Any
 
 import pandas as pd
-from malevich.square import DF, Context, processor
+from malevich.square import APP_DIR, DF, Context, processor
 
+from ..lib.chunks import ChunkWriter, count_rows, iter_chunks
 from .models import Locs
 
 
+def _select_columns(
+    df: pd.DataFrame,
+    column: str | None,
+    columns: list[str] | None,
+    column_idx: int | None,
+    column_idxs: list[int] | None,
+    unique: bool,
+) -> pd.DataFrame:
+    result = df
+
+    # We start with column id as it is the most specific
+    # and thus the most restrictive
+    if column_idx is not None and len(result.columns) > column_idx:
+        series = result.iloc[:, column_idx]
+        if unique:
+            result = pd.DataFrame(pd.unique(series), columns=[series.name])
+        else:
+            result = pd.DataFrame(series)
+    elif column_idxs is not None:
+        # Multiple indices are only processed if
+        # column_id is not provided to keep
+        # indices consistent
+
+        # Filter only those indices that are in the dataframe
+        # to tolerate missing columns
+        column_idxs = [
+            idx for idx in column_idxs
+            if len(result.columns) > idx
+        ]
+
+        result = pd.DataFrame(result.iloc[:, column_idxs])
+
+
+    # ________________________________________________
+
+
+    if column is not None and column in result.columns:
+        series: pd.Series = result[column]
+        if unique:
+            result = pd.DataFrame(pd.unique(series), columns=[series.name])
+        else:
+            result = pd.DataFrame(series)
+        result = pd.DataFrame(result[column])
+
+    if columns is not None:
+        # Multiple columns are only processed if
+        # column is not provided to keep
+        # indices consistent
+
+        # Filter only those columns that are in the dataframe
+        # to tolerate missing columns
+        columns = [
+            col for col in columns
+            if col in result.columns
+        ]
+
+        result = pd.DataFrame(result[columns])
+
+    return result
+
+
+def _row_positions(
+    total: int,
+    row: int | None,
+    rows: list[int] | None,
+    row_idx: int | None,
+    row_idxs: list[int] | None,
+) -> list[int] | None:
+    # Mirrors the row selection of the in-memory path. Chunks are indexed
+    # with global positions, so row labels coincide with positions.
+    # Returns None if all rows are selected
+    positions = range(total)
+
+    if row_idx is not None and total > row_idx:
+        positions = [positions[row_idx]]
+    elif row_idxs is not None:
+        positions = [positions[idx] for idx in row_idxs if total > idx]
+
+    if row is not None and row in positions:
+        if isinstance(positions, range):
+            positions = [row]
+        else:
+            positions = [p for p in positions if p == row]
+
+    if rows is not None:
+        rows = [r for r in rows if r in positions]
+        if isinstance(positions, range):
+            positions = rows
+        else:
+            positions = [p for r in rows for p in positions if p == r]
+
+    if isinstance(positions, range):
+        return None
+    return positions
+
+
+def _locs_chunked(
+    df: pd.DataFrame,
+    context: Context,
+    column: str | None,
+    columns: list[str] | None,
+    column_idx: int | None,
+    column_idxs: list[int] | None,
+    row: int | None,
+    rows: list[int] | None,
+    row_idx: int | None,
+    row_idxs: list[int] | None,
+    unique: bool,
+) -> pd.DataFrame:
+    chunk_size = context.app_cfg['chunk_size']
+    paths = [context.get_share_path(f) for f in df['filename'].to_list()]
+
+    def _stage() -> Iterator[pd.DataFrame]:
+        # Yields chunks after the column selection indexed with
+        # global positions of rows within the selection
+        seen = set()
+        offset = 0
+        for chunk in iter_chunks(paths, chunk_size):
+            chunk = _select_columns(
+                chunk, column, columns, column_idx, column_idxs, unique
+            )
+            if unique and len(chunk.columns) > 0:
+                # Values are unique within a chunk, but
+                # might have been seen in previous ones
+                chunk = chunk[~chunk.iloc[:, 0].isin(seen).to_numpy()]
+                seen.update(chunk.iloc[:, 0].to_list())
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    positions = None
+    if any(x is not None for x in (row, rows, row_idx, row_idxs)):
+        # Positional selection requires the total number of rows
+        if unique:
+            total = sum(len(chunk) for chunk in _stage())
+        else:
+            total = count_rows(paths)
+        positions = _row_positions(total, row, rows, row_idx, row_idxs)
+
+    ext = os.path.splitext(paths[0])[1] if paths else '.parquet'
+    output = f'locs-{uuid.uuid4().hex[:8]}{ext}'
+    empty = pd.DataFrame()
+
+    with ChunkWriter(os.path.join(APP_DIR, output)) as writer:
+        if positions is None:
+            for chunk in _stage():
+                writer.write(chunk)
+        elif positions:
+            # Only requested rows are kept in memory
+            wanted = set(positions)
+            last = max(wanted)
+            selected = []
+            for chunk in _stage():
+                empty = chunk.iloc[:0]
+                selected.append(chunk[chunk.index.isin(wanted)])
+                if len(chunk) and chunk.index[-1] >= last:
+                    break
+            writer.write(pd.concat(selected).loc[positions])
+        else:
+            empty = next(_stage(), empty).iloc[:0]
+
+        if writer.chunks == 0:
+            writer.write(empty)
+
+    context.share(output)
+    return pd.DataFrame({'filename': [output]})
+
+
 @processor(id='locs')
 def locs(df: DF[Any], context: Context[Locs]):
     """ Locate Statically - Extracts a subset of the dataframe
@@ -37,6 +209,8 @@ def locs(df: DF[Any], context: Context[Locs]):
             The row indexes to be extracted.
         - `unique`: bool, default False.
             Get unique values from column. Must be used with `column` or `column_idx`.
+        - `chunk_size`: int, default None.
+            If set, the processor runs in chunked mode. See Notes.
 
         Multiple fields may be provided and in such case,
         the function will extract the intersection of the fields.
@@ -49,6 +223,16 @@ def locs(df: DF[Any], context: Context[Locs]):
         If both specific and general conditions are given, the function prioritizes
         the specific ones to maintain consistency.
 
+        In chunked mode, the input dataframe should contain a column `filename`
+        with keys of shared parquet or CSV files. The files are read one after
+        another as a single dataframe in chunks of `chunk_size` rows and the
+        selection is appended to a new shared file of the same format as the
+        first input file. The output is a dataframe with a single column
+        `filename` containing the key of that file. Rows are labeled with
+        their global positions, so `row` and `rows` refer to the same rows as
+        `row_idx` and `row_idxs`. Row selections require the number of rows in
+        the input, so CSV files are read twice in that case.
+
     -----
 
     Args:
@@ -84,60 +268,17 @@ def locs(df: DF[Any], context: Context[Locs]):
     if unique and not (column or column_idx):
         raise AssertionError("unique field should be used with column or column_idx")
 
-    # Copy the dataframe to avoid side effects
-    result: pd.DataFrame = df.copy()
-
-    # ________________________________________________
-
-
-    # We start with column id as it is the most specific
-    # and thus the most restrictive
-    if column_idx is not None and len(result.columns) > column_idx:
-        series = result.iloc[:, column_idx]
-        if unique:
-            result = pd.DataFrame(pd.unique(series), columns=[series.name])
-        else:
-            result = pd.DataFrame(series)
-    elif column_idxs is not None:
-        # Multiple indices are only processed if
-        # column_id is not provided to keep
-        # indices consistent
-
-        # Filter only those indices that are in the dataframe
-        # to tolerate missing columns
-        column_idxs = [
-            idx for idx in column_idxs
-            if len(result.columns) > idx
-        ]
-
-        result = pd.DataFrame(result.iloc[:, column_idxs])
-
-
-    # ________________________________________________
-
-
-    if column is not None and column in result.columns:
-        series: pd.Series = result[column]
-        if unique:
-            result = pd.DataFrame(pd.unique(series), columns=[series.name])
-        else:
-            result = pd.DataFrame(series)
-        result = pd.DataFrame(result[column])
-
-    if columns is not None:
-        # Multiple columns are only processed if
-        # column is not provided to keep
-        # indices consistent
-
-        # Filter only those columns that are in the dataframe
-        # to tolerate missing columns
-        columns = [
-            col for col in columns
-            if col in result.columns
-        ]
-
-        result = pd.DataFrame(result[columns])
+    if context.app_cfg.get('chunk_size', None):
+        return _locs_chunked(
+            df, context, column, columns, column_idx, column_idxs,
+            row, rows, row_idx, row_idxs, unique
+        )
 
+    # None of the selections below modify the dataframe in place,
+    # so there is no need to copy it
+    result = _select_columns(
+        df, column, columns, column_idx, column_idxs, unique
+    )
 
     # ________________________________________________
 
@@ -14,3 +14,11 @@ class Filter(BaseModel):
     conditions: Optional[List[Dict[str, Any]]] = Field(
         [], description='A list of conditions containing dictionaries'
     )
+    backend: Optional[str] = Field(
+        'pandas',
+        description="Either 'pandas' or 'numexpr'. With 'numexpr', numeric comparisons are fused into a single expression",
+    )
+    chunk_size: Optional[int] = Field(
+        None,
+        description='If set, shared files from the `filename` column are processed in chunks of this number of rows',
+    )
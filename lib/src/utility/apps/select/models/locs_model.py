@@ -34,3 +34,7 @@ class Locs(BaseModel):
         False,
         description='Get unique values from column. Must be used with `column` or `column_idx`',
     )
+    chunk_size: Optional[int] = Field(
+        None,
+        description='If set, shared files from the `filename` column are processed in chunks of this number of rows',
+    )
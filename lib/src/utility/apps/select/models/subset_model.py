@@ -15,3 +15,6 @@ class Subset(BaseModel):
         None,
         description='A comma-separated list of integers or slices, e.g. `0,1:3,5:7,6,9:10`. The first dataframe has index 0',
     )
+    unique: Optional[bool] = Field(
+        False, description='If true, repeated indices are selected only once'
+    )
@@ -5,6 +5,43 @@ from malevich.square import DFS, Context, M, processor
 
 from .models import Subset
 
+# An index or a slice with an optional step, e.g. `-1`, `1:3`, `::2` or `5::-1`
+_ITEM = r"-?\d+|-?\d*\:-?\d*(\:-?\d*)?"
+_EXPR = re.compile(rf"^({_ITEM})(\,({_ITEM}))*$")
+_ZERO = re.compile(r"-?0+")
+
+
+def _is_valid(expr: str) -> bool:
+    """Checks the syntax of an expression. A slice step cannot be zero."""
+    if not _EXPR.match(expr):
+        return False
+    return not any(
+        item.count(":") == 2 and _ZERO.fullmatch(item.rsplit(":", 1)[1])
+        for item in expr.split(",")
+    )
+
+
+def _positions(expr: str, size: int, unique: bool = False) -> list[int]:
+    """Resolves an expression into positions of dataframes.
+
+    Indices and slices follow Python semantics, so negative indices count
+    from the end and out-of-range slices are truncated.
+    """
+    positions = range(size)
+    result = []
+    for item in expr.split(","):
+        if ":" in item:
+            result.extend(
+                positions[slice(*[int(x) if x else None for x in item.split(":")])]
+            )
+        else:
+            # Raises IndexError for out-of-range indices
+            result.append(positions[int(item)])
+
+    if unique:
+        result = list(dict.fromkeys(result))
+    return result
+
 
 @processor(id='subset')
 def subset(dfs: DFS[M[Any]], context: Context[Subset]):
@@ -19,15 +56,24 @@ def subset(dfs: DFS[M[Any]], context: Context[Subset]):
     ## Configuration:
         - `expr`: str, default None.
             A comma-separated list of integers or slices, e.g. `0,1:3,5:7,6,9:10`. The first dataframe has index 0.
+        - `unique`: bool, default False.
+            If true, repeated indices are selected only once.
 
     ## Details:
         The `expr` field should be a comma-separated list of integers or slices,
         e.g. `0,1:3,5:7,6,9:10`.
 
-        Zero-based indexing is used for the dataframes.
+        Zero-based indexing is used for the dataframes. Indices and slices
+        follow Python semantics: negative indices count from the end
+        (`-1` is the last dataframe), slices may omit bounds and have
+        a step (`:3`, `2:`, `::2`, `::-1`).
 
         `expr` is matched against the regular expression
-            `^(\d+|(\d+\:\d+))(\,(\d+|(\d+\:\d+)))*$`.
+            `^(-?\d+|-?\d*\:-?\d*(\:-?\d*)?)(\,(-?\d+|-?\d*\:-?\d*(\:-?\d*)?))*$`.
+        The step of a slice cannot be zero.
+
+        Positions are resolved arithmetically and dataframes are selected
+        by reference, so none of them are copied.
 
         If the expression contains only one element, a single dataframe is
         returned. Otherwise, a slice of dataframes is returned.
@@ -46,30 +92,14 @@ def subset(dfs: DFS[M[Any]], context: Context[Subset]):
     if expr is None:
         raise ValueError("The app configuration should contain `expr` field")
 
-    assert re.match(r"^(\d+|(\d+\:\d+))(\,(\d+|(\d+\:\d+)))*$", expr), \
+    expr = expr.replace(" ", "")
+    assert _is_valid(expr), \
         "The `expr` field should be a comma-separated list of integers " \
-        "or slices, e.g. `0,1:3,5:7,6,9:10`"
-
-    # Split the expression by comma
-    exprs = expr.split(",")
-
-    # Initialize the result
-    result = []
-
-    # Iterate over the expressions
-    for expr in exprs:
-        # Split the expression by colon
-        expr = expr.split(":")
+        "or slices, e.g. `0,1:3,5:7,6,9:10,-1,::2`"
 
-        # If the expression contains only one element,
-        # it means that we should retrieve only one dataframe
-        if len(expr) == 1:
-            result.append(dfs[0][int(expr[0])])
-        # Otherwise, we should retrieve a slice of dataframes
-        else:
-            result.extend(dfs[0][int(expr[0]):int(expr[1])])
+    positions = _positions(expr, len(dfs[0]), context.app_cfg.get("unique", False))
 
-    if len(result) == 1:
-        return result[0]
+    if len(positions) == 1:
+        return dfs[0][positions[0]]
 
-    return result
+    return [dfs[0][i] for i in positions]
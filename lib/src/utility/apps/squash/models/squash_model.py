@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Dict, List, Optional, Union
 
 from malevich.square import scheme
 from pydantic import BaseModel, Field
@@ -11,11 +11,11 @@ from pydantic import BaseModel, Field
 
 @scheme()
 class Squash(BaseModel):
-    by: Optional[str] = Field(
+    by: Optional[Union[str, List[str]]] = Field(
         'all',
-        description='The column to group by. If not specified, all columns will be squashed',
+        description='The column or columns to group by. If not specified, all columns will be squashed',
     )
-    delim: Optional[str] = Field(
+    delim: Optional[Union[str, Dict[str, str]]] = Field(
         ',',
-        description='The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,)',
+        description='The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,). A mapping from column names to delimiters may be provided',
     )
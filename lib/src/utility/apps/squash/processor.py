@@ -1,23 +1,56 @@
 from typing import Any
 
+import numpy as np
 import pandas as pd
 from malevich.square import DF, Context, processor
 
 from .models import Squash, SquashColumns, SquashRows
 
 
+def _as_str(series: pd.Series) -> pd.Series:
+    # Same representation as `str(x)` for every value
+    return series.map(str).astype(str)
+
+
+def _delim_for(delim: str | dict[str, str], column: str) -> str:
+    if isinstance(delim, dict):
+        return delim.get(column, ",")
+    return delim
+
+
 def _squash_row_df(
-    df: pd.DataFrame, key: str, value: str, delm: str = ","
+    df: pd.DataFrame, by: list[str] | None, delim: str | dict[str, str] = ","
 ) -> pd.DataFrame:
-    data_ = {
-        x: [delm.join(map(str, df[x].to_list()))]
-        for x in df.columns if x != key
-    }
+    if not by:
+        return pd.DataFrame({
+            x: [_delim_for(delim, x).join(_as_str(df[x]).to_list())]
+            for x in df.columns
+        })
+
+    if df.empty:
+        return pd.DataFrame(columns=df.columns)
 
-    if key:
-        data_[key] = [value]
+    values = [x for x in df.columns if x not in by]
 
-    return pd.DataFrame(data_)
+    # A single groupby pass assigns sorted group numbers to rows,
+    # rows with missing keys are dropped like in `DataFrame.groupby`
+    numbers = df.groupby([df[x] for x in by], sort=True).ngroup().to_numpy()
+    valid = np.flatnonzero(~np.isnan(numbers))
+    numbers = numbers[valid].astype(np.int64)
+
+    # Stable sort keeps the order of rows within groups
+    order = valid[np.argsort(numbers, kind="stable")]
+    ends = np.cumsum(np.bincount(numbers))
+    starts = ends - np.diff(ends, prepend=0)
+
+    result = df[by].iloc[order[starts]].reset_index(drop=True)
+    for x in values:
+        strs = _as_str(df[x]).to_numpy(dtype=object)[order].tolist()
+        join = _delim_for(delim, x).join
+        result[x] = [join(strs[s:e]) for s, e in zip(starts, ends)]
+
+    # Group keys follow the squashed columns
+    return result[values + by]
 
 
 def _squash_column_df(
@@ -28,19 +61,21 @@ def _squash_column_df(
     delim: str = ",",
 ) -> pd.DataFrame:
     if not columns:
-        columns = df.columns
+        columns = list(df.columns)
     if not res_col_name:
         res_col_name = "_".join(columns)
-    df_ = df.copy()
-    # Turn all specified columns into strings
-    df_[columns] = df_[columns].astype(str)
-    if not df_.empty:
-         df_[res_col_name] = df_[columns].apply(
-             lambda row: delim.join(row), axis=1
-        )
-    if drop:
-        df_.drop(columns=columns, inplace=True)
-    return df_
+
+    first, *others = [_as_str(df[x]) for x in columns]
+    joined = first.str.cat(others, sep=delim) if others else first
+
+    if not drop:
+        # The input is kept as it is
+        return df.assign(**{res_col_name: joined})
+
+    # The squashed columns are dropped from the input, so it is not copied
+    df.drop(columns=columns, inplace=True)
+    df[res_col_name] = joined
+    return df
 
 
 @processor()
@@ -55,11 +90,15 @@ def squash_rows(df: DF[Any], context: Context[SquashRows]):
         multiple rows for each input row.
 
     ## Configuration:
-        - `by`: str, default 'all'.
-            The column to group by. If not specified, all columns will be squashed.
+        - `by`: str|list[str], default 'all'.
+            The column or columns to group by. If not specified, all columns will be squashed.
 
-        - `delim`: str, default ','.
-            The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,).
+        - `delim`: str|dict[str, str], default ','.
+            The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,). A mapping from column names to delimiters may be provided to use different delimiters for different columns.
+
+    ## Details:
+        Rows are squashed in a single groupby pass. Grouping columns follow
+        the squashed ones in the output and groups are sorted by their keys.
 
     -----
 
@@ -73,24 +112,11 @@ def squash_rows(df: DF[Any], context: Context[SquashRows]):
     squash_by = context.app_cfg.get("by", None)
     squash_delim = context.app_cfg.get("delim", ",")
 
-    if not squash_by:
-        return _squash_row_df(df, squash_by, squash_delim)
-
-    else:
-        pds = []
-        for val, group in df.groupby(squash_by):
-            pds.append(
-                _squash_row_df(
-                    group,
-                    squash_by,
-                    val,
-                    squash_delim
-                ).reset_index(drop=True)
-            )
-        if len(pds) != 0:
-            return pd.concat(pds).reset_index(drop=True)
-        else:
-            return pd.DataFrame(columns=df.columns)
+    if isinstance(squash_by, str):
+        squash_by = [] if squash_by == "all" and squash_by not in df.columns \
+            else [squash_by]
+
+    return _squash_row_df(df, squash_by, squash_delim)
 
 
 @processor()
@@ -105,11 +131,15 @@ def squash(df: DF[Any], context: Context[Squash]):
         multiple rows for each input row.
 
     ## Configuration:
-        - `by`: str, default 'all'.
-            The column to group by. If not specified, all columns will be squashed.
+        - `by`: str|list[str], default 'all'.
+            The column or columns to group by. If not specified, all columns will be squashed.
 
-        - `delim`: str, default ','.
-            The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,).
+        - `delim`: str|dict[str, str], default ','.
+            The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,). A mapping from column names to delimiters may be provided to use different delimiters for different columns.
+
+    ## Details:
+        Rows are squashed in a single groupby pass. Grouping columns follow
+        the squashed ones in the output and groups are sorted by their keys.
 
     -----
 
@@ -144,6 +174,12 @@ def squash_columns(df: DF[Any], context: Context[SquashColumns]):
         - `delim`: str, default ','.
             The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,).
 
+    ## Details:
+        The resulting column is appended to a new dataframe, so the input
+        is not modified. If `drop` is set, the squashed columns are replaced
+        with the resulting column in the input dataframe instead of copying
+        it. The squashed columns keep their values.
+
     -----
 
     Args:
@@ -19,3 +19,11 @@ class Unwrap(BaseModel):
         ',',
         description='The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,)',
     )
+    max_rows: Optional[int] = Field(
+        None,
+        description='The maximum number of output rows. If the product of values would produce more rows, an error is raised',
+    )
+    chunk_size: Optional[int] = Field(
+        None,
+        description='If set, the output is built in chunks of this number of rows and written to a shared parquet file',
+    )
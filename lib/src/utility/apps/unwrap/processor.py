@@ -1,13 +1,67 @@
 # Author: Leonid Zelenskiy <pak55256@gmail.com>
-from itertools import product
+import os
+import uuid
 from typing import Any
 
+import numpy as np
 import pandas as pd
-from malevich.square import DF, Context, processor
+from malevich.square import APP_DIR, DF, Context, processor
 
+from ..lib.chunks import ChunkWriter
 from .models import Unwrap
 
 
+class _Plan:
+    """Index arithmetic of the cartesian product.
+
+    Each unwrapped column of an input row is split into a number of parts.
+    The row produces as many output rows as the product of these numbers.
+    Within an output row `k` of an input row, the part of a column is
+    `(k // stride) % count`, where `stride` is the product of counts of
+    the unwrapped columns that follow it. This reproduces the order of
+    `itertools.product` over the columns.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: list[str], delim: str) -> None:
+        self.df = df
+        self.columns = columns
+
+        n = len(df)
+        self.parts = {}
+        self.offsets = {}
+        self.counts = {}
+        for col in columns:
+            parts = df[col].map(str).astype(str).str.split(delim, regex=False)
+            counts = parts.str.len().to_numpy(dtype=np.int64)
+            self.parts[col] = parts.explode().to_numpy()
+            self.counts[col] = counts
+            self.offsets[col] = np.cumsum(counts) - counts
+
+        self.strides = {}
+        stride = np.ones(n, dtype=np.int64)
+        for col in reversed(columns):
+            self.strides[col] = stride
+            stride = stride * self.counts[col]
+
+        # `stride` is now the number of output rows of each input row
+        self.ends = np.cumsum(stride)
+        self.starts = self.ends - stride
+        self.total = int(self.ends[-1]) if n else 0
+
+    def take(self, start: int, stop: int) -> pd.DataFrame:
+        """Builds output rows with positions in [start, stop)."""
+        positions = np.arange(start, stop, dtype=np.int64)
+        rows = np.searchsorted(self.ends, positions, side='right')
+        local = positions - self.starts[rows]
+
+        # Columns that are not unwrapped keep their dtypes
+        result = self.df.iloc[rows].reset_index(drop=True)
+        for col in self.columns:
+            part = (local // self.strides[col][rows]) % self.counts[col][rows]
+            result[col] = self.parts[col][self.offsets[col][rows] + part]
+        return result
+
+
 @processor()
 def unwrap(
     df: DF[Any],
@@ -52,6 +106,12 @@ def unwrap(
         - `delimiter`: str, default ','.
             The delimiter used to separate values in the columns. If not specified, the default delimiter is a comma (,).
 
+        - `max_rows`: int, default None.
+            The maximum number of output rows. If the product of values would produce more rows, an error is raised before any row is built.
+
+        - `chunk_size`: int, default None.
+            If set, the output is built in chunks of this number of rows and written to a shared parquet file. The processor then returns a dataframe with a single column `filename` containing the key of that file.
+
     ## Notes:
 
         Be careful when using this processor with columns that contain
@@ -72,6 +132,9 @@ def unwrap(
     | 1  | B    | 1       |
     | 1  | B    | 2       |
 
+        Columns that are not unwrapped keep their types, while unwrapped
+        columns contain strings.
+
     -----
 
     Args:
@@ -86,19 +149,31 @@ def unwrap(
         each input row.
     """  # noqa: E501
 
-    pop_columns = context.app_cfg.get('columns', df.columns)
+    pop_columns = context.app_cfg.get('columns', None)
     delim = context.app_cfg.get('delimiter', ',')
+    max_rows = context.app_cfg.get('max_rows', None)
+    chunk_size = context.app_cfg.get('chunk_size', None)
+
+    if not pop_columns or 'all' in pop_columns:
+        pop_columns = df.columns
 
-    outputs = []
+    plan = _Plan(df, [c for c in df.columns if c in pop_columns], delim)
 
-    for _, row in df.iterrows():
-        outputs.extend(
-            product(
-                *[
-                    (str(row[col]).split(delim) if col in pop_columns else [row[col]])
-                    for col in df.columns
-                ]
-            )
+    if max_rows is not None and plan.total > max_rows:
+        raise ValueError(
+            f"Unwrapping would produce {plan.total} rows, which exceeds "
+            f"`max_rows` ({max_rows}). Increase `max_rows` or use `chunk_size`."
         )
 
-    return pd.DataFrame(outputs, columns=df.columns)
+    if not chunk_size:
+        return plan.take(0, plan.total)
+
+    output = f'unwrap-{uuid.uuid4().hex[:8]}.parquet'
+    with ChunkWriter(os.path.join(APP_DIR, output)) as writer:
+        for start in range(0, plan.total, chunk_size):
+            writer.write(plan.take(start, min(start + chunk_size, plan.total)))
+        if writer.chunks == 0:
+            writer.write(plan.take(0, 0))
+
+    context.share(output)
+    return pd.DataFrame({'filename': [output]})
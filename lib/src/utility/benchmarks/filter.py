@@ -0,0 +1,101 @@
+"""Compares the sequential filtering path with the compiled plan.
+
+Run from `lib/src/utility`:
+
+    python -m benchmarks.filter --rows 20000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from apps.select.conditions import apply_conditions
+
+CONDITIONS = [
+    {'column': 'c0', 'operation': 'greater', 'value': 10, 'type': 'int'},
+    {'column': 'c1', 'operation': 'less', 'value': 900, 'type': 'int'},
+    {'column': 'c2', 'operation': 'not_equal', 'value': 5, 'type': 'int'},
+    {'column': 'c3', 'operation': 'greater_equal', 'value': 0.1, 'type': 'float'},
+    {'column': 'c4', 'operation': 'less_equal', 'value': 0.95, 'type': 'float'},
+    {'column': 'c5', 'operation': 'is_not_null'},
+    {'column': 'c6', 'operation': 'in', 'value': [1, 2, 3, 4, 5, 6], 'type': 'int'},
+    {'column': 'name', 'operation': 'like', 'value': 'ab'},
+    {'column': 'name', 'operation': 'not_like', 'value': 'zz'},
+    {'column': 'c0', 'operation': 'less', 'value': 990, 'type': 'int'},
+]
+
+
+def sequential(df: pd.DataFrame, conditions: list[dict]) -> pd.DataFrame:
+    # The original implementation: one mask and one copy per condition
+    for cond in conditions:
+        column = cond['column']
+        value = cond.get('value')
+        op = cond['operation']
+        if op == 'greater':
+            df = df[df[column] > value]
+        elif op == 'greater_equal':
+            df = df[df[column] >= value]
+        elif op == 'less':
+            df = df[df[column] < value]
+        elif op == 'less_equal':
+            df = df[df[column] <= value]
+        elif op == 'not_equal':
+            df = df[df[column] != value]
+        elif op == 'in':
+            df = df[df[column].isin(value)]
+        elif op == 'is_not_null':
+            df = df[df[column].notna()]
+        elif op == 'like':
+            df = df[df[column].str.contains(value)]
+        elif op == 'not_like':
+            df = df[~df[column].str.contains(value)]
+    return df
+
+
+def make_frame(rows: int, extra_columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = {
+        'c0': rng.integers(0, 1000, rows),
+        'c1': rng.integers(0, 1000, rows),
+        'c2': rng.integers(0, 10, rows),
+        'c3': rng.random(rows),
+        'c4': rng.random(rows),
+        'c5': np.where(rng.random(rows) < 0.05, np.nan, rng.random(rows)),
+        'c6': rng.integers(0, 8, rows),
+        'name': pd.Series(
+            rng.choice(['abc', 'bcd', 'xab', 'zzz', 'qwe'], rows)
+        ),
+    }
+    for i in range(extra_columns):
+        data[f'extra_{i}'] = rng.random(rows)
+    return pd.DataFrame(data)
+
+
+def measure(fn, *args) -> tuple[float, pd.DataFrame]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    for shape, extra in (('narrow', 0), ('wide', 100)):
+        df = make_frame(args.rows, extra)
+        t_seq, expected = measure(sequential, df, CONDITIONS)
+        t_pd, result = measure(apply_conditions, df, CONDITIONS, 'pandas')
+        assert result.index.equals(expected.index)
+        t_ne, result = measure(apply_conditions, df, CONDITIONS, 'numexpr')
+        assert result.index.equals(expected.index)
+        print(
+            f'{shape:>6} {args.rows} rows x {df.shape[1]} columns: '
+            f'sequential {t_seq:.3f}s, '
+            f'compiled {t_pd:.3f}s ({t_seq / t_pd:.1f}x), '
+            f'compiled+numexpr {t_ne:.3f}s ({t_seq / t_ne:.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
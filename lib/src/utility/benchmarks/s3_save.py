@@ -0,0 +1,104 @@
+"""Compares output formats of `s3_save` on a write/read round trip.
+
+The baseline is an uncompressed CSV written with `DataFrame.to_csv` and
+read with `pd.read_csv`. Every other format is written with
+`apps.s3.formats.write_file` and read back. The
+network is not involved: the time of an upload is proportional to the
+size of the object, which is reported as well.
+
+Run from `lib/src/utility` (the default frame takes about 2GB in memory):
+
+    python -m benchmarks.s3_save --rows 32000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from apps.s3.formats import extension, write_file
+
+FORMATS = [
+    ('parquet', 'zstd'),
+    ('parquet', 'snappy'),
+    ('arrow', 'zstd'),
+    ('arrow', 'lz4'),
+    ('csv', 'gzip'),
+    ('csv', 'zstd'),
+]
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'user': rng.integers(0, 100_000, rows),
+        'price': rng.random(rows) * 100,
+        'score': rng.normal(size=rows),
+        'ratio': rng.random(rows),
+        'weight': rng.random(rows),
+        'country': pd.Series(rng.choice(['us', 'de', 'fr', 'jp', 'br'], rows)),
+        'ts': pd.Timestamp('2024-01-01')
+        + pd.to_timedelta(rng.integers(0, 86_400 * 365, rows), unit='s'),
+    })
+
+
+def read_file(path: str, fmt: str, compression: str | None) -> pa.Table:
+    if fmt == 'parquet':
+        return pq.read_table(path)
+    if fmt == 'arrow':
+        with pa.memory_map(path) as source:
+            return ipc.open_file(source).read_all()
+    return pa_csv.read_csv(pa.input_stream(path, compression=compression))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=32_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    print(
+        f'{args.rows} rows, {df.memory_usage(deep=True).sum() / 2 ** 30:.2f}GB '
+        'in memory'
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'baseline.csv')
+        start = time.perf_counter()
+        df.to_csv(path, index=False)
+        t_write = time.perf_counter() - start
+        start = time.perf_counter()
+        pd.read_csv(path)
+        t_read = time.perf_counter() - start
+        size = os.path.getsize(path)
+        os.remove(path)
+        print(
+            f'{"csv (baseline)":>16}: write {t_write:7.2f}s, read {t_read:7.2f}s, '
+            f'{size / 2 ** 20:9.1f}MB'
+        )
+
+        for fmt, compression in FORMATS:
+            path = os.path.join(tmp, 'out' + extension(fmt, compression))
+            start = time.perf_counter()
+            write_file(df, path, fmt, compression, None)
+            t_write_fmt = time.perf_counter() - start
+            start = time.perf_counter()
+            read_file(path, fmt, compression).to_pandas()
+            t_read_fmt = time.perf_counter() - start
+            size_fmt = os.path.getsize(path)
+            os.remove(path)
+            print(
+                f'{fmt + " " + compression:>16}: write {t_write_fmt:7.2f}s, '
+                f'read {t_read_fmt:7.2f}s, {size_fmt / 2 ** 20:9.1f}MB '
+                f'({t_write / t_write_fmt:.1f}x write, {size / size_fmt:.1f}x smaller)'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Compares the per-group loop of `squash_rows` and the row-wise
+`squash_columns` with their vectorized implementations.
+
+Run from `lib/src/utility`:
+
+    python -m benchmarks.squash --rows 5000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from apps.squash.processor import _squash_column_df, _squash_row_df
+
+
+def loop_squash_rows(df: pd.DataFrame, key: str, delim: str) -> pd.DataFrame:
+    # The original implementation: one frame per group
+    pds = []
+    for val, group in df.groupby(key):
+        data_ = {
+            x: [delim.join(map(str, group[x].to_list()))]
+            for x in group.columns if x != key
+        }
+        data_[key] = [val]
+        pds.append(pd.DataFrame(data_))
+    return pd.concat(pds).reset_index(drop=True)
+
+
+def apply_squash_columns(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    # The original implementation: a copy and a row-wise apply
+    df_ = df.copy()
+    df_[columns] = df_[columns].astype(str)
+    df_['_'.join(columns)] = df_[columns].apply(lambda row: ','.join(row), axis=1)
+    return df_
+
+
+def make_frame(rows: int, groups: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'key': rng.integers(0, groups, rows),
+        'name': rng.choice(['alpha', 'beta', 'gamma', 'delta'], rows),
+        'value': rng.integers(0, 1000, rows),
+    })
+
+
+def measure(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument(
+        '--skip-loop', action='store_true',
+        help='Do not run the original implementations, they are slow on 1M groups'
+    )
+    args = parser.parse_args()
+
+    for groups in (10_000, 1_000_000):
+        df = make_frame(args.rows, groups)
+        t_new = measure(_squash_row_df, df, ['key'], ',')
+        line = f'squash_rows {args.rows} rows, {groups} groups: groupby {t_new:.2f}s'
+        if not args.skip_loop:
+            t_old = measure(loop_squash_rows, df, 'key', ',')
+            line += f', loop {t_old:.2f}s ({t_old / t_new:.1f}x)'
+        print(line)
+
+    df = make_frame(args.rows, 10_000)
+    t_new = measure(_squash_column_df, df.copy(), ['name', 'value'])
+    line = f'squash_columns {args.rows} rows: str.cat {t_new:.2f}s'
+    if not args.skip_loop:
+        t_old = measure(apply_squash_columns, df, ['name', 'value'])
+        line += f', apply {t_old:.2f}s ({t_old / t_new:.1f}x)'
+    print(line)
+
+
+if __name__ == '__main__':
+    main()